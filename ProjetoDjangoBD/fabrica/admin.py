@@ -1,19 +1,33 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.forms.models import BaseInlineFormSet
+from django.http import HttpResponseRedirect
 
 from .models import (
     Cliente,
     Constituido,
     Contem,
     ContemOrdemProducao,
+    EstoqueInsuficiente,
     Fornece,
     Fornecedor,
     Funcionario,
     MateriaPrima,
+    MovimentacaoMateriaPrima,
+    MovimentacaoProduto,
     OrdemProducao,
     Pedido,
     Produto,
     Realiza,
     Recebe,
+    Reserva,
+    Tarefa,
+    TarefaFalha,
+    TransicaoEstoque,
+    enfileirar_tarefa,
+    faltando_para,
 )
 
 
@@ -45,13 +59,146 @@ class ClienteAdmin(CustomSearchAdmin):
     search_help_text = 'Campos pesquisáveis: "NOME", "EMAIL"'
 
 
+def mensagens_estoque(faltando, produtos=None):
+    """Uma mensagem por produto de ``faltando`` (ver ``EstoqueInsuficiente``)."""
+    if produtos is None:
+        produtos = Produto.objects.in_bulk(list(faltando))
+    return [
+        f"Estoque insuficiente de {produtos.get(produto, produto)}: faltam {quantidade}."
+        for produto, quantidade in sorted(faltando.items())
+    ]
+
+
+class EstoqueInsuficienteAdmin(admin.ModelAdmin):
+    """Mostra o ``EstoqueInsuficiente`` das reservas como erro, e não como 500.
+
+    Os receivers de Pedido e Contem reservam o estoque no save e levantam o
+    erro quando falta estoque, depois da validação do formulário (uma
+    reserva concorrente, ou um Contem salvo fora do inline). As views do
+    admin rodam numa transação, que o erro já desfez: o formulário volta com
+    os dados enviados e o erro; exclusões e ações da lista voltam com uma
+    mensagem.
+    """
+
+    def changeform_view(self, request, object_id=None, form_url="", extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except EstoqueInsuficiente as erro:
+            # Processa o POST de novo; get_form acrescenta o erro, então nada
+            # é salvo e a página volta com os valores enviados.
+            request.estoque_insuficiente = erro
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        erro = getattr(request, "estoque_insuficiente", None)
+        if erro is None:
+            return form
+
+        class FormComEstoqueInsuficiente(form):
+            def clean(self):
+                dados = super().clean()
+                self.add_error(None, mensagens_estoque(erro.faltando))
+                return dados
+
+        return FormComEstoqueInsuficiente
+
+    def delete_view(self, request, object_id, extra_context=None):
+        try:
+            return super().delete_view(request, object_id, extra_context)
+        except EstoqueInsuficiente as erro:
+            return self.voltar_com_erro(request, erro)
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            return super().changelist_view(request, extra_context)
+        except EstoqueInsuficiente as erro:
+            return self.voltar_com_erro(request, erro)
+
+    def voltar_com_erro(self, request, erro):
+        for mensagem in mensagens_estoque(erro.faltando):
+            self.message_user(request, mensagem, messages.ERROR)
+        return HttpResponseRedirect(request.get_full_path())
+
+
+class EstoqueAtualAdmin(admin.ModelAdmin):
+    """Produto ou MateriaPrima com o estoque atual, e não o snapshot.
+
+    ``estoque_disponivel`` é o snapshot compactado, sem as movimentações
+    pendentes do livro; só compactar_movimentacoes o escreve (ver
+    ``ColunasDoBanco``), então aqui ele é somente leitura. Correções de
+    estoque entram como movimentação no livro.
+    """
+
+    readonly_fields = ("estoque_atual", "estoque_disponivel")
+
+    def get_queryset(self, request):
+        livro = self.model.movimentacoes.rel.related_model
+        pendente = (
+            livro.objects.filter(
+                **{self.model.movimentacoes.field.name: OuterRef("pk")},
+                compactada=False,
+            )
+            .values(self.model.movimentacoes.field.name)
+            .annotate(total=Sum("quantidade"))
+            .values("total")
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                _estoque_atual=F("estoque_disponivel") + Coalesce(Subquery(pendente), 0)
+            )
+        )
+
+    @admin.display(description="Estoque atual", ordering="_estoque_atual")
+    def estoque_atual(self, obj):
+        return obj._estoque_atual
+
+
+class ContemInlineFormSet(BaseInlineFormSet):
+    def clean(self):
+        """Recusa itens sem estoque disponível num pedido que reserva.
+
+        É a mesma conta da reserva feita no save, mas sem a trava: uma
+        reserva concorrente ainda pode fazer o save falhar.
+        """
+        super().clean()
+        if self.instance.status not in (Pedido.PENDENTE, Pedido.PROCESSADO):
+            return
+        if (
+            self.instance.pk
+            and TransicaoEstoque.objects.filter(
+                tipo=TransicaoEstoque.BAIXA_PEDIDO, referencia=self.instance.pk
+            ).exists()
+        ):
+            return
+        quantidades = {}
+        produtos = {}
+        for form in self.forms:
+            dados = getattr(form, "cleaned_data", None)
+            if not dados or dados.get("DELETE") or not dados.get("produto"):
+                continue
+            produto = dados["produto"]
+            produtos[produto.pk] = produto
+            quantidades[produto.pk] = (
+                quantidades.get(produto.pk, 0) + dados["quantidade"]
+            )
+        if not quantidades:
+            return
+        faltando = faltando_para(quantidades, self.instance.pk)
+        if faltando:
+            raise ValidationError(mensagens_estoque(faltando, produtos))
+
+
 class ContemInline(admin.TabularInline):
     model = Contem
+    formset = ContemInlineFormSet
     extra = 1
 
 
 @admin.register(Pedido)
-class PedidoAdmin(admin.ModelAdmin):
+class PedidoAdmin(EstoqueInsuficienteAdmin):
     list_display = ("id_pedido", "data_pedido", "data_entrega", "status", "cliente")
     search_fields = ("id_pedido", "cliente__nome")
     list_filter = ("status", "data_pedido")
@@ -67,22 +214,21 @@ class ConstituidoInline(admin.TabularInline):
 
 
 @admin.register(Produto)
-class ProdutoAdmin(admin.ModelAdmin):
+class ProdutoAdmin(EstoqueAtualAdmin):
     list_display = (
         "id_produto",
         "nome",
         "descricao",
-        "estoque_disponivel",
+        "estoque_atual",
         "custo_unitario",
     )
     search_fields = ("nome", "descricao")
-    list_filter = ("estoque_disponivel",)
     search_help_text = 'Campos pesquisáveis: "NOME", "DESCRICAO"'
     inlines = [ConstituidoInline]
 
 
 @admin.register(Contem)
-class ContemAdmin(admin.ModelAdmin):
+class ContemAdmin(EstoqueInsuficienteAdmin):
     list_display = ("id", "pedido", "produto", "quantidade")
     search_fields = ("pedido__id_pedido", "produto__nome")
     list_filter = ("pedido", "produto")
@@ -120,10 +266,9 @@ class ContemOrdemProducaoAdmin(CustomSearchAdmin):
 
 
 @admin.register(MateriaPrima)
-class MateriaPrimaAdmin(CustomSearchAdmin):
-    list_display = ("id_materiaprima", "nome", "custo_unidade", "estoque_disponivel")
+class MateriaPrimaAdmin(EstoqueAtualAdmin, CustomSearchAdmin):
+    list_display = ("id_materiaprima", "nome", "custo_unidade", "estoque_atual")
     search_fields = ("nome",)
-    list_filter = ("estoque_disponivel",)
     search_help_text = 'Campos pesquisáveis: "NOME"'
 
 
@@ -179,3 +324,95 @@ class RealizaAdmin(CustomSearchAdmin):
     search_fields = ("funcionario__nome", "ordem__id_ordem")
     list_filter = ("funcionario", "ordem")
     search_help_text = 'Campos pesquisáveis: "FUNCIONARIO__NOME", "ORDEM__ID_ORDEM"'
+
+
+@admin.register(TransicaoEstoque)
+class TransicaoEstoqueAdmin(admin.ModelAdmin):
+    list_display = ("id", "tipo", "referencia", "aplicada_em")
+    list_filter = ("tipo",)
+
+
+@admin.register(Reserva)
+class ReservaAdmin(admin.ModelAdmin):
+    list_display = ("id", "pedido", "produto", "quantidade", "expira_em")
+    search_fields = ("pedido__id_pedido", "produto__nome")
+
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ("id", "tipo", "referencia", "tentativas", "executar_em")
+    list_filter = ("tipo",)
+
+
+@admin.register(TarefaFalha)
+class TarefaFalhaAdmin(admin.ModelAdmin):
+    list_display = ("id", "tipo", "referencia", "tentativas", "erro", "falhou_em")
+    list_filter = ("tipo",)
+    actions = ["reenfileirar"]
+
+    @admin.action(description="Reenfileirar as tarefas selecionadas")
+    def reenfileirar(self, request, queryset):
+        for falha in queryset:
+            enfileirar_tarefa(falha.tipo, falha.referencia)
+        queryset.delete()
+
+
+class LivroEstoqueAdmin(admin.ModelAdmin):
+    """Livro de movimentações de estoque: só inclusão, e só de ajustes.
+
+    Uma linha gravada pode já estar somada ao snapshot (compactada);
+    alterá-la ou apagá-la deixaria o estoque diferente do livro. Correções
+    entram como uma movimentação nova, de origem ``AJUSTE``.
+    """
+
+    # Campo do item de estoque movimentado, definido em cada livro.
+    item = None
+    list_filter = ("origem", "compactada")
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return (self.item, "quantidade")
+        return super().get_fields(request, obj)
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return ()
+        return [field.name for field in self.model._meta.fields]
+
+    def save_model(self, request, obj, form, change):
+        obj.origem = self.model.AJUSTE
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(MovimentacaoProduto)
+class MovimentacaoProdutoAdmin(LivroEstoqueAdmin):
+    item = "produto"
+    list_display = (
+        "id",
+        "produto",
+        "quantidade",
+        "origem",
+        "referencia",
+        "criada_em",
+        "compactada",
+    )
+
+
+@admin.register(MovimentacaoMateriaPrima)
+class MovimentacaoMateriaPrimaAdmin(LivroEstoqueAdmin):
+    item = "materiaprima"
+    list_display = (
+        "id",
+        "materiaprima",
+        "quantidade",
+        "origem",
+        "referencia",
+        "criada_em",
+        "compactada",
+    )
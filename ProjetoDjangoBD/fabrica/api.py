@@ -0,0 +1,432 @@
+"""API JSON de leitura sobre os modelos da fábrica.
+
+Cada recurso tem lista e detalhe. A lista aceita os mesmos filtros do
+formulário de busca da página correspondente e é paginada por cursor
+(``?cursor=``, ``?limite=``); ``?campos=a,b`` escolhe os campos devolvidos,
+inclusive as coleções aninhadas (os itens de um pedido, por exemplo).
+Pedidos também podem ser criados em lote com POST na lista (ver
+fabrica/ingestao.py), autenticado pela sessão, com o token CSRF, ou por uma
+chave de API (``Authorization: Bearer <chave>``, ver ``_autor``).
+
+As respostas levam um ETag forte calculado da versão de cada linha: a
+coluna ``versao`` onde ela existe (pedidos e fornecedores, mantida pelos
+receivers de models.py) ou o hash da linha e das coleções aninhadas, feito
+pelo próprio PostgreSQL. Com ``If-None-Match`` igual a resposta é um 304:
+sai só a consulta principal, sem as coleções e sem serializar nada.
+"""
+
+import hashlib
+import hmac
+import json
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.auth import get_permission_codename, get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.http import JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .filtros import (
+    filtros_clientes,
+    filtros_estoque,
+    filtros_fornecedores,
+    filtros_ordens,
+    filtros_pedidos,
+)
+from .forms import (
+    ClienteSearchForm,
+    FornecedorSearchForm,
+    MateriaPrimaSearchForm,
+    OrdemSearchForm,
+    PedidoSearchForm,
+    ProdutoSearchForm,
+)
+from .ingestao import LIMITE_PEDIDOS, criar_pedidos
+from .models import (
+    Cliente,
+    Fornecedor,
+    Funcionario,
+    MateriaPrima,
+    OrdemProducao,
+    Pedido,
+    Produto,
+    estoque_atual_sql,
+)
+from .paginacao import PAGE_SIZE, Chave, KeysetPaginator
+
+LIMITE_MAXIMO = 200
+
+
+@dataclass(frozen=True)
+class Aninhado:
+    """Coleção de linhas filhas incluída em cada item.
+
+    ``sql`` recebe a lista de chaves dos itens em ``ANY(%s)`` e retorna a
+    chave do item na coluna ``pai``. Tudo o que ela devolve precisa estar
+    coberto pela versão do recurso.
+    """
+
+    sql: str
+
+
+@dataclass(frozen=True)
+class Recurso:
+    model: type
+    # Tabela (ou tabela derivada) do FROM, visível pelo nome do modelo.
+    origem: str
+    # Expressão SQL que muda sempre que a representação da linha muda.
+    versao: str
+    form: type = None
+    filtros: object = None
+    aninhados: dict = field(default_factory=dict)
+    # Função que cria itens em lote: recebe a lista do corpo e retorna
+    # ``(ids, erros)``. Sem ela o recurso só aceita leitura.
+    criar: object = None
+    limite_criacao: int = 0
+
+    @property
+    def chave(self):
+        return self.model._meta.pk.attname
+
+    @property
+    def campos(self):
+        return tuple(f.attname for f in self.model._meta.concrete_fields) + tuple(
+            self.aninhados
+        )
+
+
+def _hash_com_filhos(tabela, chave, *filhos):
+    """Versão de uma linha sem coluna ``versao``: md5 dela e das filhas.
+
+    ``filhos`` são pares ``(tabela filha, coluna que aponta para a linha)``.
+    """
+    partes = [f"{tabela}::text"]
+    for filha, coluna in filhos:
+        partes.append(f"""COALESCE((
+            SELECT string_agg({filha}::text, ',' ORDER BY {filha}.id)
+            FROM {filha}
+            WHERE {filha}.{coluna} = {tabela}.{chave}
+        ), '')""")
+    return f"md5({' || '.join(partes)})"
+
+
+RECURSOS = {
+    "clientes": Recurso(
+        Cliente,
+        "Cliente",
+        _hash_com_filhos("Cliente", "id_cliente"),
+        ClienteSearchForm,
+        filtros_clientes,
+    ),
+    "pedidos": Recurso(
+        Pedido,
+        "Pedido",
+        "Pedido.versao",
+        PedidoSearchForm,
+        filtros_pedidos,
+        {
+            # Pedido.versao muda também com os itens e com o nome e o preço
+            # dos produtos deles.
+            "itens": Aninhado("""
+                SELECT
+                    Contem.pedido_id AS pai,
+                    Contem.id,
+                    Contem.produto_id,
+                    Produto.nome AS produto_nome,
+                    Contem.quantidade,
+                    Produto.custo_unitario,
+                    Produto.custo_unitario * Contem.quantidade AS subtotal
+                FROM Contem
+                    JOIN Produto ON Contem.produto_id = Produto.id_produto
+                WHERE Contem.pedido_id = ANY(%s)
+                ORDER BY Contem.id
+            """)
+        },
+        criar=criar_pedidos,
+        limite_criacao=LIMITE_PEDIDOS,
+    ),
+    "produtos": Recurso(
+        Produto,
+        estoque_atual_sql(Produto),
+        _hash_com_filhos("produto", "id_produto", ("Constituido", "produto_id")),
+        ProdutoSearchForm,
+        lambda dados: filtros_estoque(dados, "id_produto", "custo_unitario"),
+        {"composicao": Aninhado("""
+                SELECT produto_id AS pai, id, materiaprima_id, quantidade
+                FROM Constituido
+                WHERE produto_id = ANY(%s)
+                ORDER BY id
+            """)},
+    ),
+    "materias_primas": Recurso(
+        MateriaPrima,
+        estoque_atual_sql(MateriaPrima),
+        _hash_com_filhos("materiaprima", "id_materiaprima"),
+        MateriaPrimaSearchForm,
+        lambda dados: filtros_estoque(dados, "id_materiaprima", "custo_unidade"),
+    ),
+    "fornecedores": Recurso(
+        Fornecedor,
+        "Fornecedor",
+        "Fornecedor.versao",
+        FornecedorSearchForm,
+        filtros_fornecedores,
+        {
+            # Fornecedor.versao muda com as ofertas e com o nome das
+            # matérias-primas delas.
+            "ofertas": Aninhado("""
+                SELECT
+                    Fornece.fornecedor_id AS pai,
+                    Fornece.id,
+                    Fornece.materiaprima_id,
+                    MateriaPrima.nome AS materiaprima_nome,
+                    Fornece.preco
+                FROM Fornece
+                    JOIN MateriaPrima ON Fornece.materiaprima_id = MateriaPrima.id_materiaprima
+                WHERE Fornece.fornecedor_id = ANY(%s)
+                ORDER BY Fornece.id
+            """)
+        },
+    ),
+    "ordens_producao": Recurso(
+        OrdemProducao,
+        "OrdemProducao",
+        _hash_com_filhos(
+            "OrdemProducao",
+            "id_ordem",
+            ("ContemOrdemProducao", "ordem_id"),
+            ("Realiza", "ordem_id"),
+        ),
+        OrdemSearchForm,
+        filtros_ordens,
+        {
+            "itens": Aninhado("""
+                SELECT ordem_id AS pai, id, produto_id, quantidade
+                FROM ContemOrdemProducao
+                WHERE ordem_id = ANY(%s)
+                ORDER BY id
+            """),
+            "funcionarios": Aninhado("""
+                SELECT ordem_id AS pai, funcionario_id
+                FROM Realiza
+                WHERE ordem_id = ANY(%s)
+                ORDER BY id
+            """),
+        },
+    ),
+    "funcionarios": Recurso(
+        Funcionario,
+        "Funcionario",
+        _hash_com_filhos("Funcionario", "id_funcionario"),
+    ),
+}
+
+
+def _erro(mensagem, status=400, **extras):
+    return JsonResponse({"erro": mensagem, **extras}, status=status)
+
+
+def _campos(request, recurso):
+    """Campos pedidos em ``?campos=``, na ordem do recurso, com a chave sempre.
+
+    Retorna ``(campos, None)`` ou ``(None, resposta de erro)``.
+    """
+    if not request.GET.get("campos"):
+        return recurso.campos, None
+    pedidos = {nome.strip() for nome in request.GET["campos"].split(",")} - {""}
+    desconhecidos = pedidos - set(recurso.campos)
+    if desconhecidos:
+        return None, _erro(
+            f"Campos desconhecidos: {', '.join(sorted(desconhecidos))}.",
+            disponiveis=list(recurso.campos),
+        )
+    pedidos.add(recurso.chave)
+    return tuple(nome for nome in recurso.campos if nome in pedidos), None
+
+
+def _etag(*partes):
+    conteudo = json.dumps(partes, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return quote_etag(hashlib.sha1(conteudo.encode()).hexdigest())
+
+
+def _condicional(request, etag):
+    """O 304 quando ``If-None-Match`` casa com ``etag``, senão ``None``."""
+    resposta = get_conditional_response(request, etag=etag)
+    if resposta is not None:
+        resposta["ETag"] = etag
+    return resposta
+
+
+def _serializar(recurso, campos, linhas):
+    """Os itens em dicionários, com as coleções aninhadas pedidas."""
+    escalares = [nome for nome in campos if nome not in recurso.aninhados]
+    itens = [{nome: getattr(linha, nome) for nome in escalares} for linha in linhas]
+    chaves = [getattr(linha, recurso.chave) for linha in linhas]
+    for nome, aninhado in recurso.aninhados.items():
+        if nome not in campos:
+            continue
+        por_pai = {chave: [] for chave in chaves}
+        if chaves:
+            with connection.cursor() as cursor:
+                cursor.execute(aninhado.sql, [chaves])
+                colunas = [coluna.name for coluna in cursor.description]
+                for linha in cursor.fetchall():
+                    filho = dict(zip(colunas, linha))
+                    por_pai[filho.pop("pai")].append(filho)
+        for item, chave in zip(itens, chaves):
+            item[nome] = por_pai[chave]
+    return itens
+
+
+def _responder(dados, etag):
+    resposta = JsonResponse(dados, json_dumps_params={"ensure_ascii": False})
+    resposta["ETag"] = etag
+    # Pode ficar em cache, mas precisa ser revalidada pelo ETag a cada uso.
+    patch_cache_control(resposta, private=True, no_cache=True)
+    return resposta
+
+
+def listar(request, recurso):
+    campos, erro = _campos(request, recurso)
+    if erro:
+        return erro
+    try:
+        limite = int(request.GET.get("limite", PAGE_SIZE))
+    except ValueError:
+        return _erro("limite deve ser um número inteiro.")
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        return _erro(f"limite deve estar entre 1 e {LIMITE_MAXIMO}.")
+
+    where_clauses, params = [], []
+    if recurso.form is not None:
+        form = recurso.form(request.GET)
+        if not form.is_valid():
+            return _erro("Filtros inválidos.", campos=form.errors.get_json_data())
+        where_clauses, params = recurso.filtros(form.cleaned_data)
+
+    tabela = recurso.model.__name__
+    coluna = recurso.model._meta.pk.column
+    paginator = KeysetPaginator([Chave(f"{tabela}.{coluna}", recurso.chave)], limite)
+    query, query_params, cursor = paginator.consulta(
+        request,
+        f"SELECT *, {recurso.versao} AS versao_api FROM {recurso.origem}",
+        where_clauses,
+        params,
+    )
+    pagina = paginator.pagina(
+        request, list(recurso.model.objects.raw(query, query_params)), cursor
+    )
+
+    etag = _etag(
+        request.get_full_path(),
+        campos,
+        pagina.has_next,
+        pagina.has_previous,
+        [(getattr(linha, recurso.chave), linha.versao_api) for linha in pagina],
+    )
+    if resposta := _condicional(request, etag):
+        return resposta
+
+    return _responder(
+        {
+            "resultados": _serializar(recurso, campos, pagina.object_list),
+            "proxima": (
+                f"{request.path}?{pagina.next_query}" if pagina.has_next else None
+            ),
+            "anterior": (
+                f"{request.path}?{pagina.previous_query}"
+                if pagina.has_previous
+                else None
+            ),
+        },
+        etag,
+    )
+
+
+def detalhar(request, recurso, pk):
+    campos, erro = _campos(request, recurso)
+    if erro:
+        return erro
+
+    tabela = recurso.model.__name__
+    coluna = recurso.model._meta.pk.column
+    linhas = list(
+        recurso.model.objects.raw(
+            f"""SELECT *, {recurso.versao} AS versao_api
+                FROM {recurso.origem}
+                WHERE {tabela}.{coluna} = %s""",
+            [pk],
+        )
+    )
+    if not linhas:
+        return _erro("Não encontrado.", status=404)
+
+    etag = _etag(request.get_full_path(), campos, linhas[0].versao_api)
+    if resposta := _condicional(request, etag):
+        return resposta
+    return _responder(_serializar(recurso, campos, linhas)[0], etag)
+
+
+def _autor(request):
+    """Usuário que faz o POST: ``(usuario, None)`` ou ``(None, resposta de erro)``.
+
+    Com ``Authorization: Bearer <chave>`` é o usuário da chave em
+    ``settings.API_CHAVES``; sem cookie não há o que forjar, então o CSRF
+    não se aplica. Sem o cabeçalho vale a sessão, e o token CSRF é
+    verificado aqui, já que a view é csrf_exempt para aceitar a chave.
+    """
+    tipo, _, chave = request.headers.get("Authorization", "").partition(" ")
+    if tipo.lower() != "bearer":
+        verificacao = CsrfViewMiddleware(lambda request: None)
+        verificacao.process_request(request)
+        if resposta := verificacao.process_view(request, None, (), {}):
+            return None, resposta
+        return request.user, None
+    nome = None
+    for valida, dono in getattr(settings, "API_CHAVES", {}).items():
+        if hmac.compare_digest(chave.strip().encode(), valida.encode()):
+            nome = dono
+    Usuario = get_user_model()
+    usuario = (
+        nome
+        and Usuario.objects.filter(
+            **{Usuario.USERNAME_FIELD: nome}, is_active=True
+        ).first()
+    )
+    if not usuario:
+        return None, _erro("Chave de API inválida.", status=401)
+    return usuario, None
+
+
+def criar(request, recurso):
+    """Cria os itens da lista JSON do corpo e retorna o id de cada um.
+
+    Exige a permissão de inclusão do model, a mesma do admin, do usuário da
+    sessão ou da chave de API (ver ``_autor``). A resposta é 201 se algum
+    item foi criado e 400 se nenhum foi; ``erros`` traz as mensagens dos
+    recusados pela posição deles na lista.
+    """
+    usuario, resposta = _autor(request)
+    if resposta:
+        return resposta
+    opts = recurso.model._meta
+    if not usuario.has_perm(f"{opts.app_label}.{get_permission_codename('add', opts)}"):
+        return _erro("Sem permissão para criar.", status=403)
+    try:
+        lote = json.loads(request.body)
+    except ValueError:
+        return _erro("Corpo não é um JSON válido.")
+    if not isinstance(lote, list) or not lote:
+        return _erro("O corpo deve ser uma lista com ao menos um item.")
+    if len(lote) > recurso.limite_criacao:
+        return _erro(f"No máximo {recurso.limite_criacao} itens por requisição.")
+
+    ids, erros = recurso.criar(lote)
+    return JsonResponse(
+        {"criados": ids, "erros": erros},
+        status=201 if any(pk is not None for pk in ids) else 400,
+        json_dumps_params={"ensure_ascii": False},
+    )
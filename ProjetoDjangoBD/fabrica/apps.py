@@ -5,3 +5,5 @@ class FabricaConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "fabrica"
 
+    def ready(self):
+        from . import checks  # noqa: F401
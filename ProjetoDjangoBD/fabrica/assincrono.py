@@ -0,0 +1,164 @@
+"""Consultas raw assíncronas, para as views async servidas pelo ASGI.
+
+O ORM do Django ainda não executa SQL de forma assíncrona: numa view async,
+cada consulta iria para uma thread e elas rodariam uma depois da outra na
+mesma conexão. Aqui cada consulta pega sua própria conexão do psycopg 3
+assíncrono, então as independentes rodam ao mesmo tempo com
+``asyncio.gather``.
+
+O pool (``psycopg_pool.AsyncConnectionPool``) pertence ao event loop que o
+abriu; ``com_pool`` o abre no loop do servidor ASGI e o fecha no shutdown do
+protocolo lifespan. Fora dele (WSGI, cliente de testes, DB_CONEXOES diferente
+de pool) cada consulta abre e fecha a sua conexão.
+
+``com_pool`` também limita as requisições em andamento a
+``settings.ASGI_CONCORRENCIA``: sem limite, sob carga todas disputam o pool
+ao mesmo tempo e estouram o timeout dele em vez de esperar na fila.
+"""
+
+import asyncio
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from psycopg import AsyncClientCursor, AsyncConnection
+from psycopg_pool import AsyncConnectionPool
+
+# (loop, pool) do servidor ASGI, preenchido por abrir_pool.
+_pool = None
+_abrindo = None
+_limite = None
+
+
+def _parametros(alias):
+    """Parâmetros de conexão do Django, com os adaptadores e o fuso dele.
+
+    O cursor que faz a interpolação no cliente é o mesmo que o Django usa,
+    então o SQL das views (``%s``, ``%%``, ``ANY(%s)``) vale sem mudanças.
+    """
+    conexao = connections[alias]
+    parametros = conexao.get_connection_params()
+    parametros.pop("cursor_factory", None)
+    parametros["cursor_factory"] = AsyncClientCursor
+    parametros["autocommit"] = True
+    parametros["options"] = (
+        parametros.get("options", "") + f" -c TimeZone={conexao.timezone_name}"
+    ).strip()
+    return parametros
+
+
+def _opcoes_pool(alias):
+    opcoes = connections[alias].settings_dict.get("OPTIONS", {}).get("pool")
+    if not opcoes:
+        return None
+    return opcoes if isinstance(opcoes, dict) else {}
+
+
+async def abrir_pool(alias=DEFAULT_DB_ALIAS):
+    """Abre o pool no event loop atual, se settings usar pool."""
+    global _pool, _abrindo
+    opcoes = _opcoes_pool(alias)
+    if _pool is not None or opcoes is None:
+        return
+    if _abrindo is None:
+        pool = AsyncConnectionPool(
+            kwargs=_parametros(alias),
+            check=(
+                AsyncConnectionPool.check_connection
+                if connections[alias].settings_dict["CONN_HEALTH_CHECKS"]
+                else None
+            ),
+            open=False,
+            **opcoes,
+        )
+        _abrindo = asyncio.ensure_future(pool.open(wait=True))
+        try:
+            await _abrindo
+        finally:
+            _abrindo = None
+        _pool = (asyncio.get_running_loop(), pool)
+    else:
+        # Outra requisição já está abrindo; espera por ela.
+        await asyncio.shield(_abrindo)
+
+
+async def fechar_pool():
+    global _pool, _limite
+    _limite = None
+    if _pool is not None:
+        _, pool = _pool
+        _pool = None
+        await pool.close()
+
+
+def com_pool(application):
+    """Envolve o app ASGI do Django: pool aberto na primeira requisição.
+
+    Servidores com o protocolo lifespan (uvicorn, hypercorn) também o abrem
+    no startup e o fecham no shutdown; o Django sozinho recusa o lifespan.
+    """
+
+    async def app(scope, receive, send):
+        global _limite
+        if scope["type"] == "lifespan":
+            while True:
+                mensagem = await receive()
+                if mensagem["type"] == "lifespan.startup":
+                    await abrir_pool()
+                    await send({"type": "lifespan.startup.complete"})
+                elif mensagem["type"] == "lifespan.shutdown":
+                    await fechar_pool()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if _pool is None:
+            await abrir_pool()
+        if _limite is None:
+            _limite = asyncio.Semaphore(getattr(settings, "ASGI_CONCORRENCIA", 10))
+        async with _limite:
+            await application(scope, receive, send)
+
+    return app
+
+
+async def _executar(sql, params, alias):
+    if _pool is not None and _pool[0] is asyncio.get_running_loop():
+        async with _pool[1].connection() as conexao:
+            return await _ler(conexao, sql, params)
+    conexao = await AsyncConnection.connect(**_parametros(alias))
+    async with conexao:
+        return await _ler(conexao, sql, params)
+
+
+async def _ler(conexao, sql, params):
+    cursor = await conexao.execute(sql, params)
+    colunas = [coluna.name for coluna in cursor.description]
+    return colunas, await cursor.fetchall()
+
+
+async def consultar(model, sql, params=(), alias=DEFAULT_DB_ALIAS):
+    """Equivalente assíncrono de ``list(model.objects.raw(sql, params))``.
+
+    As colunas dos campos do modelo viram a instância e as demais viram
+    atributos dela, como no raw().
+    """
+    colunas, linhas = await _executar(sql, params, alias)
+    posicoes = {coluna: i for i, coluna in enumerate(colunas)}
+    campos = [
+        (field.attname, posicoes[field.column])
+        for field in model._meta.concrete_fields
+        if field.column in posicoes
+    ]
+    nomes = [nome for nome, _ in campos]
+    colunas_dos_campos = {field.column for field in model._meta.concrete_fields}
+    extras = [
+        (coluna, i)
+        for coluna, i in posicoes.items()
+        if coluna not in colunas_dos_campos
+    ]
+
+    instancias = []
+    for linha in linhas:
+        instancia = model.from_db(alias, nomes, [linha[i] for _, i in campos])
+        for coluna, i in extras:
+            setattr(instancia, coluna, linha[i])
+        instancias.append(instancia)
+    return instancias
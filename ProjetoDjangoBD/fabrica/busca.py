@@ -0,0 +1,69 @@
+import unicodedata
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models import Func
+from django.db.models.functions import Lower
+
+# Busca por substring sem distinguir maiúsculas nem acentos, atendida por
+# índices GIN de trigramas (pg_trgm). unaccent() não é IMMUTABLE e por isso
+# não pode aparecer num índice; f_unaccent fixa o dicionário e pode.
+FUNCOES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """
+    CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+]
+
+
+def normalizar(coluna):
+    """Expressão SQL normalizada de ``coluna``, a mesma dos índices."""
+    return f"f_unaccent(lower({coluna}))"
+
+
+def escapar_like(termo):
+    return termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def contem(coluna, termo):
+    """Condição ``(sql, params)`` para ``coluna`` contendo ``termo``.
+
+    O termo é normalizado no banco do mesmo jeito que a coluna; como é uma
+    constante, o planejador avalia a expressão antes de escolher o índice.
+    """
+    return (
+        f"{normalizar(coluna)} LIKE {normalizar('%s')}",
+        [f"%{escapar_like(termo)}%"],
+    )
+
+
+def _sem_acento(texto):
+    decomposto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def contem_opcao(coluna, termo, choices):
+    """Como ``contem``, para colunas com ``choices``.
+
+    Os valores possíveis são conhecidos, então a busca é resolvida aqui e
+    vira uma igualdade, que usa um índice B-tree comum.
+    """
+    termo = _sem_acento(termo)
+    valores = [valor for valor, _ in choices if termo in _sem_acento(valor)]
+    return f"{coluna} = ANY(%s)", [valores]
+
+
+def indice_trigrama(campo, name):
+    """Índice GIN de trigramas sobre ``f_unaccent(lower(campo))``."""
+    return GinIndex(
+        OpClass(Func(Lower(campo), function="f_unaccent"), name="gin_trgm_ops"),
+        name=name,
+    )
+
+
+def instalar_funcoes(cursor):
+    """Cria as extensões e a função usadas pelos índices de busca."""
+    for sql in FUNCOES_SQL:
+        cursor.execute(sql)
@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+_AUSENTE = object()
+
+
+class CacheVersionado:
+    """Cache read-through de dois níveis para dados que mudam pouco.
+
+    O primeiro nível é um LRU em memória do processo com TTL; o segundo,
+    opcional, é um backend de ``settings.CACHES``. Cada chave tem uma
+    versão, e cada namespace outra: invalidar só incrementa a versão, e
+    entradas com versão antiga nunca mais são servidas. Com o segundo nível
+    configurado as versões ficam nele, então a invalidação feita por um
+    processo vale para o primeiro nível dos outros.
+    """
+
+    def __init__(self, tamanho=10_000, ttl=300, backend=None):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.entradas = OrderedDict()  # chave -> (versão, expira_em, valor)
+        self.versoes_locais = {}
+        self.contadores = Counter()
+
+    @property
+    def segundo_nivel(self):
+        return caches[self.backend] if self.backend else None
+
+    def _chave_versao(self, namespace, chave=None):
+        if chave is None:
+            return f"catalogo:v:{namespace}"
+        return f"catalogo:v:{namespace}:{chave}"
+
+    def _versoes(self, namespace, chaves):
+        """Versão atual de cada chave: ``(versão do namespace, da chave)``."""
+        nomes = [self._chave_versao(namespace)] + [
+            self._chave_versao(namespace, chave) for chave in chaves
+        ]
+        if self.segundo_nivel is not None:
+            valores = self.segundo_nivel.get_many(nomes)
+        else:
+            with self.lock:
+                valores = {nome: self.versoes_locais.get(nome) for nome in nomes}
+        geral = valores.get(nomes[0]) or 0
+        return {
+            chave: (geral, valores.get(nome) or 0)
+            for chave, nome in zip(chaves, nomes[1:])
+        }
+
+    def obter_muitos(self, namespace, chaves, carregar):
+        """Valores de ``chaves``; as ausentes vêm de ``carregar(faltando)``.
+
+        ``carregar`` recebe a lista de chaves que não estavam em nenhum nível
+        e retorna um dict; chaves que ele não retorna não são guardadas.
+        """
+        chaves = list(dict.fromkeys(chaves))
+        if not chaves:
+            return {}
+        versoes = self._versoes(namespace, chaves)
+        resultado = {}
+        faltando = []
+        agora = time.monotonic()
+        with self.lock:
+            for chave in chaves:
+                nome = f"catalogo:{namespace}:{chave}"
+                entrada = self.entradas.get(nome)
+                if entrada is None or entrada[0] != versoes[chave]:
+                    faltando.append(chave)
+                elif entrada[1] < agora:
+                    del self.entradas[nome]
+                    self.contadores["expiradas"] += 1
+                    faltando.append(chave)
+                else:
+                    self.entradas.move_to_end(nome)
+                    self.contadores["acertos"] += 1
+                    resultado[chave] = entrada[2]
+
+        if faltando and self.segundo_nivel is not None:
+            nomes = {
+                self._nome_segundo_nivel(namespace, chave, versoes[chave]): chave
+                for chave in faltando
+            }
+            for nome, valor in self.segundo_nivel.get_many(list(nomes)).items():
+                chave = nomes[nome]
+                resultado[chave] = valor
+                self._guardar_local(namespace, chave, versoes[chave], valor)
+                self.contadores["acertos_segundo_nivel"] += 1
+            faltando = [chave for chave in faltando if chave not in resultado]
+
+        if faltando:
+            self.contadores["faltas"] += len(faltando)
+            carregados = carregar(faltando)
+            for chave, valor in carregados.items():
+                self._guardar_local(namespace, chave, versoes[chave], valor)
+            if self.segundo_nivel is not None and carregados:
+                self.segundo_nivel.set_many(
+                    {
+                        self._nome_segundo_nivel(
+                            namespace, chave, versoes[chave]
+                        ): valor
+                        for chave, valor in carregados.items()
+                    },
+                    self.ttl,
+                )
+            resultado.update(carregados)
+        return resultado
+
+    def obter(self, namespace, chave, carregar):
+        """Valor de uma chave; ``carregar()`` o produz numa falta."""
+        valor = self.obter_muitos(
+            namespace, [chave], lambda faltando: {chave: carregar()}
+        ).get(chave, _AUSENTE)
+        return None if valor is _AUSENTE else valor
+
+    def _nome_segundo_nivel(self, namespace, chave, versao):
+        return f"catalogo:{namespace}:{chave}:{versao[0]}.{versao[1]}"
+
+    def _guardar_local(self, namespace, chave, versao, valor):
+        nome = f"catalogo:{namespace}:{chave}"
+        with self.lock:
+            self.entradas[nome] = (versao, time.monotonic() + self.ttl, valor)
+            self.entradas.move_to_end(nome)
+            while len(self.entradas) > self.tamanho:
+                self.entradas.popitem(last=False)
+                self.contadores["despejadas"] += 1
+
+    def invalidar(self, namespace, *chaves):
+        """Invalida ``chaves`` do namespace, ou o namespace inteiro sem chaves."""
+        nomes = [self._chave_versao(namespace, chave) for chave in chaves] or [
+            self._chave_versao(namespace)
+        ]
+        self.contadores["invalidacoes"] += len(nomes)
+        if self.segundo_nivel is not None:
+            for nome in nomes:
+                # add não sobrescreve; incr falha se a chave sumiu no meio.
+                self.segundo_nivel.add(nome, 0, None)
+                try:
+                    self.segundo_nivel.incr(nome)
+                except ValueError:
+                    self.segundo_nivel.set(nome, 1, None)
+        else:
+            with self.lock:
+                for nome in nomes:
+                    self.versoes_locais[nome] = self.versoes_locais.get(nome, 0) + 1
+
+    def estatisticas(self):
+        with self.lock:
+            return {"entradas": len(self.entradas), **self.contadores}
+
+    def limpar(self):
+        with self.lock:
+            self.entradas.clear()
+            self.versoes_locais.clear()
+            self.contadores.clear()
+
+
+def _configurado():
+    config = getattr(settings, "CACHE_CATALOGO", {})
+    return CacheVersionado(
+        tamanho=config.get("TAMANHO", 10_000),
+        ttl=config.get("TTL", 300),
+        backend=config.get("BACKEND"),
+    )
+
+
+CATALOGO = _configurado()
@@ -0,0 +1,60 @@
+"""Validação do perfil de produção (ver PERFIL em setup/settings.py).
+
+As verificações têm a tag ``producao``: rodam no ``manage.py check``, no
+runserver e, por ``validar_inicio``, na inicialização do wsgi/asgi, mas não
+no collectstatic, que é quem gera o manifesto exigido aqui.
+"""
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+
+@checks.register("producao")
+def verificar_producao(app_configs, **kwargs):
+    if not getattr(settings, "PRODUCAO", False):
+        return []
+    erros = []
+    if settings.DEBUG:
+        erros.append(
+            checks.Error("DEBUG ligado no perfil de produção.", id="fabrica.E001")
+        )
+    if staticfiles_storage.read_manifest() is None:
+        erros.append(
+            checks.Error(
+                "Manifesto dos arquivos estáticos não encontrado em "
+                f"{settings.STATIC_ROOT}.",
+                hint="Rode manage.py collectstatic com DJANGO_PERFIL=producao.",
+                id="fabrica.E002",
+            )
+        )
+    loaders = settings.TEMPLATES[0]["OPTIONS"].get("loaders", [])
+    if not any(
+        isinstance(loader, tuple) and loader[0].endswith("cached.Loader")
+        for loader in loaders
+    ):
+        erros.append(
+            checks.Error(
+                "Templates sem o loader com cache no perfil de produção.",
+                id="fabrica.E003",
+            )
+        )
+    try:
+        connection.ensure_connection()
+    except Exception as e:
+        erros.append(
+            checks.Error(f"Banco de dados inacessível: {e}", id="fabrica.E004")
+        )
+    finally:
+        # Com o pool, devolve a conexão em vez de prendê-la nesta thread.
+        connection.close()
+    return erros
+
+
+def validar_inicio():
+    """Impede o servidor de subir em produção com algum erro acima."""
+    erros = [erro for erro in checks.run_checks(tags=["producao"]) if erro.is_serious()]
+    if erros:
+        raise ImproperlyConfigured("\n".join(str(erro) for erro in erros))
@@ -0,0 +1,18 @@
+"""Storage dos arquivos estáticos do perfil de produção."""
+
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class ArquivosEstaticos(CompressedManifestStaticFilesStorage):
+    """O storage do WhiteNoise sem reescrever o sourceMappingURL dos .js.
+
+    O bootstrap.bundle.js vendorizado aponta para um bootstrap.bundle.js.map
+    que não é distribuído, e o collectstatic falharia ao procurá-lo. O
+    comentário fica como está; o .map do CSS continua sendo reescrito.
+    """
+
+    patterns = tuple(
+        (extensao, padroes)
+        for extensao, padroes in CompressedManifestStaticFilesStorage.patterns
+        if extensao != "*.js"
+    )
@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.http import StreamingHttpResponse
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+# Linhas buscadas do cursor do servidor e enviadas por pedaço da resposta.
+TAMANHO_LOTE = 2_000
+
+
+def linhas(sql, params, tamanho_lote=TAMANHO_LOTE):
+    """Gera ``(colunas, lote de linhas)`` de ``sql`` com um cursor nomeado.
+
+    O cursor fica dentro de uma transação para não ser WITH HOLD: fora dela
+    o PostgreSQL materializaria o resultado inteiro no commit antes de
+    devolver a primeira linha.
+    """
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        colunas = [coluna.name for coluna in cursor.description]
+        # O primeiro lote sai mesmo vazio, para o CSV ter cabeçalho.
+        lote = cursor.fetchmany(tamanho_lote)
+        yield colunas, lote
+        while lote := cursor.fetchmany(tamanho_lote):
+            yield colunas, lote
+
+
+def _csv(lotes):
+    cabecalho = False
+    for colunas, lote in lotes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not cabecalho:
+            writer.writerow(colunas)
+            cabecalho = True
+        writer.writerows(lote)
+        yield buffer.getvalue()
+
+
+def _ndjson(lotes):
+    for colunas, lote in lotes:
+        yield "".join(
+            json.dumps(
+                dict(zip(colunas, linha)), cls=DjangoJSONEncoder, ensure_ascii=False
+            )
+            + "\n"
+            for linha in lote
+        )
+
+
+def exportar(sql, params, formato, nome):
+    """Resposta que envia o resultado de ``sql`` em ``formato`` aos pedaços.
+
+    A consulta só roda quando o servidor começa a consumir a resposta, e a
+    memória usada não depende do número de linhas.
+    """
+    gerar = _ndjson if formato == "ndjson" else _csv
+    extensao = "ndjson" if formato == "ndjson" else "csv"
+    response = StreamingHttpResponse(
+        gerar(linhas(sql, params)), content_type=FORMATOS[extensao]
+    )
+    response["Content-Disposition"] = f'attachment; filename="{nome}.{extensao}"'
+    return response
@@ -0,0 +1,264 @@
+"""Filtros dos formulários de busca convertidos em SQL.
+
+Cada função recebe o ``cleaned_data`` de um formulário válido e retorna
+``(where_clauses, params)``, usados pelas páginas, pelas exportações e pela
+API.
+"""
+
+from .busca import contem, contem_opcao
+from .models import OrdemProducao, Pedido
+
+PRODUTOS_DA_ORDEM = """
+    FROM ContemOrdemProducao
+        JOIN Produto ON ContemOrdemProducao.produto_id = Produto.id_produto
+"""
+FUNCIONARIOS_DA_ORDEM = """
+    FROM Funcionario
+        JOIN Realiza ON Funcionario.id_funcionario = Realiza.funcionario_id
+"""
+
+
+def _contem(where_clauses, params, coluna, termo):
+    clause, clause_params = contem(coluna, termo)
+    where_clauses.append(clause)
+    params.extend(clause_params)
+
+
+def _intervalo(where_clauses, params, coluna, inicio, fim, aceita_nulo=False):
+    if inicio and fim:
+        clause = f"{coluna} BETWEEN %s AND %s"
+        valores = [inicio, fim]
+    elif inicio:
+        clause = f"{coluna} >= %s"
+        valores = [inicio]
+    elif fim:
+        clause = f"{coluna} <= %s"
+        valores = [fim]
+    else:
+        return
+    if aceita_nulo:
+        clause = f"({clause} OR {coluna} IS NULL)"
+    where_clauses.append(clause)
+    params.extend(valores)
+
+
+def filtros_clientes(dados):
+    where_clauses = []
+    params = []
+    if dados.get("id_cliente"):
+        where_clauses.append("id_cliente = %s")
+        params.append(dados["id_cliente"])
+    for campo in ("nome", "telefone", "email"):
+        if dados.get(campo):
+            _contem(where_clauses, params, campo, dados[campo])
+    if dados.get("numero"):
+        where_clauses.append("numero = %s")
+        params.append(dados["numero"])
+    for campo in ("cep", "complemento", "logradouro"):
+        if dados.get(campo):
+            _contem(where_clauses, params, campo, dados[campo])
+    return where_clauses, params
+
+
+def filtros_pedidos(dados):
+    where_clauses = []
+    params = []
+    if dados.get("id_pedido"):
+        where_clauses.append("Pedido.id_pedido = %s")
+        params.append(dados["id_pedido"])
+    if dados.get("status"):
+        clause, clause_params = contem_opcao(
+            "Pedido.status", dados["status"], Pedido.STATUS_CHOICES
+        )
+        where_clauses.append(clause)
+        params.extend(clause_params)
+    if dados.get("cliente_id"):
+        where_clauses.append("Pedido.cliente_id = %s")
+        params.append(dados["cliente_id"])
+    if dados.get("forma_pagamento"):
+        clause, clause_params = contem_opcao(
+            "Pedido.forma_pagamento",
+            dados["forma_pagamento"],
+            Pedido.FORMA_PAGAMENTO_CHOICES,
+        )
+        where_clauses.append(clause)
+        params.extend(clause_params)
+
+    _intervalo(
+        where_clauses,
+        params,
+        "Pedido.data_pedido",
+        dados.get("pedido_start_date"),
+        dados.get("pedido_end_date"),
+    )
+    _intervalo(
+        where_clauses,
+        params,
+        "Pedido.data_entrega",
+        dados.get("entrega_start_date"),
+        dados.get("entrega_end_date"),
+        aceita_nulo=True,
+    )
+    _intervalo(
+        where_clauses,
+        params,
+        "Pedido.data_pagamento",
+        dados.get("pagamento_start_date"),
+        dados.get("pagamento_end_date"),
+    )
+
+    if dados.get("valor_total_min") is not None:
+        where_clauses.append("Pedido.valor_total >= %s")
+        params.append(dados["valor_total_min"])
+    if dados.get("valor_total_max") is not None:
+        where_clauses.append("Pedido.valor_total <= %s")
+        params.append(dados["valor_total_max"])
+    return where_clauses, params
+
+
+def filtros_estoque(dados, campo_id, coluna_custo):
+    """Filtros de produtos ou matérias-primas sobre ``estoque_atual_sql``.
+
+    Os dois formulários só diferem no campo do id; a coluna de custo tem
+    nomes diferentes nas duas tabelas.
+    """
+    where_clauses = []
+    params = []
+    if dados.get(campo_id):
+        where_clauses.append(f"{campo_id} = %s")
+        params.append(dados[campo_id])
+    if dados.get("nome"):
+        _contem(where_clauses, params, "nome", dados["nome"])
+    if dados.get("estoque_disponivel_min") is not None:
+        where_clauses.append("estoque_disponivel >= %s")
+        params.append(dados["estoque_disponivel_min"])
+    if dados.get("estoque_disponivel_max") is not None:
+        where_clauses.append("estoque_disponivel <= %s")
+        params.append(dados["estoque_disponivel_max"])
+    if dados.get("custo_unitario_min") is not None:
+        where_clauses.append(f"{coluna_custo} >= %s")
+        params.append(dados["custo_unitario_min"])
+    if dados.get("custo_unitario_max") is not None:
+        where_clauses.append(f"{coluna_custo} <= %s")
+        params.append(dados["custo_unitario_max"])
+    return where_clauses, params
+
+
+def filtros_fornecedores(dados):
+    where_clauses = []
+    params = []
+    if dados.get("id_fornecedor"):
+        where_clauses.append("id_fornecedor = %s")
+        params.append(dados["id_fornecedor"])
+    if dados.get("nome"):
+        _contem(where_clauses, params, "nome", dados["nome"])
+    if dados.get("avaliacao_min") is not None:
+        where_clauses.append("avaliacao >= %s")
+        params.append(dados["avaliacao_min"])
+    if dados.get("avaliacao_max") is not None:
+        where_clauses.append("avaliacao <= %s")
+        params.append(dados["avaliacao_max"])
+    if dados.get("materia_prima"):
+        clause, clause_params = contem("MateriaPrima.nome", dados["materia_prima"])
+        where_clauses.append(f"""
+            id_fornecedor IN (
+                SELECT fornecedor_id
+                FROM Fornece
+                    JOIN MateriaPrima ON Fornece.materiaprima_id = MateriaPrima.id_materiaprima
+                WHERE {clause}
+            )
+        """)
+        params.extend(clause_params)
+    return where_clauses, params
+
+
+def filtros_itens_ordem(dados):
+    """Filtros dos produtos e dos funcionários de uma ordem.
+
+    Retorna ``((produto_clauses, produto_params), (funcionario_clauses,
+    funcionario_params))``, sobre ``PRODUTOS_DA_ORDEM`` e
+    ``FUNCIONARIOS_DA_ORDEM``.
+    """
+    produto_clauses, produto_params = [], []
+    if dados.get("produto_nome"):
+        _contem(produto_clauses, produto_params, "Produto.nome", dados["produto_nome"])
+    _intervalo(
+        produto_clauses,
+        produto_params,
+        "ContemOrdemProducao.quantidade",
+        dados.get("produto_quantidade_min"),
+        dados.get("produto_quantidade_max"),
+    )
+
+    funcionario_clauses, funcionario_params = [], []
+    if dados.get("funcionario_nome"):
+        _contem(
+            funcionario_clauses,
+            funcionario_params,
+            "Funcionario.nome",
+            dados["funcionario_nome"],
+        )
+    if dados.get("funcionario_cargo"):
+        _contem(
+            funcionario_clauses,
+            funcionario_params,
+            "Funcionario.cargo",
+            dados["funcionario_cargo"],
+        )
+    return (produto_clauses, produto_params), (funcionario_clauses, funcionario_params)
+
+
+def filtros_ordens(dados):
+    """Filtros das ordens de produção, inclusive pelos produtos e funcionários.
+
+    Só entram as ordens com ao menos um produto e um funcionário que passem
+    pelos filtros deles; com a condição no WHERE a página vem cheia.
+    """
+    where_clauses = []
+    params = []
+    if dados.get("id_ordem"):
+        where_clauses.append("OrdemProducao.id_ordem = %s")
+        params.append(dados["id_ordem"])
+    if dados.get("status"):
+        clause, clause_params = contem_opcao(
+            "OrdemProducao.status", dados["status"], OrdemProducao.STATUS_CHOICES
+        )
+        where_clauses.append(clause)
+        params.extend(clause_params)
+    _intervalo(
+        where_clauses,
+        params,
+        "OrdemProducao.data_criacao",
+        dados.get("data_criacao_start_date"),
+        dados.get("data_criacao_end_date"),
+    )
+    _intervalo(
+        where_clauses,
+        params,
+        "OrdemProducao.data_conclusao",
+        dados.get("data_conclusao_start_date"),
+        dados.get("data_conclusao_end_date"),
+    )
+    if dados.get("custo_total_min") is not None:
+        where_clauses.append("OrdemProducao.custo_total >= %s")
+        params.append(dados["custo_total_min"])
+    if dados.get("custo_total_max") is not None:
+        where_clauses.append("OrdemProducao.custo_total <= %s")
+        params.append(dados["custo_total_max"])
+
+    (produto_clauses, produto_params), (funcionario_clauses, funcionario_params) = (
+        filtros_itens_ordem(dados)
+    )
+    produto_where = " AND ".join(
+        ["ContemOrdemProducao.ordem_id = OrdemProducao.id_ordem", *produto_clauses]
+    )
+    funcionario_where = " AND ".join(
+        ["Realiza.ordem_id = OrdemProducao.id_ordem", *funcionario_clauses]
+    )
+    where_clauses.append(f"EXISTS (SELECT 1 {PRODUTOS_DA_ORDEM} WHERE {produto_where})")
+    params.extend(produto_params)
+    where_clauses.append(
+        f"EXISTS (SELECT 1 {FUNCIONARIOS_DA_ORDEM} WHERE {funcionario_where})"
+    )
+    params.extend(funcionario_params)
+    return where_clauses, params
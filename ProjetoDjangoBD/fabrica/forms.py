@@ -316,3 +316,19 @@ class OrdemSearchForm(forms.Form):
         label="Quantidade Máxima do Produto",
         widget=forms.NumberInput(attrs={"placeholder": "Quantidade máxima"}),
     )
+
+
+class CompraMateriaPrimaForm(forms.Form):
+    """Compra na página da matéria-prima, só dos ``fornecedores`` dela."""
+
+    fornecedor = forms.TypedChoiceField(coerce=int, label="Fornecedor")
+    # O teto é o do INTEGER da coluna quantidade do livro.
+    quantidade = forms.IntegerField(
+        min_value=1, max_value=2_147_483_647, label="Quantidade"
+    )
+
+    def __init__(self, *args, fornecedores=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["fornecedor"].choices = [
+            (fornecedor.id_fornecedor, fornecedor.nome) for fornecedor in fornecedores
+        ]
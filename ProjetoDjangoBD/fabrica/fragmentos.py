@@ -0,0 +1,78 @@
+"""Linhas de tabela renderizadas uma vez e reaproveitadas pelo cache.
+
+A chave de cada linha inclui a ``versao`` do registro, que os receivers de
+models.py incrementam quando ele ou seus itens mudam; uma linha alterada
+ganha chave nova e a antiga expira sozinha.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.middleware.csrf import get_token
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+# O token de CSRF muda a cada requisição e não pode ficar no cache: a linha
+# é guardada com esta marca no lugar dele.
+_MARCA_CSRF = "__token_csrf_da_requisicao__"
+
+
+def _cache():
+    alias = getattr(settings, "FRAGMENTOS", {}).get("BACKEND")
+    return caches[alias] if alias else None
+
+
+def _chaves(template, objetos):
+    return {
+        objeto.pk: f"fragmento:{template}:{objeto.pk}:{objeto.versao}"
+        for objeto in objetos
+    }
+
+
+def linhas_em_cache(template, objetos):
+    """``(prontas, faltando)``: o HTML já em cache e os objetos sem linha.
+
+    Para quem precisa buscar os dados de ``faltando`` antes de chamar
+    ``renderizar_linhas`` com ``prontas`` (as views async, que não podem
+    consultar o banco dentro de ``carregar``).
+    """
+    cache = _cache()
+    chaves = _chaves(template, objetos)
+    prontas = cache.get_many(list(chaves.values())) if cache is not None else {}
+    return prontas, [objeto for objeto in objetos if chaves[objeto.pk] not in prontas]
+
+
+def renderizar_linhas(request, template, nome, objetos, carregar, prontas=None):
+    """Coloca em ``objeto.linha`` o HTML de ``template`` para cada objeto.
+
+    ``carregar(faltando)`` recebe só os objetos sem linha no cache, para
+    buscar o que o template precisa deles (os itens, por exemplo). Retorna
+    quantas linhas foram renderizadas. ``prontas``, o primeiro item de
+    ``linhas_em_cache``, evita consultar o cache de novo.
+    """
+    cache = _cache()
+    chaves = _chaves(template, objetos)
+    if prontas is None:
+        prontas, _ = linhas_em_cache(template, objetos)
+    faltando = [objeto for objeto in objetos if chaves[objeto.pk] not in prontas]
+
+    if faltando:
+        carregar(faltando)
+        linha = get_template(template)
+        novas = {
+            chaves[objeto.pk]: linha.render({nome: objeto, "csrf_token": _MARCA_CSRF})
+            for objeto in faltando
+        }
+        if cache is not None:
+            cache.set_many(novas, settings.FRAGMENTOS.get("TTL", 3600))
+        prontas.update(novas)
+
+    token = None
+    for objeto in objetos:
+        html = prontas[chaves[objeto.pk]]
+        if _MARCA_CSRF in html:
+            # get_token só quando preciso: ele marca a resposta para enviar
+            # o cookie de CSRF.
+            token = token or get_token(request)
+            html = html.replace(_MARCA_CSRF, token)
+        objeto.linha = mark_safe(html)
+    return len(faltando)
@@ -0,0 +1,531 @@
+import csv
+import multiprocessing
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.core.validators import (
+    EmailValidator,
+    MaxLengthValidator,
+    MaxValueValidator,
+    MinValueValidator,
+    RegexValidator,
+)
+from django.db import connection, models, transaction
+from django.db.models.sql import Query
+
+from .models import (
+    Cliente,
+    Contem,
+    Pedido,
+    Produto,
+    baixar_estoque_pedidos,
+    invalidar_catalogo,
+    recalcular_valor_total,
+)
+
+STAGING = "importacao_staging"
+# Linhas validadas de cada vez (e enviadas a cada processo filho).
+TAMANHO_LOTE = 5_000
+
+
+class Coluna:
+    """Converte e valida o texto de uma coluna do CSV com o campo do model.
+
+    Usa os mesmos ``to_python``, validadores (regex de CEP/email, mínimos,
+    max_length) e choices que o admin usaria, sem montar uma instância por
+    linha.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.nome = field.attname
+        self.coluna = field.column
+        self.tipo = field.db_type(connection)
+        self.vazio = field.null or field.primary_key
+        # O texto do CSV já é o valor de CharField, TextField e EmailField.
+        self.texto = isinstance(field, (models.CharField, models.TextField))
+        self.to_python = field.to_python
+        self.testes = [teste_rapido(validator) for validator in field.validators]
+        self.choices = {valor for valor, _ in field.flatchoices} or None
+
+    def converter(self, texto):
+        if not texto:
+            if self.vazio:
+                return None
+            raise ValidationError(f"{self.nome}: obrigatório.")
+        valor = texto if self.texto else self.to_python(texto)
+        for teste, validator in self.testes:
+            if not teste(valor):
+                validator(valor)
+        if self.choices is not None and valor not in self.choices:
+            raise ValidationError(f"{self.nome}: opção inválida {valor!r}.")
+        return valor
+
+
+def teste_rapido(validator):
+    """Retorna ``(teste, validator)`` com um teste barato para ``validator``.
+
+    Chamar os validadores do Django em cada campo custa mais que o resto da
+    importação. ``teste(valor)`` verdadeiro garante que o valor é válido;
+    quando é falso, o validador original decide e gera a mensagem.
+    """
+    if isinstance(validator, RegexValidator):
+        procurar = validator.regex.search
+        inverso = validator.inverse_match
+        return (lambda valor: bool(procurar(str(valor))) != inverso), validator
+    if isinstance(validator, EmailValidator):
+        # Caminho comum do próprio EmailValidator, sem IPs nem punycode.
+        usuario = validator.user_regex.match
+        dominio = validator.domain_regex.match
+        permitidos = set(validator.domain_allowlist)
+
+        def teste(valor):
+            local, arroba, host = valor.rpartition("@")
+            return (
+                bool(arroba)
+                and len(valor) <= 320
+                and bool(usuario(local))
+                and (host in permitidos or bool(dominio(host)))
+            )
+
+        return teste, validator
+    limite = getattr(validator, "limit_value", None)
+    if not callable(limite):
+        if isinstance(validator, MaxLengthValidator):
+            return (lambda valor: len(valor) <= limite), validator
+        if isinstance(validator, MinValueValidator):
+            return (lambda valor: valor >= limite), validator
+        if isinstance(validator, MaxValueValidator):
+            return (lambda valor: valor <= limite), validator
+
+    def teste(valor):
+        validator(valor)
+        return True
+
+    return teste, validator
+
+
+class Importacao:
+    """Importação de um CSV para ``model`` em três fases.
+
+    1. Cada linha é validada campo a campo enquanto o arquivo é lido e
+       copiada com COPY para uma tabela temporária.
+    2. As CheckConstraints do model e as chaves estrangeiras são verificadas
+       de uma vez na tabela temporária.
+    3. As linhas restantes são mescladas na tabela final com INSERT ... ON
+       CONFLICT: com a chave primária preenchida a linha é atualizada, sem
+       ela é inserida.
+
+    Linhas recusadas em qualquer fase vão para ``rejeitar(linha, erro,
+    valores)``.
+    """
+
+    model = None
+    # Models cujas CheckConstraints valem para as linhas do arquivo.
+    models_verificados = ()
+
+    def __init__(self, cabecalho, rejeitar):
+        self.rejeitar = rejeitar
+        campos = self.campos()
+        desconhecidas = [nome for nome in cabecalho if nome not in campos]
+        if desconhecidas:
+            raise ValueError(f"Colunas desconhecidas: {', '.join(desconhecidas)}.")
+        faltando = [
+            nome
+            for nome, field in campos.items()
+            if nome not in cabecalho and self.obrigatorio(field)
+        ]
+        if faltando:
+            raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(faltando)}.")
+
+        self.cabecalho = list(cabecalho)
+        self.lidas = [Coluna(campos[nome]) for nome in self.cabecalho]
+        # Colunas ausentes do arquivo entram com o default do campo.
+        self.padrao = [
+            (Coluna(field), field.get_default())
+            for nome, field in campos.items()
+            if nome not in cabecalho
+        ]
+        self.colunas = self.lidas + [coluna for coluna, _ in self.padrao]
+        self.padroes = [valor for _, valor in self.padrao]
+
+    def campos(self):
+        return {
+            field.attname: field
+            for field in self.model._meta.concrete_fields
+            if field.editable and not field.generated
+        }
+
+    def obrigatorio(self, field):
+        return (
+            not field.primary_key
+            and not field.null
+            and not field.has_default()
+            and field.db_default is models.NOT_PROVIDED
+        )
+
+    def executar(self, linhas, processos=1):
+        """Importa ``linhas`` (listas de texto numeradas) e retorna contagens.
+
+        Com ``processos`` > 1 a validação dos lotes roda em paralelo em
+        processos filhos, enquanto este continua o COPY na ordem do arquivo.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.criar_staging(cursor)
+            lidas = self.copiar(cursor, linhas, processos)
+            self.verificar_restricoes(cursor)
+            self.verificar_chaves_estrangeiras(cursor)
+            cursor.execute(f"SELECT COUNT(*) FROM {STAGING}")
+            mescladas = cursor.fetchone()[0]
+            self.mesclar(cursor)
+        return {"lidas": lidas, "rejeitadas": lidas - mescladas, "mescladas": mescladas}
+
+    def criar_staging(self, cursor):
+        colunas = ", ".join(f"{c.coluna} {c.tipo}" for c in self.colunas)
+        cursor.execute(
+            f"CREATE TEMP TABLE {STAGING} (linha BIGINT, {colunas}) ON COMMIT DROP"
+        )
+
+    def validar(self, lote):
+        """Converte um lote de linhas; retorna ``(válidas, recusadas)``."""
+        validas = []
+        recusadas = []
+        for numero, textos in lote:
+            if len(textos) != len(self.lidas):
+                recusadas.append((numero, "Número de colunas incorreto.", textos, {}))
+                continue
+            try:
+                valores = [
+                    coluna.converter(texto) for coluna, texto in zip(self.lidas, textos)
+                ]
+            except ValidationError as e:
+                recusadas.append(
+                    (
+                        numero,
+                        " ".join(e.messages),
+                        textos,
+                        valores_parciais(self.lidas, textos),
+                    )
+                )
+                continue
+            validas.append([numero, *valores, *self.padroes])
+        return validas, recusadas
+
+    def copiar(self, cursor, linhas, processos=1):
+        lidas = 0
+        nomes = ", ".join(c.coluna for c in self.colunas)
+        with (
+            cursor.copy(f"COPY {STAGING} (linha, {nomes}) FROM STDIN") as copy,
+            validador(self, processos) as validar,
+        ):
+            for validas, recusadas in validar(lotes(linhas, TAMANHO_LOTE)):
+                lidas += len(validas) + len(recusadas)
+                for linha in validas:
+                    copy.write_row(linha)
+                for numero, erro, textos, parciais in recusadas:
+                    self.rejeitar(numero, erro, textos)
+                    self.linha_recusada(parciais)
+        return lidas
+
+    def linha_recusada(self, valores):
+        """Chamado com os valores (por nome) de cada linha recusada."""
+
+    def recusar(self, cursor, condicao, erro, params=None, alias=None):
+        """Tira da staging as linhas que satisfazem ``condicao``.
+
+        A staging recebe o nome da tabela de ``alias`` (o model importado
+        por padrão), então a condição pode usar colunas qualificadas.
+        """
+        alias = alias or self.model._meta.db_table
+        cursor.execute(
+            f"""
+            DELETE FROM {STAGING} AS {alias}
+            WHERE {condicao}
+            RETURNING linha, {", ".join(c.coluna for c in self.lidas)}
+            """,
+            params,
+        )
+        for linha, *valores in cursor.fetchall():
+            self.rejeitar(linha, erro, valores)
+            self.linha_recusada(
+                {coluna.nome: valor for coluna, valor in zip(self.lidas, valores)}
+            )
+
+    def verificar_restricoes(self, cursor):
+        """Aplica as CheckConstraints dos models sobre a staging.
+
+        A condição de cada restrição é compilada pelo Django com as colunas
+        qualificadas pelo nome da tabela, que é o alias dado à staging. Como
+        num CHECK, só é recusada a linha cuja condição é falsa (NULL passa).
+        """
+        for model in self.models_verificados or (self.model,):
+            for constraint in model._meta.constraints:
+                if not isinstance(constraint, models.CheckConstraint):
+                    continue
+                query = Query(model, alias_cols=True)
+                compiler = query.get_compiler(connection=connection)
+                sql, params = query.build_where(constraint.check).as_sql(
+                    compiler, connection
+                )
+                self.recusar(
+                    cursor,
+                    f"({sql}) IS FALSE",
+                    f"Viola {constraint.name}.",
+                    params,
+                    alias=model._meta.db_table,
+                )
+
+    def verificar_chaves_estrangeiras(self, cursor):
+        for coluna in self.colunas:
+            if not coluna.field.is_relation:
+                continue
+            alvo = coluna.field.related_model._meta
+            self.recusar(
+                cursor,
+                f"""{coluna.coluna} IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM {alvo.db_table}
+                    WHERE {alvo.db_table}.{coluna.field.target_field.column}
+                        = {self.model._meta.db_table}.{coluna.coluna}
+                )""",
+                f"{coluna.nome}: {alvo.verbose_name} inexistente.",
+            )
+
+    def upsert(self, cursor, model, colunas, origem):
+        """INSERT de ``origem`` em ``model`` atualizando conflitos de pk.
+
+        Numa linha que já existe só mudam as colunas presentes no arquivo.
+        """
+        pk = model._meta.pk.column
+        nomes = ", ".join(colunas)
+        lidas = {c.coluna for c in self.lidas}
+        atualizar = ", ".join(
+            f"{c} = EXCLUDED.{c}" for c in colunas if c != pk and c in lidas
+        )
+        if pk not in colunas:
+            conflito = ""
+        elif atualizar:
+            conflito = f"ON CONFLICT ({pk}) DO UPDATE SET {atualizar}"
+        else:
+            conflito = f"ON CONFLICT ({pk}) DO NOTHING"
+        cursor.execute(
+            f"INSERT INTO {model._meta.db_table} ({nomes}) {origem} {conflito}"
+        )
+
+    def ajustar_sequencia(self, cursor, model):
+        """Leva a sequência da pk além dos ids importados explicitamente."""
+        tabela = model._meta.db_table
+        pk = model._meta.pk.column
+        cursor.execute(
+            f"""
+            SELECT setval(
+                pg_get_serial_sequence(%s, %s),
+                GREATEST((SELECT MAX({pk}) FROM {tabela}), 1)
+            )
+            """,
+            [tabela, pk],
+        )
+
+    def mesclar(self, cursor):
+        pk = self.model._meta.pk.column
+        colunas = [c.coluna for c in self.colunas]
+        sem_pk = [c for c in colunas if c != pk]
+        if pk in colunas:
+            # A última linha do arquivo vence quando a mesma pk se repete.
+            self.upsert(
+                cursor,
+                self.model,
+                colunas,
+                f"""
+                SELECT DISTINCT ON ({pk}) {", ".join(colunas)}
+                FROM {STAGING}
+                WHERE {pk} IS NOT NULL
+                ORDER BY {pk}, linha DESC
+                """,
+            )
+            self.ajustar_sequencia(cursor, self.model)
+        self.upsert(
+            cursor,
+            self.model,
+            sem_pk,
+            f"""
+            SELECT {", ".join(sem_pk)}
+            FROM {STAGING}
+            WHERE {f"{pk} IS NULL" if pk in colunas else "TRUE"}
+            ORDER BY linha
+            """,
+        )
+
+
+def lotes(linhas, tamanho):
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) == tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+# Importação sendo validada nos processos filhos, herdada pelo fork.
+_importacao = None
+
+
+def _validar_no_filho(lote):
+    return _importacao.validar(lote)
+
+
+@contextmanager
+def validador(importacao, processos):
+    """Função que mapeia lotes para ``importacao.validar``, em ordem.
+
+    Os filhos são criados com fork, então já têm os campos e validadores
+    prontos e nunca tocam na conexão com o banco.
+    """
+    global _importacao
+    if processos <= 1:
+        yield lambda lotes: map(importacao.validar, lotes)
+        return
+    _importacao = importacao
+    try:
+        with multiprocessing.get_context("fork").Pool(processos) as pool:
+            yield lambda lotes: pool.imap(_validar_no_filho, lotes)
+    finally:
+        _importacao = None
+
+
+def valores_parciais(colunas, textos):
+    """Valores que ainda convertem de uma linha recusada, por nome."""
+    valores = {}
+    for coluna, texto in zip(colunas, textos):
+        try:
+            valores[coluna.nome] = coluna.converter(texto)
+        except ValidationError:
+            pass
+    return valores
+
+
+class ImportacaoClientes(Importacao):
+    model = Cliente
+
+
+class ImportacaoProdutos(Importacao):
+    model = Produto
+
+    def mesclar(self, cursor):
+        # Pedidos com produtos cujo preço ou nome muda precisam do valor_total
+        # recalculado e de versão nova, como faz o receiver de Produto.
+        alterados = []
+        mudancas = [
+            f"Produto.{coluna} <> s.{coluna}"
+            for coluna in ("custo_unitario", "nome")
+            if coluna in self.cabecalho
+        ]
+        if "id_produto" in self.cabecalho and mudancas:
+            cursor.execute(f"""
+                SELECT DISTINCT Produto.id_produto
+                FROM {STAGING} s
+                    JOIN Produto ON Produto.id_produto = s.id_produto
+                WHERE {" OR ".join(mudancas)}
+                """)
+            alterados = [linha[0] for linha in cursor.fetchall()]
+        super().mesclar(cursor)
+        if "id_produto" in self.cabecalho:
+            # O COPY não dispara os receivers; os produtos atualizados podem
+            # ser muitos, então o namespace inteiro é invalidado.
+            invalidar_catalogo("produto")
+        if alterados:
+            recalcular_valor_total(
+                "id_pedido IN (SELECT pedido_id FROM Contem WHERE produto_id = ANY(%s))",
+                [alterados],
+            )
+
+
+class ImportacaoPedidos(Importacao):
+    """Pedidos com os itens, uma linha por item, no formato da exportação.
+
+    ``id_pedido`` agrupa as linhas de um pedido e é obrigatório; os dados do
+    pedido vêm da última linha dele e os itens do arquivo passam a ser todos
+    os itens do pedido. Se uma linha é recusada, o pedido inteiro é recusado.
+    """
+
+    model = Pedido
+    models_verificados = (Pedido, Contem)
+
+    def __init__(self, cabecalho, rejeitar):
+        super().__init__(cabecalho, rejeitar)
+        if "id_pedido" not in self.cabecalho:
+            raise ValueError("Colunas obrigatórias ausentes: id_pedido.")
+        self.pedidos_recusados = set()
+
+    def campos(self):
+        campos = super().campos()
+        for nome in ("produto", "quantidade"):
+            field = Contem._meta.get_field(nome)
+            campos[field.attname] = field
+        return campos
+
+    def linha_recusada(self, valores):
+        if valores.get("id_pedido") is not None:
+            self.pedidos_recusados.add(valores["id_pedido"])
+
+    def verificar_restricoes(self, cursor):
+        self.recusar(cursor, "id_pedido IS NULL", "id_pedido: obrigatório.")
+        super().verificar_restricoes(cursor)
+
+    def verificar_chaves_estrangeiras(self, cursor):
+        super().verificar_chaves_estrangeiras(cursor)
+        # As linhas recusadas aqui não tornam a recusar outros pedidos.
+        self.recusar(
+            cursor,
+            "id_pedido = ANY(%s)",
+            "Outra linha do mesmo pedido foi recusada.",
+            [list(self.pedidos_recusados)],
+        )
+
+    def mesclar(self, cursor):
+        pedido = [c.coluna for c in self.colunas if c.field.model is Pedido]
+        self.upsert(
+            cursor,
+            Pedido,
+            pedido,
+            f"""
+            SELECT DISTINCT ON (id_pedido) {", ".join(pedido)}
+            FROM {STAGING}
+            ORDER BY id_pedido, linha DESC
+            """,
+        )
+        self.ajustar_sequencia(cursor, Pedido)
+
+        # Os itens do arquivo substituem os do pedido. Apagar e inserir não
+        # depende da restrição única de (pedido, produto), que o
+        # sript_criacaoBD.sql não cria.
+        cursor.execute(f"""
+            DELETE FROM Contem
+            WHERE pedido_id IN (SELECT id_pedido FROM {STAGING})
+            """)
+        cursor.execute(f"""
+            INSERT INTO Contem (pedido_id, produto_id, quantidade)
+            SELECT DISTINCT ON (id_pedido, produto_id) id_pedido, produto_id, quantidade
+            FROM {STAGING}
+            ORDER BY id_pedido, produto_id, linha DESC
+            """)
+        recalcular_valor_total(f"id_pedido IN (SELECT id_pedido FROM {STAGING})", [])
+
+        baixar_estoque_pedidos(
+            f"Pedido.id_pedido IN (SELECT id_pedido FROM {STAGING})", []
+        )
+
+
+IMPORTACOES = {
+    "clientes": ImportacaoClientes,
+    "produtos": ImportacaoProdutos,
+    "pedidos": ImportacaoPedidos,
+}
+
+
+def ler_csv(arquivo, delimitador=","):
+    """Retorna ``(cabecalho, linhas)``; as linhas saem numeradas como no arquivo."""
+    leitor = csv.reader(arquivo, delimiter=delimitador)
+    cabecalho = [nome.strip() for nome in next(leitor, [])]
+    return cabecalho, ((leitor.line_num, linha) for linha in leitor)
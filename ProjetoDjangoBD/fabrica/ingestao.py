@@ -0,0 +1,306 @@
+"""Criação de pedidos com itens em lote, para a API (POST /api/pedidos/).
+
+Cada pedido do lote é validado em memória: os campos com os mesmos
+conversores da importação de CSV e as CheckConstraints de Pedido e Contem
+avaliadas em Python, sem uma consulta por pedido. Os válidos são gravados
+numa única transação (``bulk_create`` para os pedidos, que precisam dos
+ids, e COPY para os itens), sem os receivers de post_save:
+``valor_total`` já vai calculado e a baixa de estoque dos processados sai
+numa instrução para o lote todo (``baixar_estoque_pedidos``).
+
+Pendentes e processados só entram se houver estoque disponível para
+prometer (ver models.disponibilidade), distribuído na ordem do lote: os
+pendentes ganham reservas e os processados já consomem o estoque.
+"""
+
+import operator
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+from django.db.models.functions import Now
+
+from .importacao import Coluna
+from .models import (
+    Contem,
+    Pedido,
+    baixar_estoque_pedidos,
+    disponibilidade,
+    travar_produtos,
+    validade_reserva,
+)
+
+# Pedidos aceitos por requisição.
+LIMITE_PEDIDOS = 1_000
+# Status que reservam ou consomem estoque ao serem criados.
+STATUS_COM_ESTOQUE = (Pedido.PENDENTE, Pedido.PROCESSADO)
+
+CAMPOS_PEDIDO = {
+    field.attname: Coluna(field)
+    for field in Pedido._meta.concrete_fields
+    if field.editable and not field.primary_key
+}
+CAMPOS_ITEM = {
+    field.attname: Coluna(field)
+    for field in (
+        Contem._meta.get_field("produto"),
+        Contem._meta.get_field("quantidade"),
+    )
+}
+
+OPERADORES = {
+    "exact": operator.eq,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+
+def avaliar(model, condicao, valores, agora):
+    """Valor da condição (um Q) de uma CheckConstraint sobre ``valores``.
+
+    ``valores`` vem por attname e ``agora`` faz o papel de ``Now()``. Segue
+    a lógica de três valores do SQL: ``None`` é desconhecido, e um CHECK só
+    é violado quando a condição é falsa.
+    """
+    resultados = [
+        (
+            avaliar(model, filho, valores, agora)
+            if isinstance(filho, models.Q)
+            else _comparar(model, *filho, valores, agora)
+        )
+        for filho in condicao.children
+    ]
+    decisivo = False if condicao.connector == models.Q.AND else True
+    if any(resultado is decisivo for resultado in resultados):
+        resultado = decisivo
+    elif any(resultado is None for resultado in resultados):
+        resultado = None
+    else:
+        resultado = not decisivo
+    if condicao.negated and resultado is not None:
+        resultado = not resultado
+    return resultado
+
+
+def _comparar(model, chave, alvo, valores, agora):
+    campo, _, lookup = chave.partition("__")
+    lookup = lookup or "exact"
+
+    def valor(expressao):
+        if isinstance(expressao, models.F):
+            return valores.get(model._meta.get_field(expressao.name).attname)
+        if isinstance(expressao, Now):
+            return agora
+        return expressao
+
+    esquerda = valor(models.F(campo))
+    if esquerda is None:
+        return None
+    if lookup == "in":
+        return esquerda in [valor(item) for item in alvo]
+    if lookup not in OPERADORES:
+        raise ValueError(f"Lookup {lookup!r} não suportado em {model.__name__}.")
+    direita = valor(alvo)
+    if direita is None:
+        return None
+    return OPERADORES[lookup](*_comparaveis(esquerda, direita))
+
+
+def _comparaveis(a, b):
+    """Como no PostgreSQL, a data comparada a um instante vira meia-noite."""
+
+    def instante(valor):
+        return datetime.combine(valor, time.min, tzinfo=connection.timezone)
+
+    if isinstance(a, datetime) and not isinstance(b, datetime):
+        return a, instante(b)
+    if isinstance(b, datetime) and not isinstance(a, datetime):
+        return instante(a), b
+    return a, b
+
+
+def violacoes(model, valores, agora):
+    """Nomes das CheckConstraints de ``model`` violadas por ``valores``."""
+    return [
+        constraint.name
+        for constraint in model._meta.constraints
+        if isinstance(constraint, models.CheckConstraint)
+        and avaliar(model, constraint.check, valores, agora) is False
+    ]
+
+
+def _converter(campos, dados, erros, prefixo=""):
+    """Valores de ``dados`` (um objeto do JSON) convertidos por ``campos``."""
+    desconhecidos = sorted(set(dados) - set(campos))
+    if desconhecidos:
+        erros.append(f"{prefixo}Campos desconhecidos: {', '.join(desconhecidos)}.")
+    valores = {}
+    for nome, coluna in campos.items():
+        valor = dados.get(nome)
+        try:
+            valores[nome] = coluna.converter("" if valor is None else str(valor))
+        except ValidationError as e:
+            erros.extend(f"{prefixo}{mensagem}" for mensagem in e.messages)
+    return valores
+
+
+def validar(dados):
+    """Converte um pedido do JSON; retorna ``(pedido, itens, erros)``.
+
+    As restrições e as chaves estrangeiras ficam para ``criar_pedidos``.
+    """
+    erros = []
+    if not isinstance(dados, dict):
+        return None, [], ["Cada pedido deve ser um objeto."]
+    dados = dict(dados)
+    itens_dados = dados.pop("itens", None)
+    pedido = _converter(CAMPOS_PEDIDO, dados, erros)
+    if not isinstance(itens_dados, list) or not itens_dados:
+        erros.append("itens: informe uma lista com ao menos um item.")
+        itens_dados = []
+    itens = []
+    for i, item in enumerate(itens_dados):
+        if not isinstance(item, dict):
+            erros.append(f"itens[{i}]: deve ser um objeto.")
+            continue
+        itens.append(_converter(CAMPOS_ITEM, item, erros, f"itens[{i}]: "))
+    produtos = [item.get("produto_id") for item in itens]
+    if len(set(produtos)) != len(produtos):
+        erros.append("Viola unique_pedido_produto.")
+    return pedido, itens, erros
+
+
+def criar_pedidos(lote):
+    """Cria os pedidos válidos de ``lote`` e retorna ``(ids, erros)``.
+
+    ``ids`` acompanha o lote, com ``None`` nos recusados, e ``erros`` leva
+    as mensagens de cada recusado pela posição dele. Um pedido com algum
+    erro é recusado inteiro; os demais são gravados mesmo assim.
+    """
+    validados = [validar(dados) for dados in lote]
+    clientes = {p["cliente_id"] for p, _, erros in validados if not erros}
+    produtos = {
+        item["produto_id"]
+        for _, itens, erros in validados
+        if not erros
+        for item in itens
+    }
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # CURRENT_TIMESTAMP é o Now() das restrições dentro desta transação.
+        cursor.execute(
+            """
+            SELECT CURRENT_TIMESTAMP,
+                   ARRAY(SELECT id_cliente FROM Cliente WHERE id_cliente = ANY(%s))
+            """,
+            [list(clientes)],
+        )
+        agora, existentes = cursor.fetchone()
+        existentes = set(existentes)
+        # FOR SHARE segura o preço até o commit: uma mudança de preço
+        # concorrente espera e depois recalcula também estes pedidos.
+        cursor.execute(
+            """
+            SELECT id_produto, custo_unitario
+            FROM Produto
+            WHERE id_produto = ANY(%s)
+            ORDER BY id_produto
+            FOR SHARE
+            """,
+            [list(produtos)],
+        )
+        precos = dict(cursor.fetchall())
+        # Travas das reservas até o commit; o saldo sai de uma consulta
+        # feita depois delas.
+        reservando = {
+            item["produto_id"]
+            for pedido, itens, erros in validados
+            if not erros and pedido["status"] in STATUS_COM_ESTOQUE
+            for item in itens
+        }
+        saldo = {}
+        if reservando:
+            travar_produtos(reservando)
+            saldo = {
+                produto: disponivel
+                for produto, (disponivel, _) in disponibilidade(reservando).items()
+            }
+
+        pedidos = []
+        itens_validos = []
+        erros_por_posicao = {}
+        for posicao, (pedido, itens, erros) in enumerate(validados):
+            if not erros:
+                erros.extend(
+                    f"Viola {nome}." for nome in violacoes(Pedido, pedido, agora)
+                )
+                for i, item in enumerate(itens):
+                    erros.extend(
+                        f"itens[{i}]: Viola {nome}."
+                        for nome in violacoes(Contem, item, agora)
+                    )
+                    if item["produto_id"] not in precos:
+                        erros.append(f"itens[{i}]: produto inexistente.")
+                if pedido["cliente_id"] not in existentes:
+                    erros.append("cliente_id: cliente inexistente.")
+            if not erros and pedido["status"] in STATUS_COM_ESTOQUE:
+                erros.extend(
+                    f"itens[{i}]: estoque insuficiente "
+                    f"(disponível {max(saldo[item['produto_id']], 0)})."
+                    for i, item in enumerate(itens)
+                    if item["quantidade"] > saldo[item["produto_id"]]
+                )
+                if not erros:
+                    for item in itens:
+                        saldo[item["produto_id"]] -= item["quantidade"]
+            if erros:
+                erros_por_posicao[posicao] = erros
+                continue
+            valor_total = sum(
+                (precos[item["produto_id"]] * item["quantidade"] for item in itens),
+                Decimal(0),
+            )
+            pedidos.append(Pedido(**pedido, valor_total=valor_total))
+            itens_validos.append(itens)
+
+        Pedido.objects.bulk_create(pedidos)
+        # Os itens não precisam dos ids de volta; o COPY evita montar o
+        # INSERT pelo ORM, que custa mais que a gravação.
+        with cursor.copy(
+            "COPY Contem (pedido_id, produto_id, quantidade) FROM STDIN"
+        ) as copy:
+            for pedido, itens in zip(pedidos, itens_validos):
+                for item in itens:
+                    copy.write_row((pedido.pk, item["produto_id"], item["quantidade"]))
+        pendentes = [
+            (pedido, itens)
+            for pedido, itens in zip(pedidos, itens_validos)
+            if pedido.status == Pedido.PENDENTE
+        ]
+        if pendentes:
+            expira_em = agora + validade_reserva()
+            with cursor.copy(
+                "COPY Reserva (pedido_id, produto_id, quantidade, expira_em) FROM STDIN"
+            ) as copy:
+                for pedido, itens in pendentes:
+                    for item in itens:
+                        copy.write_row(
+                            (
+                                pedido.pk,
+                                item["produto_id"],
+                                item["quantidade"],
+                                expira_em,
+                            )
+                        )
+        criados = [pedido.pk for pedido in pedidos]
+        if any(pedido.status == Pedido.PROCESSADO for pedido in pedidos):
+            baixar_estoque_pedidos("Pedido.id_pedido = ANY(%s)", [criados])
+
+    ids = iter(criados)
+    return [
+        None if posicao in erros_por_posicao else next(ids)
+        for posicao in range(len(lote))
+    ], erros_por_posicao
@@ -0,0 +1,214 @@
+import heapq
+import logging
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_LITERAIS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_ESPACOS = re.compile(r"\s+")
+
+
+def impressao_digital(sql):
+    """SQL sem literais e com espaços normalizados.
+
+    Os parâmetros já chegam separados do SQL; isto junta também as consultas
+    que só diferem por valores escritos no próprio texto.
+    """
+    return _ESPACOS.sub(" ", _LITERAIS.sub("?", sql)).strip()
+
+
+class ColetorDeConsultas:
+    """execute_wrapper que mede as consultas de uma requisição.
+
+    No modo leve só conta e soma o tempo; no completo também agrupa por
+    impressão digital (para achar N+1) e guarda cada consulta, com os
+    parâmetros, em ``consultas`` (para as mais lentas e para um EXPLAIN).
+    """
+
+    def __init__(self, completo):
+        self.completo = completo
+        self.total = 0
+        self.tempo = 0.0
+        self.por_impressao = Counter()
+        self.consultas = []  # (ms, sql, params), no modo completo
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracao = (time.perf_counter() - inicio) * 1000
+            self.total += 1
+            self.tempo += duracao
+            if self.completo:
+                self.por_impressao[impressao_digital(sql)] += 1
+                self.consultas.append((duracao, sql, params))
+
+    def mais_lentas(self, quantidade=3):
+        return [
+            (duracao, sql)
+            for duracao, sql, _ in heapq.nlargest(
+                quantidade, self.consultas, key=lambda item: item[0]
+            )
+        ]
+
+    def repetidas(self, limite):
+        """Impressões executadas ``limite`` vezes ou mais na requisição."""
+        return {
+            impressao: vezes
+            for impressao, vezes in self.por_impressao.items()
+            if vezes >= limite
+        }
+
+
+class Estatisticas:
+    """Janela deslizante, em memória do processo, das últimas requisições."""
+
+    def __init__(self, janela=500, lentas=10):
+        self.lock = threading.Lock()
+        self.rotas = defaultdict(lambda: deque(maxlen=janela))
+        self.repetidas = Counter()
+        self.max_lentas = lentas
+        self.lentas = []  # heap mínimo de (ms, rota, sql)
+
+    def registrar(self, rota, coletor, repetidas):
+        lentas = coletor.mais_lentas() if coletor.completo else []
+        with self.lock:
+            self.rotas[rota].append((coletor.total, coletor.tempo))
+            self.repetidas.update(repetidas)
+            for duracao, sql in lentas:
+                item = (duracao, rota, impressao_digital(sql))
+                if len(self.lentas) < self.max_lentas:
+                    heapq.heappush(self.lentas, item)
+                elif item > self.lentas[0]:
+                    heapq.heapreplace(self.lentas, item)
+
+    def resumo(self):
+        with self.lock:
+            rotas = {rota: list(amostras) for rota, amostras in self.rotas.items()}
+            repetidas = self.repetidas.most_common(10)
+            lentas = sorted(self.lentas, reverse=True)
+        return {
+            "rotas": {
+                rota: {
+                    "requisicoes": len(amostras),
+                    "consultas_mediana": statistics.median(c for c, _ in amostras),
+                    "consultas_max": max(c for c, _ in amostras),
+                    "tempo_db_ms_mediana": round(
+                        statistics.median(t for _, t in amostras), 2
+                    ),
+                    "tempo_db_ms_max": round(max(t for _, t in amostras), 2),
+                }
+                for rota, amostras in rotas.items()
+            },
+            "repetidas": [
+                {"sql": impressao, "vezes": vezes} for impressao, vezes in repetidas
+            ],
+            "mais_lentas": [
+                {"ms": round(duracao, 2), "rota": rota, "sql": sql}
+                for duracao, rota, sql in lentas
+            ],
+        }
+
+    def limpar(self):
+        with self.lock:
+            self.rotas.clear()
+            self.repetidas.clear()
+            self.lentas.clear()
+
+
+ESTATISTICAS = Estatisticas()
+
+
+def estatisticas_conexoes():
+    """Contadores do pool de conexões deste processo, ou ``None`` sem pool.
+
+    ``requests_waiting`` é quem espera uma conexão agora e
+    ``espera_media_ms`` o tempo médio para obter uma, desde o início.
+    """
+    pool = connection.pool
+    if pool is None:
+        return None
+    estatisticas = pool.get_stats()
+    pedidos = estatisticas.get("requests_num", 0)
+    estatisticas["espera_media_ms"] = round(
+        estatisticas.get("requests_wait_ms", 0) / pedidos if pedidos else 0, 2
+    )
+    return estatisticas
+
+
+class InstrumentacaoSqlMiddleware:
+    """Mede as consultas de cada requisição e as expõe em cabeçalhos.
+
+    ``settings.INSTRUMENTACAO_SQL`` escolhe o modo: ``"completo"``,
+    ``"leve"`` (barato o bastante para produção) ou ``"desligado"``.
+
+    Também roda no modo async: um middleware só síncrono faria o ASGI servir
+    cada requisição numa thread e perder a concorrência das views async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.modo = getattr(settings, "INSTRUMENTACAO_SQL", "leve")
+        self.limite_repeticoes = getattr(settings, "INSTRUMENTACAO_SQL_REPETICOES", 5)
+        if self.modo == "desligado":
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        coletor = ColetorDeConsultas(completo=self.modo == "completo")
+        with connection.execute_wrapper(coletor):
+            response = self.get_response(request)
+        return self.registrar(request, response, coletor)
+
+    async def __acall__(self, request):
+        # Conta o que o ORM executa por sync_to_async; as consultas de
+        # fabrica/assincrono.py não passam pelo ORM e ficam de fora.
+        coletor = ColetorDeConsultas(completo=self.modo == "completo")
+        with connection.execute_wrapper(coletor):
+            response = await self.get_response(request)
+        return self.registrar(request, response, coletor)
+
+    def registrar(self, request, response, coletor):
+        timing = f'db;dur={coletor.tempo:.1f};desc="{coletor.total} consultas"'
+        if response.has_header("Server-Timing"):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response["Server-Timing"] = timing
+        response["X-DB-Consultas"] = str(coletor.total)
+
+        repetidas = {}
+        if coletor.completo:
+            response["X-DB-Tempo-Ms"] = f"{coletor.tempo:.1f}"
+            repetidas = coletor.repetidas(self.limite_repeticoes)
+            if repetidas:
+                response["X-DB-Repetidas"] = str(max(repetidas.values()))
+                for impressao, vezes in repetidas.items():
+                    logger.warning(
+                        "Possível N+1 em %s: %d execuções de %s",
+                        request.path,
+                        vezes,
+                        impressao[:300],
+                    )
+            for duracao, sql in coletor.mais_lentas():
+                logger.debug("%.1f ms em %s: %s", duracao, request.path, sql[:300])
+
+        match = request.resolver_match
+        ESTATISTICAS.registrar(
+            match.route if match else "<sem rota>", coletor, repetidas
+        )
+        return response
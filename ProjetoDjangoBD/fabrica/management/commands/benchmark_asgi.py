@@ -0,0 +1,146 @@
+import asyncio
+import queue
+import threading
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from fabrica import assincrono
+from fabrica.management.dados import popular
+from fabrica.management.utils import (
+    banco_descartavel,
+    percentil,
+    requisitar,
+    requisitar_asgi,
+)
+
+# Rota síncrona e sua versão async (setup/urls.py).
+ROTAS = [("/estoque/", "/async/estoque/"), ("/fornecedores/", "/async/fornecedores/")]
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula um banco descartável e mede as listas de estoque e de "
+        "fornecedores com --clientes clientes simultâneos: as views síncronas "
+        "pelo WSGIHandler, atendidas por --threads threads como num servidor "
+        "WSGI, e as async pelo app de setup/asgi.py, num único event loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clientes", type=int, default=200)
+        parser.add_argument(
+            "--requisicoes", type=int, default=10, help="Requisições por cliente."
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=10,
+            help="Threads do servidor WSGI (não passe do tamanho do pool).",
+        )
+
+    def handle(self, *args, **options):
+        with banco_descartavel():
+            popular(
+                clientes=1_000,
+                pedidos=5_000,
+                produtos=100,
+                materias_primas=100,
+                fornecedores=2_000,
+                funcionarios=10,
+                ordens=10,
+            )
+            self.stdout.write(
+                f"{options['clientes']} clientes x {options['requisicoes']} "
+                f"requisições, WSGI com {options['threads']} threads"
+            )
+            try:
+                for sincrona, assincrona in ROTAS:
+                    self.stdout.write(f"\n{sincrona}:")
+                    self.relatar("WSGI", self.medir_wsgi(sincrona, options))
+                    self.relatar(
+                        "ASGI", asyncio.run(self.medir_asgi(assincrona, options))
+                    )
+            finally:
+                connection.close()
+                connection.close_pool()
+
+    def relatar(self, nome, medida):
+        tempos, statuses, segundos = medida
+        erros = sum(1 for status in statuses if status != 200)
+        self.stdout.write(
+            f"  {nome}  {len(tempos) / segundos:>7.1f} req/s  "
+            f"p50 {percentil(tempos, 50):>7.1f} ms  "
+            f"p95 {percentil(tempos, 95):>7.1f} ms  "
+            f"p99 {percentil(tempos, 99):>7.1f} ms  {erros} erros"
+        )
+
+    def medir_wsgi(self, caminho, options):
+        """Cada cliente espera sua requisição passar pela fila do servidor."""
+        handler = WSGIHandler()
+        fila = queue.Queue()
+        tempos, statuses = [], []
+        lock = threading.Lock()
+
+        def servir():
+            try:
+                while (item := fila.get()) is not None:
+                    resposta, pronto = item
+                    resposta.append(requisitar(handler, caminho)[0])
+                    pronto.set()
+            finally:
+                connections.close_all()
+
+        def cliente():
+            for _ in range(options["requisicoes"]):
+                resposta, pronto = [], threading.Event()
+                inicio = time.perf_counter()
+                fila.put((resposta, pronto))
+                pronto.wait()
+                with lock:
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                    statuses.append(resposta[0])
+
+        servidores = [
+            threading.Thread(target=servir) for _ in range(options["threads"])
+        ]
+        clientes = [
+            threading.Thread(target=cliente) for _ in range(options["clientes"])
+        ]
+        requisitar(handler, caminho)
+        for thread in servidores:
+            thread.start()
+        inicio = time.perf_counter()
+        for thread in clientes:
+            thread.start()
+        for thread in clientes:
+            thread.join()
+        segundos = time.perf_counter() - inicio
+        for _ in servidores:
+            fila.put(None)
+        for thread in servidores:
+            thread.join()
+        return tempos, statuses, segundos
+
+    async def medir_asgi(self, caminho, options):
+        from setup.asgi import application
+
+        tempos, statuses = [], []
+
+        async def cliente():
+            for _ in range(options["requisicoes"]):
+                inicio = time.perf_counter()
+                status, _, _ = await requisitar_asgi(application, caminho)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+                statuses.append(status)
+
+        # Aquece o pool, como o lifespan faria antes do tráfego.
+        await requisitar_asgi(application, caminho)
+        try:
+            inicio = time.perf_counter()
+            await asyncio.gather(*(cliente() for _ in range(options["clientes"])))
+            segundos = time.perf_counter() - inicio
+        finally:
+            await assincrono.fechar_pool()
+        return tempos, statuses, segundos
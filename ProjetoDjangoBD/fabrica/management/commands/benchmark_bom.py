@@ -0,0 +1,108 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from fabrica.instrumentacao import ColetorDeConsultas
+from fabrica.management.utils import banco_descartavel, medir, resumo
+from fabrica.models import OrdemProducao, reduce_materiaprima_estoque
+
+
+def reduce_materiaprima_estoque_antigo(instance):
+    """Implementação anterior: uma consulta e um UPDATE por componente."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT produto_id, quantidade FROM ContemOrdemProducao WHERE ordem_id = %s",
+            [instance.id_ordem],
+        )
+        for produto_id, quantidade in cursor.fetchall():
+            cursor.execute(
+                "SELECT materiaprima_id, quantidade FROM Constituido WHERE produto_id = %s",
+                [produto_id],
+            )
+            for materiaprima_id, constituido_quantidade in cursor.fetchall():
+                cursor.execute(
+                    """
+                    UPDATE MateriaPrima
+                    SET estoque_disponivel = estoque_disponivel - %s
+                    WHERE id_materiaprima = %s
+                    """,
+                    [constituido_quantidade * quantidade, materiaprima_id],
+                )
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede idas ao banco e latência da baixa de matérias-primas de uma "
+        "ordem de produção, antes e depois da explosão da lista de materiais "
+        "em um único UPDATE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--produtos", type=int, default=200)
+        parser.add_argument("--materias-primas", type=int, default=30)
+        parser.add_argument("--repeticoes", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with banco_descartavel():
+            ordem = self.popular(options["produtos"], options["materias_primas"])
+            self.stdout.write(
+                f"ordem com {options['produtos']} produtos x "
+                f"{options['materias_primas']} matérias-primas"
+            )
+            for nome, funcao in [
+                ("antes", reduce_materiaprima_estoque_antigo),
+                ("depois", lambda ordem: reduce_materiaprima_estoque([ordem.pk])),
+            ]:
+                contador = ColetorDeConsultas(completo=False)
+                with connection.execute_wrapper(contador):
+                    tempos = medir(
+                        lambda: self.executar(funcao, ordem), options["repeticoes"]
+                    )
+                idas = contador.total // options["repeticoes"]
+                self.stdout.write(f"{nome}: {idas} idas ao banco, {resumo(tempos)}")
+
+    def executar(self, funcao, ordem):
+        with transaction.atomic():
+            funcao(ordem)
+            transaction.set_rollback(True)
+
+    def popular(self, total_produtos, total_materias_primas):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO Produto (nome, estoque_disponivel, limite_estoque_baixo,
+                                     custo_unitario)
+                SELECT 'Produto ' || g, 0, 0, 10
+                FROM generate_series(1, %s) AS g
+                """,
+                [total_produtos],
+            )
+            cursor.execute(
+                """
+                INSERT INTO MateriaPrima (nome, custo_unidade, estoque_disponivel,
+                                          limite_estoque_baixo)
+                SELECT 'Matéria-prima ' || g, 1, 1000000, 0
+                FROM generate_series(1, %s) AS g
+                """,
+                [total_materias_primas],
+            )
+            cursor.execute("""
+                INSERT INTO Constituido (produto_id, materiaprima_id, quantidade)
+                SELECT id_produto, id_materiaprima, 1 + (id_produto + id_materiaprima) % 5
+                FROM Produto CROSS JOIN MateriaPrima
+                """)
+            cursor.execute("""
+                INSERT INTO OrdemProducao (status, data_criacao)
+                VALUES ('Pendente', CURRENT_DATE)
+                RETURNING id_ordem
+                """)
+            (id_ordem,) = cursor.fetchone()
+            cursor.execute(
+                """
+                INSERT INTO ContemOrdemProducao (produto_id, ordem_id, quantidade)
+                SELECT id_produto, %s, 1 + id_produto %% 10
+                FROM Produto
+                """,
+                [id_ordem],
+            )
+            cursor.execute("ANALYZE")
+        return OrdemProducao.objects.get(pk=id_ordem)
@@ -0,0 +1,74 @@
+import itertools
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+
+from fabrica.management.utils import banco_descartavel, medir, resumo
+from fabrica.models import Cliente
+from fabrica.views import ClientesListView
+
+# Filtro usado pela lista de clientes antes dos índices de trigramas.
+CLIENTES_QUERY_ANTIGA = """
+    SELECT *
+    FROM Cliente
+    WHERE nome LIKE %s
+    ORDER BY id_cliente
+    LIMIT 51
+"""
+
+# Termos raros e comuns, com e sem acento/maiúsculas.
+TERMOS = ["João Silva 4242", "JOAO SILVA 4242", "LUCIO 99995", "araujo", "zz-nada"]
+
+SOBRENOMES = ["Silva", "Conceição", "Araújo", "Gonçalves", "Souza", "Lúcio"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula um banco descartável com clientes e mede a latência da busca "
+        "por nome na lista de clientes, com LIKE simples e com o filtro "
+        "indexado por trigramas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clientes", type=int, default=1_000_000)
+        parser.add_argument("--repeticoes", type=int, default=50)
+
+    def handle(self, *args, **options):
+        with banco_descartavel():
+            self.popular(options["clientes"])
+
+            view = ClientesListView.as_view()
+            factory = RequestFactory()
+            termos_antes = itertools.cycle(TERMOS)
+            termos_depois = itertools.cycle(TERMOS)
+
+            def antes():
+                termo = next(termos_antes)
+                list(Cliente.objects.raw(CLIENTES_QUERY_ANTIGA, [f"%{termo}%"]))
+
+            def depois():
+                view(factory.get("/clientes/", {"nome": next(termos_depois)}))
+
+            repeticoes = options["repeticoes"]
+            self.stdout.write(f"{options['clientes']} clientes")
+            self.stdout.write(f"LIKE:      {resumo(medir(antes, repeticoes))}")
+            self.stdout.write(f"trigramas: {resumo(medir(depois, repeticoes))}")
+
+    def popular(self, total_clientes):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO Cliente (nome, telefone, email, numero, cep, logradouro)
+                SELECT CASE WHEN g %% 2 = 0 THEN 'João ' ELSE 'Maria ' END
+                           || (%s::text[])[1 + g %% 6] || ' ' || g,
+                       '119' || lpad(g::text, 8, '0'),
+                       'cliente' || g || '@example.com',
+                       g %% 5000,
+                       lpad((g %% 100000)::text, 5, '0') || '-000',
+                       'Rua ' || (%s::text[])[1 + g %% 6]
+                FROM generate_series(1, %s) AS g
+                """,
+                [SOBRENOMES, SOBRENOMES, total_clientes],
+            )
+            cursor.execute("ANALYZE")
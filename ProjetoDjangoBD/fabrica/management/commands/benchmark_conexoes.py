@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from fabrica.instrumentacao import estatisticas_conexoes
+from fabrica.management.dados import popular
+from fabrica.management.utils import banco_descartavel, percentil, requisitar
+from fabrica.models import Cliente
+
+# Opções do banco em cada modo de DB_CONEXOES (ver setup/settings.py).
+MODOS = {
+    "nenhum": {"CONN_MAX_AGE": 0},
+    "persistente": {"CONN_MAX_AGE": 600},
+    "pool": {"CONN_MAX_AGE": 0, "pool": True},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula um banco descartável e mede requisições por segundo numa "
+        "rota, em threads concorrentes, com uma conexão nova por requisição, "
+        "com conexões persistentes e com o pool do psycopg_pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--caminho", help="Rota medida (padrão: o detalhe do primeiro cliente)."
+        )
+        parser.add_argument("--requisicoes", type=int, default=2_000)
+        parser.add_argument("--concorrencia", type=int, default=8)
+        parser.add_argument(
+            "--modos", nargs="+", choices=list(MODOS), default=list(MODOS)
+        )
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        originais = {
+            "OPTIONS": settings_dict["OPTIONS"],
+            "CONN_MAX_AGE": settings_dict["CONN_MAX_AGE"],
+        }
+        with banco_descartavel():
+            popular(
+                clientes=10_000,
+                pedidos=10_000,
+                produtos=100,
+                materias_primas=100,
+                fornecedores=1_000,
+                funcionarios=10,
+                ordens=10,
+            )
+            if not options["caminho"]:
+                cliente = Cliente.objects.order_by("pk").first()
+                options["caminho"] = f"/cliente/{cliente.pk}/"
+            self.stdout.write(
+                f"{options['requisicoes']} GET {options['caminho']}, "
+                f"{options['concorrencia']} threads"
+            )
+            try:
+                for modo in options["modos"]:
+                    self.configurar(modo, originais, options["concorrencia"])
+                    self.medir(modo, options)
+            finally:
+                connection.close()
+                connection.close_pool()
+                settings_dict.update(originais)
+
+    def configurar(self, modo, originais, concorrencia):
+        """Troca o modo das conexões criadas daqui em diante.
+
+        As threads do teste criam suas conexões a partir do mesmo
+        ``settings_dict``, então basta alterá-lo e descartar o pool atual.
+        """
+        connection.close()
+        connection.close_pool()
+        opcoes = dict(originais["OPTIONS"])
+        pool = opcoes.pop("pool", None)
+        if MODOS[modo].get("pool"):
+            # O pool de settings, se houver, com uma conexão por thread.
+            pool = dict(pool) if isinstance(pool, dict) else {}
+            pool["min_size"] = pool["max_size"] = concorrencia
+            opcoes["pool"] = pool
+        connection.settings_dict["OPTIONS"] = opcoes
+        connection.settings_dict["CONN_MAX_AGE"] = MODOS[modo]["CONN_MAX_AGE"]
+
+    def medir(self, modo, options):
+        pendentes = queue.Queue()
+        for _ in range(options["requisicoes"]):
+            pendentes.put(options["caminho"])
+        resultados = []
+        lock = threading.Lock()
+        handler = WSGIHandler()
+
+        def trabalhar():
+            try:
+                while True:
+                    try:
+                        caminho = pendentes.get_nowait()
+                    except queue.Empty:
+                        return
+                    inicio = time.perf_counter()
+                    status, _, _ = requisitar(handler, caminho)
+                    tempo = (time.perf_counter() - inicio) * 1000
+                    with lock:
+                        resultados.append((tempo, status))
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=trabalhar) for _ in range(options["concorrencia"])
+        ]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        segundos = time.perf_counter() - inicio
+
+        tempos = [tempo for tempo, _ in resultados]
+        erros = sum(1 for _, status in resultados if status >= 400)
+        self.stdout.write(
+            f"  {modo:<12} {len(resultados) / segundos:>7.1f} req/s  "
+            f"p50 {percentil(tempos, 50):.1f} ms  p95 {percentil(tempos, 95):.1f} ms  "
+            f"{erros} erros"
+        )
+        if estatisticas := estatisticas_conexoes():
+            self.stdout.write(
+                f"  {'':<12} pool: {estatisticas.get('requests_num', 0)} retiradas, "
+                f"{estatisticas.get('connections_num', 0)} conexões abertas, "
+                f"{estatisticas['espera_media_ms']} ms de espera média"
+            )
@@ -0,0 +1,114 @@
+import random
+import re
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from fabrica.management.dados import popular
+from fabrica.management.utils import banco_descartavel, limpar_caches, medir, resumo
+from fabrica.models import Contem, Fornece, Fornecedor, Pedido
+from fabrica.paginacao import KeysetPaginator
+from fabrica.views import FornecedoresListView, PedidosListView
+
+# O token de CSRF muda a cada requisição; o resto da página deve ser igual.
+TOKEN_CSRF = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]*"')
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula um banco descartável e mede uma página de --linhas pedidos e "
+        "de fornecedores sem o cache de fragmentos, com ele vazio, cheio e "
+        "com --churn %% das linhas alteradas (pelos modelos, como no admin) "
+        "antes de cada requisição."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--linhas", type=int, default=10_000)
+        parser.add_argument("--churn", type=float, default=1.0)
+        parser.add_argument("--repeticoes", type=int, default=5)
+
+    def handle(self, *args, **options):
+        linhas = options["linhas"]
+        alteradas = max(round(linhas * options["churn"] / 100), 1)
+        with banco_descartavel():
+            popular(
+                clientes=1_000,
+                pedidos=linhas,
+                produtos=100,
+                materias_primas=100,
+                fornecedores=linhas,
+                funcionarios=10,
+                ordens=10,
+            )
+            for view_class, caminho, alterar in (
+                (PedidosListView, "/pedidos/", self.alterar_pedidos),
+                (FornecedoresListView, "/fornecedores/", self.alterar_fornecedores),
+            ):
+                self.stdout.write(f"\n{caminho} com {linhas} linhas:")
+                self.medir_view(
+                    view_class, caminho, linhas, alteradas, alterar, options
+                )
+
+    def medir_view(self, view_class, caminho, linhas, alteradas, alterar, options):
+        # A mesma view, com todas as linhas numa página só.
+        view = type(
+            view_class.__name__,
+            (view_class,),
+            {"paginator": KeysetPaginator(view_class.paginator.ordering, linhas)},
+        ).as_view()
+        request = RequestFactory().get(caminho)
+        repeticoes = options["repeticoes"]
+
+        def requisitar():
+            return view(request)
+
+        with override_settings(FRAGMENTOS={"BACKEND": None}):
+            self.stdout.write(
+                f"  sem cache:      {resumo(medir(requisitar, repeticoes))}"
+            )
+        limpar_caches()
+        self.stdout.write(f"  cache vazio:    {resumo(medir(requisitar, 1))}")
+        self.stdout.write(f"  cache cheio:    {resumo(medir(requisitar, repeticoes))}")
+
+        tempos = []
+        for _ in range(repeticoes):
+            alterar(alteradas)
+            tempos.extend(medir(requisitar, 1))
+        self.stdout.write(
+            f"  {alteradas} alteradas: {resumo(tempos)} "
+            f"({options['churn']:g}% por requisição)"
+        )
+
+        with override_settings(FRAGMENTOS={"BACKEND": None}):
+            esperado = TOKEN_CSRF.sub(b"", requisitar().content)
+        if TOKEN_CSRF.sub(b"", requisitar().content) == esperado:
+            self.stdout.write(
+                self.style.SUCCESS("  Página igual à renderizada sem cache.")
+            )
+        else:
+            self.stdout.write(
+                self.style.ERROR("  Página diferente da renderizada sem cache!")
+            )
+
+    def alterar_pedidos(self, quantidade):
+        """Muda um item de ``quantidade`` pedidos sorteados."""
+        ids = random.sample(
+            list(Pedido.objects.values_list("pk", flat=True)), quantidade
+        )
+        itens = Contem.objects.filter(pedido_id__in=ids).distinct("pedido_id")
+        for item in itens.order_by("pedido_id"):
+            item.quantidade += 1
+            item.save()
+
+    def alterar_fornecedores(self, quantidade):
+        """Muda o preço de uma oferta de ``quantidade`` fornecedores sorteados."""
+        ids = random.sample(
+            list(Fornecedor.objects.values_list("pk", flat=True)), quantidade
+        )
+        ofertas = Fornece.objects.filter(fornecedor_id__in=ids).distinct(
+            "fornecedor_id"
+        )
+        for fornece in ofertas.order_by("fornecedor_id"):
+            fornece.preco += 1
+            fornece.save()
@@ -0,0 +1,151 @@
+import statistics
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template import Context, Template
+from django.test import RequestFactory
+
+from fabrica.management.utils import banco_descartavel, medir, resumo
+from fabrica.models import Contem, Pedido, recalcular_valor_total
+from fabrica.views import PedidosListView
+
+# Consultas e laço da página de pedidos original: todos os pedidos, sem
+# paginação, e para cada pedido uma passada por todos os itens do banco.
+TEMPLATE_ANTIGO = Template(
+    "{% for pedido in pedidos %}"
+    "{% for item in produtos %}"
+    "{% if item.pedido_id == pedido.id_pedido %}"
+    "{{ item.nome }} {{ item.quantidade }} {{ item.subtotal }}"
+    "{% endif %}"
+    "{% endfor %}"
+    "{% endfor %}"
+)
+
+PEDIDOS_QUERY_ANTIGA = """
+    SELECT
+        Pedido.*,
+        SUM(Produto.custo_unitario * Contem.quantidade) AS valor_total
+    FROM Pedido
+        JOIN Contem ON Pedido.id_pedido = Contem.pedido_id
+        JOIN Produto ON Contem.produto_id = Produto.id_produto
+    GROUP BY Pedido.id_pedido
+    ORDER BY Pedido.data_pedido DESC
+"""
+
+PRODUTOS_QUERY_ANTIGA = """
+    SELECT
+        Contem.*,
+        Produto.*,
+        Produto.custo_unitario * Contem.quantidade AS subtotal
+    FROM Contem
+        JOIN Produto ON Contem.produto_id = Produto.id_produto
+        JOIN Pedido ON Contem.pedido_id = Pedido.id_pedido
+"""
+
+
+def consultas_antigas():
+    return (
+        list(Pedido.objects.raw(PEDIDOS_QUERY_ANTIGA)),
+        list(Contem.objects.raw(PRODUTOS_QUERY_ANTIGA)),
+    )
+
+
+def pagina_antiga():
+    pedidos, produtos = consultas_antigas()
+    TEMPLATE_ANTIGO.render(Context({"pedidos": pedidos, "produtos": produtos}))
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula um banco descartável com pedidos e compara o tempo da página "
+        "de pedidos original, sem paginação e com a varredura de todos os "
+        "itens para cada pedido, com o da página atual."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pedidos", type=int, default=100_000)
+        parser.add_argument(
+            "--pedidos-antes",
+            type=int,
+            default=1_000,
+            help=(
+                "Pedidos com que a página original é renderizada; o laço dela "
+                "é quadrático e com --pedidos levaria horas."
+            ),
+        )
+        parser.add_argument("--itens-por-pedido", type=int, default=3)
+        parser.add_argument("--repeticoes", type=int, default=3)
+
+    def handle(self, *args, **options):
+        total = options["pedidos"]
+        pequena = min(options["pedidos_antes"], total)
+        itens = options["itens_por_pedido"]
+        repeticoes = options["repeticoes"]
+        with banco_descartavel():
+            self.popular_catalogo()
+            self.popular(pequena, itens)
+            antes = medir(pagina_antiga, repeticoes)
+            consultas_pequena = medir(consultas_antigas, repeticoes)
+            self.stdout.write(f"{pequena} pedidos, {pequena * itens} itens")
+            self.stdout.write(f"  antes (medido):   {resumo(antes)}")
+
+            self.popular(total - pequena, itens)
+            consultas_grande = medir(consultas_antigas, repeticoes)
+            view = PedidosListView.as_view()
+            request = RequestFactory().get("/pedidos/")
+            depois = medir(lambda: view(request), repeticoes)
+
+        # Só o laço do template cresce com o quadrado dos pedidos; as consultas
+        # antigas são medidas de verdade na escala grande.
+        laco = max(statistics.median(antes) - statistics.median(consultas_pequena), 0)
+        estimado = laco * (total / pequena) ** 2 + statistics.median(consultas_grande)
+        self.stdout.write(f"{total} pedidos, {total * itens} itens")
+        self.stdout.write(f"  consultas antigas: {resumo(consultas_grande)}")
+        self.stdout.write(f"  antes (estimado): {estimado / 1000:.0f} s")
+        self.stdout.write(f"  depois (medido):  {resumo(depois)}")
+
+    def popular_catalogo(self):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO Cliente (nome, telefone, email, numero, cep)
+                SELECT 'Cliente ' || g, '11999999999', 'cliente' || g || '@example.com',
+                       g, '01001-000'
+                FROM generate_series(1, 1000) AS g
+                """)
+            cursor.execute("""
+                INSERT INTO Produto (nome, estoque_disponivel, limite_estoque_baixo,
+                                     custo_unitario)
+                SELECT 'Produto ' || g, 1000, 100, 10 + g
+                FROM generate_series(1, 100) AS g
+                """)
+
+    def popular(self, total_pedidos, itens_por_pedido):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COALESCE(MAX(id_pedido), 0) FROM Pedido")
+            ultimo = cursor.fetchone()[0]
+            cursor.execute(
+                """
+                INSERT INTO Pedido (data_pedido, status, forma_pagamento,
+                                    data_pagamento, cliente_id)
+                SELECT CURRENT_DATE - (g %% 365), 'Entregue', 'Pix',
+                       CURRENT_DATE - (g %% 365),
+                       (SELECT MIN(id_cliente) FROM Cliente) + g %% 1000
+                FROM generate_series(1, %s) AS g
+                """,
+                [total_pedidos],
+            )
+            cursor.execute(
+                """
+                INSERT INTO Contem (pedido_id, produto_id, quantidade)
+                SELECT p.id_pedido,
+                       (SELECT MIN(id_produto) FROM Produto)
+                           + (p.id_pedido * 7 + i * 13) %% 100,
+                       1 + i
+                FROM Pedido p, generate_series(1, %s) AS i
+                WHERE p.id_pedido > %s
+                """,
+                [itens_por_pedido, ultimo],
+            )
+        recalcular_valor_total("Pedido.id_pedido > %s", [ultimo])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import resource
+import secrets
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.templatetags.static import static
+
+from fabrica.checks import validar_inicio
+from fabrica.management.dados import popular
+from fabrica.management.utils import banco_descartavel, medir, requisitar
+from fabrica.models import Cliente
+
+PERFIS = ["desenvolvimento", "producao"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula um banco descartável e, num processo por perfil de "
+        "DJANGO_PERFIL, mede latência e tamanho das respostas das páginas e "
+        "dos estáticos e a memória máxima do processo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requisicoes", type=int, default=100)
+        parser.add_argument("--perfis", nargs="+", choices=PERFIS, default=PERFIS)
+        # Uso interno: o processo filho que faz as medições.
+        parser.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["filho"]:
+            self.stdout.write(json.dumps(self.medir(options["requisicoes"])))
+            return
+
+        with banco_descartavel(), tempfile.TemporaryDirectory() as estaticos:
+            popular(
+                clientes=10_000,
+                pedidos=20_000,
+                produtos=200,
+                materias_primas=200,
+                fornecedores=2_000,
+                funcionarios=20,
+                ordens=1_000,
+            )
+            ambiente = {
+                **os.environ,
+                "DB_NOME": connection.settings_dict["NAME"],
+                "DJANGO_SECRET_KEY": secrets.token_urlsafe(50),
+                "DJANGO_ALLOWED_HOSTS": "localhost",
+                "DJANGO_STATIC_ROOT": estaticos,
+            }
+            self.manage(
+                ["collectstatic", "--noinput"],
+                {**ambiente, "DJANGO_PERFIL": "producao"},
+            )
+            resultados = {
+                perfil: json.loads(
+                    self.manage(
+                        [
+                            "benchmark_perfis",
+                            "--filho",
+                            "--requisicoes",
+                            str(options["requisicoes"]),
+                        ],
+                        {**ambiente, "DJANGO_PERFIL": perfil},
+                    )
+                )
+                for perfil in options["perfis"]
+            }
+
+        for perfil, resultado in resultados.items():
+            self.stdout.write(
+                f"\n{perfil} (memória máxima {resultado['memoria_mb']:.0f} MB):"
+            )
+            for caminho, medida in resultado["rotas"].items():
+                if medida["status"] != 200:
+                    self.stdout.write(
+                        f"  {caminho:<40} status {medida['status']} (não servido)"
+                    )
+                    continue
+                self.stdout.write(
+                    f"  {caminho:<40} {medida['ms']:>7.1f} ms "
+                    f"{medida['bytes'] / 1024:>7.1f} KB "
+                    f"{medida['cache_control'] or ''}"
+                )
+
+    def manage(self, argumentos, ambiente):
+        processo = subprocess.run(
+            [sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), *argumentos],
+            env=ambiente,
+            capture_output=True,
+            text=True,
+        )
+        if processo.returncode:
+            raise CommandError(processo.stderr)
+        return processo.stdout
+
+    def medir(self, requisicoes):
+        """Medições do processo filho, no perfil do seu DJANGO_PERFIL."""
+        validar_inicio()
+        handler = WSGIHandler()
+        cliente = Cliente.objects.order_by("pk").first()
+        caminhos = [
+            "/home/",
+            "/clientes/",
+            f"/cliente/{cliente.pk}/",
+            "/pedidos/",
+            "/fornecedores/",
+            "/estoque/",
+            static("bootstrap.css"),
+            static("bootstrap.bundle.js"),
+        ]
+        rotas = {}
+        for caminho in caminhos:
+            status, cabecalhos, tamanho = requisitar(
+                handler, caminho, HTTP_ACCEPT_ENCODING="gzip"
+            )
+            tempos = medir(
+                lambda: requisitar(handler, caminho, HTTP_ACCEPT_ENCODING="gzip"),
+                requisicoes,
+            )
+            rotas[caminho] = {
+                "status": status,
+                "ms": statistics.median(tempos),
+                "bytes": tamanho,
+                "cache_control": cabecalhos.get("Cache-Control"),
+            }
+        return {
+            "rotas": rotas,
+            # ru_maxrss vem em KB no Linux.
+            "memoria_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from fabrica.models import compactar_movimentacoes, liberar_reservas_expiradas
+
+
+class Command(BaseCommand):
+    help = (
+        "Incorpora as movimentações de estoque pendentes em "
+        "estoque_disponivel e apaga as reservas vencidas. Com --intervalo, "
+        "repete indefinidamente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=10_000)
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=0,
+            help="Segundos entre compactações; 0 executa uma única vez.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total = compactar_movimentacoes(lote=options["lote"])
+            liberadas = liberar_reservas_expiradas()
+            if options["verbosity"] > 1 or not options["intervalo"]:
+                self.stdout.write(
+                    f"{total} movimentações compactadas, "
+                    f"{liberadas} reservas vencidas liberadas"
+                )
+            if not options["intervalo"]:
+                break
+            time.sleep(options["intervalo"])
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fabrica.management.dados import popular
+
+
+class Command(BaseCommand):
+    help = (
+        "Acrescenta ao banco configurado dados sintéticos consistentes na "
+        "escala pedida, em lotes (por exemplo --clientes 1000000 --pedidos "
+        "2000000 --itens-por-pedido 5 para 10M itens)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clientes", type=int, default=20_000)
+        parser.add_argument("--pedidos", type=int, default=100_000)
+        parser.add_argument("--itens-por-pedido", type=int, default=3)
+        parser.add_argument("--produtos", type=int, default=500)
+        parser.add_argument("--materias-primas", type=int, default=500)
+        parser.add_argument(
+            "--materias-por-produto",
+            type=int,
+            default=3,
+            help="Linhas de Constituido por produto (profundidade da lista de materiais).",
+        )
+        parser.add_argument("--fornecedores", type=int, default=5_000)
+        parser.add_argument("--funcionarios", type=int, default=500)
+        parser.add_argument("--ordens", type=int, default=50_000)
+        parser.add_argument("--lote", type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            popular(
+                clientes=options["clientes"],
+                pedidos=options["pedidos"],
+                itens_por_pedido=options["itens_por_pedido"],
+                produtos=options["produtos"],
+                materias_primas=options["materias_primas"],
+                materias_por_produto=options["materias_por_produto"],
+                fornecedores=options["fornecedores"],
+                funcionarios=options["funcionarios"],
+                ordens=options["ordens"],
+                lote=options["lote"],
+                progresso=self.progresso,
+            )
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write(
+            self.style.SUCCESS(f"Concluído em {time.perf_counter() - inicio:.1f} s.")
+        )
+
+    def progresso(self, tabela, feitas, total):
+        self.stdout.write(f"{tabela}: {feitas}/{total}")
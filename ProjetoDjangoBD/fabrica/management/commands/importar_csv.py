@@ -0,0 +1,65 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fabrica.importacao import IMPORTACOES, ler_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa um CSV de clientes, produtos ou pedidos (uma linha por item, "
+        "no formato de /exportar/pedidos/) com COPY. Linhas inválidas vão "
+        "para o arquivo de rejeitadas e o resto é importado numa transação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("tipo", choices=sorted(IMPORTACOES))
+        parser.add_argument("arquivo")
+        parser.add_argument(
+            "--rejeitadas",
+            help="CSV com as linhas recusadas (padrão: <arquivo>.rejeitadas.csv).",
+        )
+        parser.add_argument("--delimitador", default=",")
+        parser.add_argument(
+            "--processos",
+            type=int,
+            default=1,
+            help="Processos que validam as linhas em paralelo ao COPY.",
+        )
+
+    def handle(self, *args, **options):
+        caminho_rejeitadas = (
+            options["rejeitadas"] or f"{options['arquivo']}.rejeitadas.csv"
+        )
+        inicio = time.perf_counter()
+        with (
+            open(options["arquivo"], newline="", encoding="utf-8-sig") as arquivo,
+            open(caminho_rejeitadas, "w", newline="", encoding="utf-8") as saida,
+        ):
+            cabecalho, linhas = ler_csv(arquivo, options["delimitador"])
+            rejeitadas = csv.writer(saida)
+            rejeitadas.writerow(["linha", "erro", *cabecalho])
+            try:
+                importacao = IMPORTACOES[options["tipo"]](
+                    cabecalho,
+                    lambda linha, erro, valores: rejeitadas.writerow(
+                        [linha, erro, *valores]
+                    ),
+                )
+            except ValueError as e:
+                raise CommandError(e)
+            contagem = importacao.executar(linhas, options["processos"])
+
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(
+            f"{contagem['lidas']} linhas lidas em {segundos:.1f} s "
+            f"({contagem['lidas'] / segundos:,.0f} linhas/s)."
+        )
+        self.stdout.write(self.style.SUCCESS(f"{contagem['mescladas']} importadas."))
+        if contagem["rejeitadas"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{contagem['rejeitadas']} recusadas, em {caminho_rejeitadas}."
+                )
+            )
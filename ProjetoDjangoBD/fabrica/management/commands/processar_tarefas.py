@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from fabrica.tarefas import MAX_TENTATIVAS, esperar_tarefas, processar_lote
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica os movimentos de estoque enfileirados pelos saves de pedidos "
+        "e ordens de produção. Com --intervalo, continua esperando tarefas "
+        "novas; vários workers podem rodar ao mesmo tempo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=500)
+        parser.add_argument("--tentativas", type=int, default=MAX_TENTATIVAS)
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=0,
+            help=(
+                "Espera máxima, em segundos, por uma tarefa nova (o NOTIFY do "
+                "enfileiramento acorda o worker antes); 0 esvazia a fila e sai."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            pegas = processar_lote(options["lote"], options["tentativas"])
+            if options["verbosity"] > 1 and pegas:
+                self.stdout.write(f"{pegas} tarefas processadas")
+            if pegas == options["lote"]:
+                continue
+            if not options["intervalo"]:
+                break
+            esperar_tarefas(options["intervalo"])
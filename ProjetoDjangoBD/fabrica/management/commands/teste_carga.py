@@ -0,0 +1,148 @@
+import queue
+import random
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import URLPattern, get_resolver
+
+from fabrica import api
+from fabrica.instrumentacao import ColetorDeConsultas
+from fabrica.management.utils import percentil
+
+# Ids usados nas rotas com <int:pk>, sorteados entre linhas existentes.
+AMOSTRAS_PK = {
+    "detalhe_cliente": "SELECT id_cliente FROM Cliente ORDER BY random() LIMIT 1000",
+    "comprar_materiaprima": (
+        "SELECT id_materiaprima FROM MateriaPrima ORDER BY random() LIMIT 1000"
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Faz GETs concorrentes em todas as rotas de setup/urls.py (menos o "
+        "admin) e mostra latência p50/p95/p99 e consultas por requisição."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requisicoes", type=int, default=200, help="Requisições por rota."
+        )
+        parser.add_argument("--concorrencia", type=int, default=8)
+
+    def handle(self, *args, **options):
+        rotas = self.rotas()
+        self.stdout.write(
+            f"{'rota':<32} {'req':>5} {'erros':>5} {'p50':>8} {'p95':>8} "
+            f"{'p99':>8} {'consultas':>10}"
+        )
+        for nome, gerar_url in rotas:
+            resultados = self.disparar(
+                gerar_url, options["requisicoes"], options["concorrencia"]
+            )
+            tempos = [tempo for tempo, _, _ in resultados]
+            consultas = [total for _, total, _ in resultados]
+            erros = sum(1 for _, _, status in resultados if status >= 400)
+            self.stdout.write(
+                f"{nome:<32} {len(resultados):>5} {erros:>5} "
+                f"{percentil(tempos, 50):>6.1f}ms {percentil(tempos, 95):>6.1f}ms "
+                f"{percentil(tempos, 99):>6.1f}ms "
+                f"{statistics.median(consultas):>4.0f} (max {max(consultas)})"
+            )
+
+    def rotas(self):
+        """Lista ``(nome, gerar_url)`` para cada rota GET da aplicação.
+
+        As rotas da API (``<str:recurso>``) entram uma vez por recurso, com os
+        ids de ``<int:pk>`` sorteados na tabela do recurso.
+        """
+        rotas = []
+        for padrao in get_resolver().url_patterns:
+            if not isinstance(padrao, URLPattern):
+                continue  # include() do admin
+            caminho = "/" + str(padrao.pattern)
+            nome = padrao.name or caminho
+            if "<str:recurso>" in caminho:
+                variantes = [
+                    (
+                        f"{nome} {recurso}",
+                        caminho.replace("<str:recurso>", recurso),
+                        api.RECURSOS[recurso].model,
+                    )
+                    for recurso in api.RECURSOS
+                ]
+            else:
+                variantes = [(nome, caminho, None)]
+            for nome, caminho, model in variantes:
+                if "<" in caminho.replace("<int:pk>", ""):
+                    raise CommandError(f"Parâmetro sem amostra na rota {caminho}.")
+                if "<int:pk>" not in caminho:
+                    rota = (nome, lambda c=caminho: c)
+                else:
+                    rota = self.rota_com_pk(padrao.name, nome, caminho, model)
+                if rota is not None:
+                    rotas.append(rota)
+        return rotas
+
+    def rota_com_pk(self, nome_padrao, nome, caminho, model):
+        if nome_padrao in AMOSTRAS_PK:
+            sql = AMOSTRAS_PK[nome_padrao]
+        elif model is not None:
+            sql = (
+                f"SELECT {model._meta.pk.column} FROM {model._meta.db_table} "
+                "ORDER BY random() LIMIT 1000"
+            )
+        else:
+            raise CommandError(f"Sem amostra de ids para a rota {caminho}.")
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            ids = [linha[0] for linha in cursor.fetchall()]
+        if not ids:
+            self.stderr.write(f"{caminho}: sem linhas para testar, ignorada.")
+            return None
+        return (
+            nome,
+            lambda c=caminho, ids=ids: c.replace("<int:pk>", str(random.choice(ids))),
+        )
+
+    def disparar(self, gerar_url, requisicoes, concorrencia):
+        """Executa as requisições em ``concorrencia`` threads.
+
+        Cada thread tem a sua conexão com o banco, como os workers de um
+        servidor de aplicação. Retorna ``(ms, consultas, status)`` por
+        requisição.
+        """
+        pendentes = queue.Queue()
+        for _ in range(requisicoes):
+            pendentes.put(gerar_url())
+        resultados = []
+        lock = threading.Lock()
+
+        def trabalhar():
+            client = Client(SERVER_NAME="localhost")
+            try:
+                while True:
+                    try:
+                        url = pendentes.get_nowait()
+                    except queue.Empty:
+                        return
+                    contador = ColetorDeConsultas(completo=False)
+                    with connection.execute_wrapper(contador):
+                        inicio = time.perf_counter()
+                        resposta = client.get(url)
+                        tempo = (time.perf_counter() - inicio) * 1000
+                    with lock:
+                        resultados.append((tempo, contador.total, resposta.status_code))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=trabalhar) for _ in range(concorrencia)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return resultados
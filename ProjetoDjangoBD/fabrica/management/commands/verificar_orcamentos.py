@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from fabrica.management.dados import popular
+from fabrica.management.orcamentos import (
+    ESCALA,
+    FATOR,
+    ORCAMENTOS,
+    ids_de_amostra,
+    medir_orcamento,
+    preencher,
+    rotas_sem_orcamento,
+)
+from fabrica.management.utils import banco_descartavel, limpar_caches
+
+
+class Command(BaseCommand):
+    help = (
+        "Popula um banco descartável em duas escalas, faz as requisições de "
+        "ORCAMENTOS em cada uma e falha se alguma passar do seu orçamento de "
+        "consultas ou de tempo, ou se o número de consultas crescer com os "
+        "dados. É a versão em escala maior de fabrica/tests/test_orcamentos.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fator",
+            type=int,
+            default=FATOR,
+            help="Quantas vezes a escala pequena é acrescentada para a grande.",
+        )
+        parser.add_argument("--repeticoes", type=int, default=5)
+
+    def handle(self, *args, **options):
+        faltando = rotas_sem_orcamento()
+        if faltando:
+            raise CommandError(f"Rotas sem orçamento: {', '.join(sorted(faltando))}.")
+
+        self.falhas = 0
+        with banco_descartavel():
+            popular(**ESCALA)
+            pequena = self.medir_todas("pequena", options["repeticoes"])
+            popular(**{nome: n * options["fator"] for nome, n in ESCALA.items()})
+            grande = self.medir_todas("grande", options["repeticoes"])
+
+        self.stdout.write("")
+        for (_, metodo, caminho, dados, *_), antes, depois in zip(
+            ORCAMENTOS, pequena, grande
+        ):
+            if depois != antes:
+                self.falhas += 1
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"{metodo.upper()} {caminho} {dados}: consultas cresceram "
+                        f"com os dados ({antes} -> {depois})"
+                    )
+                )
+        if self.falhas:
+            raise CommandError(f"{self.falhas} orçamento(s) estourado(s).")
+        self.stdout.write(self.style.SUCCESS("Todos os orçamentos respeitados."))
+
+    def medir_todas(self, escala, repeticoes):
+        """Retorna o número de consultas de cada entrada de ORCAMENTOS."""
+        ids = ids_de_amostra()
+        limpar_caches()
+        client = Client(SERVER_NAME="localhost")
+        self.stdout.write(f"\nEscala {escala}:")
+        resultados = []
+        for orcamento in ORCAMENTOS:
+            metodo, caminho, dados = preencher(orcamento, ids)
+            medida = medir_orcamento(client, orcamento, ids, repeticoes)
+            resultados.append(medida.consultas)
+            erros = medida.erros(orcamento)
+            _, _, _, _, _, consultas_max, ms_max = orcamento
+            linha = (
+                f"  {metodo.upper():<4} {caminho:<32} {str(dados)[:40]:<40} "
+                f"{medida.consultas:>3}/{consultas_max:<3} consultas "
+                f"{medida.ms:>7.1f}/{ms_max} ms"
+            )
+            if erros:
+                self.falhas += 1
+                self.stdout.write(self.style.ERROR(linha))
+                for erro in erros:
+                    self.stdout.write(f"      {erro}")
+            else:
+                self.stdout.write(linha)
+        return resultados
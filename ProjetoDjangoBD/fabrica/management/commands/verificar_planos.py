@@ -0,0 +1,106 @@
+import json
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from fabrica.instrumentacao import ColetorDeConsultas
+from fabrica.management.dados import popular
+from fabrica.management.orcamentos import (
+    ORCAMENTOS,
+    ids_de_amostra,
+    preencher,
+    requisitar,
+)
+from fabrica.management.utils import banco_descartavel
+
+
+def varreduras_sequenciais(plano):
+    """Gera ``(tabela, linhas lidas)`` de cada Seq Scan de um plano ANALYZE."""
+    if plano["Node Type"] == "Seq Scan":
+        linhas = plano["Actual Rows"] + plano.get("Rows Removed by Filter", 0)
+        yield plano["Relation Name"], linhas * plano["Actual Loops"]
+    for filho in plano.get("Plans", []):
+        yield from varreduras_sequenciais(filho)
+
+
+class Command(BaseCommand):
+    help = (
+        "Roda EXPLAIN ANALYZE em todas as consultas dos GETs de ORCAMENTOS sobre "
+        "um banco populado e falha se alguma fizer varredura sequencial lendo "
+        "mais linhas que o limite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limite-linhas", type=int, default=10_000)
+        parser.add_argument(
+            "--banco-atual",
+            action="store_true",
+            help="Usa o banco configurado em vez de um banco descartável populado.",
+        )
+        parser.add_argument("--clientes", type=int, default=20_000)
+        parser.add_argument("--pedidos", type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        limite = options["limite_linhas"]
+        if options["banco_atual"]:
+            problemas = self.verificar(limite)
+        else:
+            with banco_descartavel():
+                popular(clientes=options["clientes"], pedidos=options["pedidos"])
+                problemas = self.verificar(limite)
+
+        if problemas:
+            raise CommandError(
+                f"{problemas} consulta(s) com varredura sequencial acima de "
+                f"{limite} linhas."
+            )
+        self.stdout.write(self.style.SUCCESS("Nenhuma varredura acima do limite."))
+
+    def verificar(self, limite):
+        """Confere os planos de cada GET de ORCAMENTOS.
+
+        As views async consultam por outra conexão (fabrica/assincrono.py) e
+        aparecem com 0 consultas; o SQL delas é o das views síncronas.
+        """
+        ids = ids_de_amostra()
+        client = Client(SERVER_NAME="localhost")
+        problemas = 0
+        for orcamento in ORCAMENTOS:
+            metodo, caminho, dados = preencher(orcamento, ids)
+            if metodo != "get":
+                continue
+            url = f"{caminho}?{urlencode(dados)}" if dados else caminho
+
+            coletor = ColetorDeConsultas(completo=True)
+            with connection.execute_wrapper(coletor):
+                requisitar(client, metodo, caminho, dados)
+
+            consultas = [
+                (sql, params)
+                for _, sql, params in coletor.consultas
+                if sql.lstrip().upper().startswith("SELECT")
+            ]
+            for sql, params in consultas:
+                for tabela, linhas in self.explicar(sql, params):
+                    if linhas > limite:
+                        problemas += 1
+                        self.stdout.write(
+                            self.style.ERROR(
+                                f"{url}: Seq Scan em {tabela} leu {linhas} linhas"
+                            )
+                        )
+                        self.stdout.write(f"    {' '.join(sql.split())[:200]}")
+            self.stdout.write(f"{url}: {len(consultas)} consulta(s)")
+        return problemas
+
+    def explicar(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params if params else None
+            )
+            plano = cursor.fetchone()[0]
+        if isinstance(plano, str):
+            plano = json.loads(plano)
+        return list(varreduras_sequenciais(plano[0]["Plan"]))
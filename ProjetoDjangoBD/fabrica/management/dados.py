@@ -0,0 +1,265 @@
+from django.db import connection
+
+from fabrica.models import recalcular_valor_total
+
+SOBRENOMES = ["Silva", "Conceição", "Araújo", "Gonçalves", "Souza", "Lúcio"]
+CARGOS = ["Operador", "Supervisor", "Técnico", "Montador"]
+FORMAS_PAGAMENTO = ["Cartão de Crédito", "Cartão de Débito", "Dinheiro", "Pix"]
+
+# Linhas de relacionamento distintas geradas para cada fornecedor e cada
+# ordem; as tabelas do outro lado precisam de ao menos tantas linhas.
+MATERIAS_POR_FORNECEDOR = 3
+PRODUTOS_POR_ORDEM = 2
+FUNCIONARIOS_POR_ORDEM = 2
+
+# Cada INSERT recebe, nos dois últimos parâmetros, o intervalo do lote: de
+# g na generate_series para as tabelas independentes e do id do pai para as
+# tabelas de relacionamento.
+CLIENTES_SQL = """
+    INSERT INTO Cliente (nome, telefone, email, numero, cep, logradouro)
+    SELECT CASE WHEN g %% 2 = 0 THEN 'João ' ELSE 'Maria ' END
+               || (%s::text[])[1 + g %% 6] || ' ' || g,
+           '119' || lpad(g::text, 8, '0'),
+           'cliente' || g || '@example.com',
+           g %% 5000,
+           lpad((g %% 100000)::text, 5, '0') || '-000',
+           'Rua ' || (%s::text[])[1 + g %% 6]
+    FROM generate_series(%s, %s) AS g
+"""
+
+PRODUTOS_SQL = """
+    INSERT INTO Produto (nome, descricao, estoque_disponivel, limite_estoque_baixo,
+                         custo_unitario)
+    SELECT 'Produto ' || g, 'Descrição ' || g, (g * 37) %% 1000, 100, 10 + g %% 90
+    FROM generate_series(%s, %s) AS g
+"""
+
+MATERIAS_PRIMAS_SQL = """
+    INSERT INTO MateriaPrima (nome, custo_unidade, estoque_disponivel,
+                              limite_estoque_baixo)
+    SELECT 'Matéria-prima ' || g, 1 + g %% 20, (g * 53) %% 5000, 500
+    FROM generate_series(%s, %s) AS g
+"""
+
+CONSTITUIDO_SQL = """
+    INSERT INTO Constituido (produto_id, materiaprima_id, quantidade)
+    SELECT p.id_produto, %s + (p.id_produto * 7 + i) %% %s, 1 + i %% 5
+    FROM Produto p, generate_series(1, %s) AS i
+    WHERE p.id_produto BETWEEN %s AND %s
+"""
+
+FORNECEDORES_SQL = """
+    INSERT INTO Fornecedor (nome, avaliacao, telefone, email)
+    SELECT 'Fornecedor ' || g,
+           CASE WHEN g %% 10 = 0 THEN NULL ELSE (g %% 500) / 100.0 END,
+           '119' || lpad(g::text, 8, '0'),
+           'fornecedor' || g || '@example.com'
+    FROM generate_series(%s, %s) AS g
+"""
+
+FORNECE_SQL = """
+    INSERT INTO Fornece (fornecedor_id, materiaprima_id, preco)
+    SELECT f.id_fornecedor, %s + (f.id_fornecedor * 7 + i) %% %s,
+           1 + (f.id_fornecedor + i) %% 50
+    FROM Fornecedor f, generate_series(1, %s) AS i
+    WHERE f.id_fornecedor BETWEEN %s AND %s
+"""
+
+FUNCIONARIOS_SQL = """
+    INSERT INTO Funcionario (nome, cargo, salario)
+    SELECT 'Funcionário ' || g, (%s::text[])[1 + g %% 4], 2000 + g %% 3000
+    FROM generate_series(%s, %s) AS g
+"""
+
+PEDIDOS_SQL = """
+    INSERT INTO Pedido (data_pedido, data_entrega, status, forma_pagamento,
+                        data_pagamento, cliente_id)
+    SELECT CURRENT_DATE - (g %% 730),
+           CASE WHEN g %% 3 = 2 THEN CURRENT_DATE - (g %% 730) END,
+           (ARRAY['Pendente', 'Processado', 'Entregue'])[1 + g %% 3],
+           (%s::text[])[1 + g %% 4],
+           CURRENT_DATE - (g %% 730),
+           %s + g %% %s
+    FROM generate_series(%s, %s) AS g
+"""
+
+CONTEM_SQL = """
+    INSERT INTO Contem (pedido_id, produto_id, quantidade)
+    SELECT p.id_pedido, %s + (p.id_pedido * 7 + i) %% %s, i
+    FROM Pedido p, generate_series(1, %s) AS i
+    WHERE p.id_pedido BETWEEN %s AND %s
+"""
+
+ORDENS_SQL = """
+    INSERT INTO OrdemProducao (status, custo_total, data_criacao, data_conclusao)
+    SELECT CASE WHEN g %% 4 = 0 THEN 'Pendente' ELSE 'Concluído' END,
+           100 + g %% 900,
+           CURRENT_DATE - (g %% 365),
+           CASE WHEN g %% 4 = 0 THEN NULL ELSE CURRENT_DATE - (g %% 365) END
+    FROM generate_series(%s, %s) AS g
+"""
+
+CONTEM_ORDEM_SQL = """
+    INSERT INTO ContemOrdemProducao (produto_id, ordem_id, quantidade)
+    SELECT %s + (o.id_ordem * 11 + i) %% %s, o.id_ordem, 10 * i
+    FROM OrdemProducao o, generate_series(1, %s) AS i
+    WHERE o.id_ordem BETWEEN %s AND %s
+"""
+
+REALIZA_SQL = """
+    INSERT INTO Realiza (funcionario_id, ordem_id)
+    SELECT %s + (o.id_ordem * 13 + i) %% %s, o.id_ordem
+    FROM OrdemProducao o, generate_series(1, %s) AS i
+    WHERE o.id_ordem BETWEEN %s AND %s
+"""
+
+
+class Gerador:
+    """Executa os INSERTs em lotes, cada um na sua própria transação.
+
+    ``progresso(tabela, feitas, total)`` é chamado ao fim de cada lote.
+    """
+
+    def __init__(self, lote=100_000, progresso=None):
+        self.lote = lote
+        self.progresso = progresso
+
+    def primeiro_id(self, tabela, pk):
+        """Alinha a sequência de ``tabela`` ao maior id e retorna o próximo.
+
+        Assim os ids gerados são contíguos a partir do valor retornado, mesmo
+        que a sequência tenha avançado com transações desfeitas.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT setval(
+                    pg_get_serial_sequence(%s, %s),
+                    (SELECT COALESCE(MAX({pk}), 0) + 1 FROM {tabela}),
+                    false
+                )
+                """,
+                [tabela.lower(), pk],
+            )
+            return cursor.fetchone()[0]
+
+    def inserir(self, tabela, sql, params, inicio, fim):
+        with connection.cursor() as cursor:
+            for a in range(inicio, fim + 1, self.lote):
+                b = min(a + self.lote - 1, fim)
+                cursor.execute(sql, [*params, a, b])
+                if self.progresso:
+                    self.progresso(tabela, b - inicio + 1, fim - inicio + 1)
+
+    def serie(self, tabela, pk, sql, params, total):
+        """Insere ``total`` linhas e retorna o id da primeira."""
+        primeiro = self.primeiro_id(tabela, pk)
+        self.inserir(tabela, sql, params, 1, total)
+        return primeiro
+
+
+def popular(
+    clientes=20_000,
+    pedidos=100_000,
+    itens_por_pedido=3,
+    produtos=500,
+    materias_primas=500,
+    materias_por_produto=3,
+    fornecedores=5_000,
+    funcionarios=500,
+    ordens=50_000,
+    lote=100_000,
+    progresso=None,
+):
+    """Acrescenta ao banco atual dados sintéticos que respeitam as restrições.
+
+    Tudo é gerado com generate_series, sem passar pelos signals: os pedidos
+    e ordens entram já no status final e sem movimentações de estoque. As
+    chaves estrangeiras apontam só para as linhas geradas na mesma chamada.
+    """
+    if itens_por_pedido > produtos or materias_por_produto > materias_primas:
+        raise ValueError("Itens por pedido/produto acima do total disponível.")
+    if fornecedores and materias_primas < MATERIAS_POR_FORNECEDOR:
+        raise ValueError(
+            f"Com fornecedores, são precisas ao menos {MATERIAS_POR_FORNECEDOR} "
+            "matérias-primas."
+        )
+    if ordens and (
+        produtos < PRODUTOS_POR_ORDEM or funcionarios < FUNCIONARIOS_POR_ORDEM
+    ):
+        raise ValueError(
+            f"Com ordens, são precisos ao menos {PRODUTOS_POR_ORDEM} produtos e "
+            f"{FUNCIONARIOS_POR_ORDEM} funcionários."
+        )
+
+    gerador = Gerador(lote, progresso)
+
+    cliente = gerador.serie(
+        "Cliente", "id_cliente", CLIENTES_SQL, [SOBRENOMES, SOBRENOMES], clientes
+    )
+    produto = gerador.serie("Produto", "id_produto", PRODUTOS_SQL, [], produtos)
+    materiaprima = gerador.serie(
+        "MateriaPrima", "id_materiaprima", MATERIAS_PRIMAS_SQL, [], materias_primas
+    )
+    gerador.inserir(
+        "Constituido",
+        CONSTITUIDO_SQL,
+        [materiaprima, materias_primas, materias_por_produto],
+        produto,
+        produto + produtos - 1,
+    )
+
+    fornecedor = gerador.serie(
+        "Fornecedor", "id_fornecedor", FORNECEDORES_SQL, [], fornecedores
+    )
+    gerador.inserir(
+        "Fornece",
+        FORNECE_SQL,
+        [materiaprima, materias_primas, MATERIAS_POR_FORNECEDOR],
+        fornecedor,
+        fornecedor + fornecedores - 1,
+    )
+
+    funcionario = gerador.serie(
+        "Funcionario", "id_funcionario", FUNCIONARIOS_SQL, [CARGOS], funcionarios
+    )
+
+    pedido = gerador.serie(
+        "Pedido",
+        "id_pedido",
+        PEDIDOS_SQL,
+        [FORMAS_PAGAMENTO, cliente, clientes],
+        pedidos,
+    )
+    gerador.inserir(
+        "Contem",
+        CONTEM_SQL,
+        [produto, produtos, itens_por_pedido],
+        pedido,
+        pedido + pedidos - 1,
+    )
+
+    ordem = gerador.serie("OrdemProducao", "id_ordem", ORDENS_SQL, [], ordens)
+    gerador.inserir(
+        "ContemOrdemProducao",
+        CONTEM_ORDEM_SQL,
+        [produto, produtos, PRODUTOS_POR_ORDEM],
+        ordem,
+        ordem + ordens - 1,
+    )
+    gerador.inserir(
+        "Realiza",
+        REALIZA_SQL,
+        [funcionario, funcionarios, FUNCIONARIOS_POR_ORDEM],
+        ordem,
+        ordem + ordens - 1,
+    )
+
+    for inicio in range(pedido, pedido + pedidos, lote):
+        recalcular_valor_total(
+            "id_pedido BETWEEN %s AND %s",
+            [inicio, min(inicio + lote, pedido + pedidos) - 1],
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
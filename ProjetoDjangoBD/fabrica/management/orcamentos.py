@@ -0,0 +1,268 @@
+"""Orçamentos de consultas e de tempo de cada rota.
+
+Usados pelos testes de fabrica/tests/test_orcamentos.py e pelo comando
+verificar_orcamentos, que popula um banco descartável maior. Os GETs são
+também as requisições cujos planos o comando verificar_planos confere.
+"""
+
+import statistics
+from dataclasses import dataclass, field
+
+from django.db import connection
+from django.urls import URLPattern, get_resolver
+
+from fabrica.instrumentacao import ColetorDeConsultas
+from fabrica.management.utils import medir
+
+# Orçamento de cada requisição: (rota, método, caminho, dados, status
+# esperado, máximo de consultas, máximo de ms). Os marcadores no caminho e
+# nos dados são trocados por ids do banco populado. Toda rota nomeada de
+# setup/urls.py (menos o admin) precisa aparecer aqui. O tempo das
+# exportações cresce com as linhas exportadas; o delas vale para a escala
+# grande. As consultas são contadas com os caches vazios, e o tempo com eles
+# já preenchidos pela primeira requisição.
+ORCAMENTOS = [
+    ("home", "get", "/home/", {}, 200, 0, 50),
+    ("lista_clientes", "get", "/clientes/", {}, 200, 1, 200),
+    ("lista_clientes", "get", "/clientes/", {"nome": "joão silva 42"}, 200, 1, 200),
+    ("lista_clientes", "get", "/clientes/", {"email": "cliente42@"}, 200, 1, 200),
+    ("detalhe_cliente", "get", "/cliente/{cliente}/", {}, 200, 3, 200),
+    ("estoque", "get", "/estoque/", {}, 200, 4, 1000),
+    (
+        "estoque",
+        "get",
+        "/estoque/",
+        {"id_produto": "", "nome": "produto 4"},
+        200,
+        4,
+        1000,
+    ),
+    # As views async consultam pelo psycopg assíncrono (fabrica/assincrono.py),
+    # fora do ORM, e não aparecem na contagem; o orçamento vale para o tempo.
+    ("estoque_async", "get", "/async/estoque/", {}, 200, 0, 1000),
+    ("estoque_baixo", "get", "/estoque/baixo/", {}, 200, 2, 500),
+    ("exportar_clientes", "get", "/exportar/clientes/", {}, 200, 1, 500),
+    (
+        "exportar_pedidos",
+        "get",
+        "/exportar/pedidos/",
+        {"cliente_id": "{cliente}", "formato": "ndjson"},
+        200,
+        1,
+        500,
+    ),
+    ("exportar_produtos", "get", "/exportar/produtos/", {}, 200, 1, 500),
+    ("exportar_materias_primas", "get", "/exportar/materias_primas/", {}, 200, 1, 500),
+    ("estatisticas_sql", "get", "/instrumentacao/sql/", {}, 200, 0, 50),
+    ("estatisticas_cache", "get", "/instrumentacao/cache/", {}, 200, 0, 50),
+    # API: a consulta da página mais uma por coleção aninhada pedida.
+    ("api_lista", "get", "/api/clientes/", {"nome": "silva"}, 200, 1, 200),
+    ("api_lista", "get", "/api/pedidos/", {}, 200, 2, 200),
+    (
+        "api_lista",
+        "get",
+        "/api/pedidos/",
+        {"campos": "status,valor_total"},
+        200,
+        1,
+        200,
+    ),
+    ("api_lista", "get", "/api/produtos/", {}, 200, 2, 200),
+    ("api_lista", "get", "/api/materias_primas/", {}, 200, 1, 200),
+    ("api_lista", "get", "/api/fornecedores/", {"limite": "200"}, 200, 2, 300),
+    ("api_lista", "get", "/api/ordens_producao/", {}, 200, 3, 300),
+    ("api_lista", "get", "/api/funcionarios/", {}, 200, 1, 100),
+    # Sem login a criação em lote é recusada antes de ler o corpo.
+    ("api_lista", "post", "/api/pedidos/", {}, 403, 0, 50),
+    ("api_detalhe", "get", "/api/clientes/{cliente}/", {}, 200, 1, 50),
+    ("api_detalhe", "get", "/api/fornecedores/{fornecedor}/", {}, 200, 2, 50),
+    ("api_detalhe", "get", "/api/materias_primas/{materiaprima}/", {}, 200, 1, 50),
+    ("pedidos", "get", "/pedidos/", {}, 200, 2, 200),
+    ("pedidos", "get", "/pedidos/", {"status": "pendente"}, 200, 2, 200),
+    ("pedidos", "get", "/pedidos/", {"cliente_id": "{cliente}"}, 200, 2, 200),
+    ("pedidos", "get", "/pedidos/", {"valor_total_min": "4000"}, 200, 2, 200),
+    ("fornecedores", "get", "/fornecedores/", {}, 200, 2, 200),
+    ("fornecedores", "get", "/fornecedores/", {"nome": "fornecedor 42"}, 200, 2, 200),
+    (
+        "fornecedores",
+        "get",
+        "/fornecedores/",
+        {"materia_prima": "matéria-prima 4"},
+        200,
+        2,
+        200,
+    ),
+    ("fornecedores_async", "get", "/async/fornecedores/", {}, 200, 0, 200),
+    (
+        "fornecedores",
+        "post",
+        "/fornecedores/",
+        {"fornecedor_id": "{fornecedor}", "avaliacao": "4.5"},
+        302,
+        2,
+        50,
+    ),
+    (
+        "comprar_materiaprima",
+        "get",
+        "/comprar_materiaprima/{materiaprima}/",
+        {},
+        200,
+        2,
+        200,
+    ),
+    (
+        "comprar_materiaprima",
+        "post",
+        "/comprar_materiaprima/{materiaprima}/",
+        {"quantidade": "10", "fornecedor": "{fornecedor}"},
+        302,
+        1,
+        50,
+    ),
+    ("ordens_producao", "get", "/ordens_producao/", {}, 200, 3, 300),
+    (
+        "ordens_producao",
+        "get",
+        "/ordens_producao/",
+        {"status": "pendente"},
+        200,
+        3,
+        300,
+    ),
+    (
+        "ordens_producao",
+        "get",
+        "/ordens_producao/",
+        {"produto_nome": "produto 4"},
+        200,
+        3,
+        300,
+    ),
+    (
+        "ordens_producao",
+        "get",
+        "/ordens_producao/",
+        {"funcionario_nome": "funcionário 4"},
+        200,
+        3,
+        300,
+    ),
+]
+
+# Escala pequena do comando; a grande acrescenta FATOR vezes isto ao mesmo
+# banco. Os testes usam uma fração dela.
+FATOR = 10
+ESCALA = {
+    "clientes": 1_000,
+    "pedidos": 5_000,
+    "produtos": 50,
+    "materias_primas": 50,
+    "fornecedores": 500,
+    "funcionarios": 50,
+    "ordens": 2_000,
+}
+
+
+@dataclass
+class Medida:
+    """Resultado de uma entrada de ORCAMENTOS numa escala."""
+
+    consultas: int
+    ms: float
+    status: int
+    repetidas: dict = field(default_factory=dict)
+
+    def erros(self, orcamento, tempo=True):
+        """Violações de ``orcamento``; ``tempo=False`` ignora o limite em ms."""
+        _, _, _, _, status, consultas_max, ms_max = orcamento
+        erros = []
+        if self.status != status:
+            erros.append(f"status {self.status}, esperado {status}")
+        if self.consultas > consultas_max:
+            erros.append(f"{self.consultas} consultas > {consultas_max}")
+            erros.extend(
+                f"{vezes}x {impressao[:150]}"
+                for impressao, vezes in self.repetidas.items()
+            )
+        if tempo and self.ms > ms_max:
+            erros.append(f"{self.ms:.1f} ms > {ms_max} ms")
+        return erros
+
+
+def rotas_sem_orcamento():
+    nomes = {
+        padrao.name
+        for padrao in get_resolver().url_patterns
+        if isinstance(padrao, URLPattern) and padrao.name
+    }
+    return nomes - {rota for rota, *_ in ORCAMENTOS}
+
+
+def ids_de_amostra():
+    """Ids com mais linhas relacionadas, para que a escala grande pese."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT (SELECT cliente_id FROM Pedido
+                    GROUP BY cliente_id ORDER BY COUNT(*) DESC LIMIT 1),
+                   (SELECT materiaprima_id FROM Fornece
+                    GROUP BY materiaprima_id ORDER BY COUNT(*) DESC LIMIT 1)
+            """)
+        cliente, materiaprima = cursor.fetchone()
+        cursor.execute(
+            "SELECT fornecedor_id FROM Fornece WHERE materiaprima_id = %s LIMIT 1",
+            [materiaprima],
+        )
+        fornecedor = cursor.fetchone()[0]
+    return {
+        "cliente": cliente,
+        "materiaprima": materiaprima,
+        "fornecedor": fornecedor,
+    }
+
+
+def preencher(orcamento, ids):
+    """``(método, caminho, dados)`` da entrada com os ids trocados."""
+    _, metodo, caminho, dados, *_ = orcamento
+    return (
+        metodo,
+        caminho.format(**ids),
+        {campo: valor.format(**ids) for campo, valor in dados.items()},
+    )
+
+
+def requisitar(client, metodo, caminho, dados):
+    """Faz a requisição e lê a resposta inteira.
+
+    As exportações só consultam o banco enquanto são lidas.
+    """
+    resposta = getattr(client, metodo)(caminho, dados)
+    if resposta.streaming:
+        for _ in resposta.streaming_content:
+            pass
+    return resposta
+
+
+def medir_orcamento(client, orcamento, ids, repeticoes):
+    """Mede uma entrada de ORCAMENTOS com ``client``.
+
+    A primeira requisição conta as consultas (com os caches como estiverem);
+    o tempo é a mediana das ``repeticoes`` seguintes (0 com ``repeticoes=0``).
+    """
+    metodo, caminho, dados = preencher(orcamento, ids)
+
+    coletor = ColetorDeConsultas(completo=True)
+    with connection.execute_wrapper(coletor):
+        resposta = requisitar(client, metodo, caminho, dados)
+    return Medida(
+        consultas=coletor.total,
+        ms=(
+            statistics.median(
+                medir(lambda: requisitar(client, metodo, caminho, dados), repeticoes)
+            )
+            if repeticoes
+            else 0.0
+        ),
+        status=resposta.status_code,
+        repetidas=coletor.repetidas(2),
+    )
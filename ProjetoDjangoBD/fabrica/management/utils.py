@@ -0,0 +1,141 @@
+import asyncio
+import math
+import statistics
+import time
+from contextlib import contextmanager
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import override_settings
+
+from fabrica.cache import CATALOGO
+
+
+@contextmanager
+def banco_descartavel(verbosity=0):
+    """Cria um banco de teste vazio (como o test runner faz) e o remove ao sair.
+
+    Os benchmarks populam milhares de linhas, então nunca rodam sobre o banco
+    configurado em settings. Os caches também são trocados por caches em
+    memória vazios: as chaves usam ids, que coincidem com os do banco real.
+    """
+    caches_locais = {
+        alias: {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": f"descartavel-{alias}",
+            "OPTIONS": {"MAX_ENTRIES": 1_000_000},
+        }
+        for alias in settings.CACHES
+    }
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False
+    )
+    try:
+        with override_settings(CACHES=caches_locais):
+            CATALOGO.limpar()
+            yield
+    finally:
+        CATALOGO.limpar()
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def limpar_caches():
+    """Esvazia o cache de catálogo deste processo e os caches configurados.
+
+    Só dentro de ``banco_descartavel`` ou dos testes, onde os caches são
+    descartáveis.
+    """
+    CATALOGO.limpar()
+    for cache in caches.all(initialized_only=True):
+        cache.clear()
+
+
+def medir(funcao, repeticoes):
+    """Executa ``funcao`` ``repeticoes`` vezes e retorna os tempos em ms."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def percentil(tempos, p):
+    """Percentil ``p`` (0-100) pelo método do posto mais próximo."""
+    ordenados = sorted(tempos)
+    posto = max(math.ceil(p / 100 * len(ordenados)), 1)
+    return ordenados[posto - 1]
+
+
+def resumo(tempos):
+    return (
+        f"mediana {statistics.median(tempos):.1f} ms, "
+        f"p95 {percentil(tempos, 95):.1f} ms, "
+        f"min {min(tempos):.1f} ms, max {max(tempos):.1f} ms"
+    )
+
+
+def requisitar(handler, caminho, **cabecalhos):
+    """GET pelo ``WSGIHandler``, como um servidor faria.
+
+    O Client de teste não serve aqui: ele desliga o close_old_connections
+    do início e do fim das requisições, que é o que devolve ou fecha as
+    conexões. ``cabecalhos`` vão no environ (``HTTP_ACCEPT_ENCODING=...``).
+    Retorna ``(status, cabeçalhos da resposta, bytes do corpo)``.
+    """
+    environ = {"PATH_INFO": caminho, "HTTP_HOST": "localhost", **cabecalhos}
+    setup_testing_defaults(environ)
+    inicio = []
+    resposta = handler(environ, lambda linha, itens, *_: inicio.append((linha, itens)))
+    tamanho = 0
+    try:
+        for pedaco in resposta:
+            tamanho += len(pedaco)
+    finally:
+        resposta.close()
+    linha, itens = inicio[0]
+    return int(linha.split()[0]), dict(itens), tamanho
+
+
+async def requisitar_asgi(application, caminho):
+    """GET pelo app ASGI, como um servidor faria; retorna como ``requisitar``."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": caminho,
+        "raw_path": caminho.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    corpo_enviado = False
+
+    async def receive():
+        nonlocal corpo_enviado
+        if not corpo_enviado:
+            corpo_enviado = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # O cliente nunca desconecta; o Django cancela esta espera no fim.
+        await asyncio.Event().wait()
+
+    resposta = {"tamanho": 0}
+
+    async def send(mensagem):
+        if mensagem["type"] == "http.response.start":
+            resposta["status"] = mensagem["status"]
+            resposta["cabecalhos"] = {
+                nome.decode(): valor.decode() for nome, valor in mensagem["headers"]
+            }
+        elif mensagem["type"] == "http.response.body":
+            resposta["tamanho"] += len(mensagem.get("body", b""))
+
+    await application(scope, receive, send)
+    return resposta["status"], resposta["cabecalhos"], resposta["tamanho"]
@@ -1,9 +1,16 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import connection, models, transaction
+from django.db import connection, connections, models, transaction
 from django.db.models import CheckConstraint, Q
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_migrate
 from django.dispatch import receiver
 
+from .busca import indice_trigrama, instalar_funcoes
+from .cache import CATALOGO
+
 
 class Cliente(models.Model):
     id_cliente = models.AutoField(primary_key=True)
@@ -41,16 +48,66 @@ class Cliente(models.Model):
     class Meta:
         db_table = "cliente"
         verbose_name_plural = "Clientes"
+        indexes = [
+            indice_trigrama("nome", "cliente_nome_trgm_idx"),
+            indice_trigrama("telefone", "cliente_telefone_trgm_idx"),
+            indice_trigrama("email", "cliente_email_trgm_idx"),
+            indice_trigrama("cep", "cliente_cep_trgm_idx"),
+            indice_trigrama("complemento", "cliente_complemento_trgm_idx"),
+            indice_trigrama("logradouro", "cliente_logradouro_trgm_idx"),
+        ]
+
+
+@receiver(pre_migrate)
+def instalar_funcoes_busca(sender, using, **kwargs):
+    # Os índices de busca dependem de f_unaccent, que precisa existir antes
+    # de as tabelas serem criadas (por exemplo no banco de testes).
+    if sender.name == "fabrica":
+        with connections[using].cursor() as cursor:
+            instalar_funcoes(cursor)
+
+
+class ColunasDoBanco(models.Model):
+    """Modelo com colunas que só o banco escreve, listadas em ``colunas_do_banco``.
+
+    O save() de uma instância já gravada deixa essas colunas fora do UPDATE:
+    uma instância carregada antes de mudarem os itens ou os preços gravaria
+    de volta a versão e os totais antigos. Quem as altera é o SQL dos
+    receivers (``versao = versao + 1``), e ``atualizar_versao`` traz os
+    valores novos para a instância. O mesmo vale para o snapshot de estoque,
+    que só ``compactar_movimentacoes`` escreve.
+    """
 
+    colunas_do_banco = ()
 
-class Pedido(models.Model):
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get("force_insert"):
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                update_fields = [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key and not field.generated
+                ]
+            kwargs["update_fields"] = [
+                nome for nome in update_fields if nome not in self.colunas_do_banco
+            ]
+        super().save(*args, **kwargs)
+
+
+class Pedido(ColunasDoBanco):
     PENDENTE = "Pendente"
     PROCESSADO = "Processado"
     ENTREGUE = "Entregue"
+    CANCELADO = "Cancelado"
     STATUS_CHOICES = [
         (PENDENTE, "Pendente"),
         (PROCESSADO, "Processado"),
         (ENTREGUE, "Entregue"),
+        (CANCELADO, "Cancelado"),
     ]
 
     FORMA_PAGAMENTO_CHOICES = [
@@ -69,6 +126,16 @@ class Pedido(models.Model):
     cliente = models.ForeignKey(
         "Cliente", on_delete=models.CASCADE, related_name="pedidos"
     )
+    # Soma de custo_unitario * quantidade dos itens, mantida pelos receivers
+    # de Contem e Produto (ver recalcular_valor_total).
+    valor_total = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, db_default=0, editable=False
+    )
+    # Incrementada a cada mudança no pedido, nos itens ou nos produtos deles;
+    # faz parte da chave da linha em cache da lista de pedidos.
+    versao = models.IntegerField(default=1, db_default=1, editable=False)
+
+    colunas_do_banco = ("valor_total", "versao")
 
     def __str__(self):
         return f"Pedido {self.id_pedido} feito por {self.cliente} - {self.status}"
@@ -76,6 +143,15 @@ class Pedido(models.Model):
     class Meta:
         db_table = "pedido"
         verbose_name_plural = "Pedidos"
+        indexes = [
+            models.Index(fields=["valor_total"], name="pedido_valor_total_idx"),
+            # Ordem da lista de pedidos e pedidos recentes de um cliente.
+            models.Index(fields=["data_pedido", "id_pedido"], name="pedido_data_idx"),
+            models.Index(
+                fields=["cliente", "data_pedido"], name="pedido_cliente_data_idx"
+            ),
+            models.Index(fields=["status"], name="pedido_status_idx"),
+        ]
         constraints = [
             CheckConstraint(
                 check=Q(data_pedido__lte=models.functions.Now()),
@@ -88,7 +164,7 @@ class Pedido(models.Model):
                 name="check_pedido_data_entrega",
             ),
             CheckConstraint(
-                check=Q(status__in=["Pendente", "Processado", "Entregue"]),
+                check=Q(status__in=["Pendente", "Processado", "Entregue", "Cancelado"]),
                 name="check_pedido_pedido_status_valid",
             ),
             CheckConstraint(
@@ -110,17 +186,36 @@ class Pedido(models.Model):
         ]
 
 
-class Produto(models.Model):
+class Produto(ColunasDoBanco):
+    # O estoque é o snapshot mais o livro (ver estoque_atual_sql); muda só
+    # por movimentações, que compactar_movimentacoes soma aqui.
+    colunas_do_banco = ("estoque_disponivel",)
+
     id_produto = models.AutoField(primary_key=True)
     nome = models.CharField(max_length=100)
     descricao = models.TextField(blank=True, null=True)
     estoque_disponivel = models.IntegerField(default=0)
     limite_estoque_baixo = models.IntegerField(default=0)
     custo_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    # Quanto falta para o limite, sobre o estoque compactado. Os itens em
+    # falta ficam no índice parcial produto_deficit_idx.
+    deficit = models.GeneratedField(
+        expression=models.F("limite_estoque_baixo") - models.F("estoque_disponivel"),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
 
     def __str__(self):
         return self.nome
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guardados para saber, no post_save, se o preço ou o nome mudaram.
+        instance._custo_unitario_original = instance.__dict__.get("custo_unitario")
+        instance._nome_original = instance.__dict__.get("nome")
+        return instance
+
     class Meta:
         db_table = "produto"
         verbose_name_plural = "Produtos"
@@ -130,6 +225,14 @@ class Produto(models.Model):
                 name="check_produto_custo_unitario",
             )
         ]
+        indexes = [
+            indice_trigrama("nome", "produto_nome_trgm_idx"),
+            models.Index(
+                fields=["-deficit", "id_produto"],
+                condition=Q(deficit__gt=0),
+                name="produto_deficit_idx",
+            ),
+        ]
 
 
 class Contem(models.Model):
@@ -157,33 +260,516 @@ class Contem(models.Model):
         return f"{self.quantidade} de {self.produto.nome} no Pedido {self.pedido.id_pedido}"
 
 
+def recalcular_valor_total(filtro, params):
+    """Recalcula ``Pedido.valor_total`` dos pedidos que satisfazem ``filtro``.
+
+    Também incrementa ``Pedido.versao``: é chamada sempre que os itens ou os
+    produtos de um pedido mudam.
+
+    Os pedidos são travados antes numa instrução separada: como cada
+    instrução em READ COMMITTED tem um snapshot novo, o UPDATE enxerga os
+    itens gravados por quem segurava a trava antes.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT id_pedido
+            FROM Pedido
+            WHERE {filtro}
+            ORDER BY id_pedido
+            FOR UPDATE
+            """,
+            params,
+        )
+        cursor.execute(
+            f"""
+            UPDATE Pedido
+            SET versao = versao + 1,
+                valor_total = COALESCE(
+                (
+                    SELECT SUM(Produto.custo_unitario * Contem.quantidade)
+                    FROM Contem
+                        JOIN Produto ON Contem.produto_id = Produto.id_produto
+                    WHERE Contem.pedido_id = Pedido.id_pedido
+                ),
+                0
+            )
+            WHERE {filtro}
+            """,
+            params,
+        )
+
+
+@receiver(post_save, sender=Contem)
+@receiver(post_delete, sender=Contem)
+def update_valor_total_contem(sender, instance, **kwargs):
+    recalcular_valor_total("id_pedido = %s", [instance.pedido_id])
+
+
+@receiver(post_save, sender=Produto)
+def update_valor_total_produto(sender, instance, created, **kwargs):
+    # O nome também aparece nas linhas da lista de pedidos, que precisam de
+    # versão nova.
+    if not created and (
+        getattr(instance, "_custo_unitario_original", None) != instance.custo_unitario
+        or getattr(instance, "_nome_original", None) != instance.nome
+    ):
+        recalcular_valor_total(
+            "id_pedido IN (SELECT pedido_id FROM Contem WHERE produto_id = %s)",
+            [instance.id_produto],
+        )
+    instance._custo_unitario_original = instance.custo_unitario
+    instance._nome_original = instance.nome
+
+
+def incrementar_versao(model, filtro, params):
+    """Incrementa ``versao`` das linhas de ``model`` que satisfazem ``filtro``."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {model._meta.db_table} SET versao = versao + 1 WHERE {filtro}",
+            params,
+        )
+
+
+def atualizar_versao(instance):
+    """Incrementa a versão de ``instance`` e relê as colunas do banco dela."""
+    model = type(instance)
+    campos = [model._meta.get_field(nome) for nome in model.colunas_do_banco]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {model._meta.db_table}
+            SET versao = versao + 1
+            WHERE {model._meta.pk.column} = %s
+            RETURNING {", ".join(campo.column for campo in campos)}
+            """,
+            [instance.pk],
+        )
+        linha = cursor.fetchone()
+    if linha is not None:
+        for campo, valor in zip(campos, linha):
+            setattr(instance, campo.attname, valor)
+
+
+@receiver(post_save, sender=Pedido)
+def update_versao_pedido(sender, instance, created, **kwargs):
+    if not created:
+        atualizar_versao(instance)
+
+
+class TransicaoEstoque(models.Model):
+    """Movimentos de estoque já aplicados, um por transição de status."""
+
+    BAIXA_PEDIDO = "baixa_pedido"
+    ENTRADA_ORDEM = "entrada_ordem"
+    CONSUMO_ORDEM = "consumo_ordem"
+    TIPO_CHOICES = [
+        (BAIXA_PEDIDO, "Baixa de produtos do pedido"),
+        (ENTRADA_ORDEM, "Entrada de produtos da ordem"),
+        (CONSUMO_ORDEM, "Consumo de matérias-primas da ordem"),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    referencia = models.IntegerField()
+    aplicada_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.referencia}"
+
+    class Meta:
+        db_table = "transicaoestoque"
+        verbose_name_plural = "TransicaoEstoque"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tipo", "referencia"], name="unique_transicao_tipo_referencia"
+            ),
+            CheckConstraint(
+                check=Q(tipo__in=["baixa_pedido", "entrada_ordem", "consumo_ordem"]),
+                name="check_transicaoestoque_tipo_valid",
+            ),
+        ]
+
+
+class Tarefa(models.Model):
+    """Fila de movimentos de estoque, consumida por ``processar_tarefas``.
+
+    Os receivers só inserem aqui, na transação do save; o worker aplica a
+    transição depois do commit. A mesma transição pode estar na fila mais
+    de uma vez: TransicaoEstoque garante que ela é aplicada uma vez só.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    tipo = models.CharField(max_length=20, choices=TransicaoEstoque.TIPO_CHOICES)
+    referencia = models.IntegerField()
+    tentativas = models.IntegerField(default=0, db_default=0)
+    # Antes disso o worker não pega a tarefa (espera entre tentativas).
+    executar_em = models.DateTimeField(db_default=models.functions.Now())
+    criada_em = models.DateTimeField(db_default=models.functions.Now())
+    ultimo_erro = models.TextField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.referencia}"
+
+    class Meta:
+        db_table = "tarefa"
+        verbose_name_plural = "Tarefas"
+        indexes = [
+            models.Index(fields=["executar_em", "id"], name="tarefa_executar_idx")
+        ]
+        constraints = [
+            CheckConstraint(
+                check=Q(tipo__in=["baixa_pedido", "entrada_ordem", "consumo_ordem"]),
+                name="check_tarefa_tipo_valid",
+            ),
+        ]
+
+
+class TarefaFalha(models.Model):
+    """Tarefas que esgotaram as tentativas, para inspeção e reenvio."""
+
+    id = models.BigAutoField(primary_key=True)
+    tipo = models.CharField(max_length=20, choices=TransicaoEstoque.TIPO_CHOICES)
+    referencia = models.IntegerField()
+    tentativas = models.IntegerField()
+    erro = models.TextField()
+    criada_em = models.DateTimeField()
+    falhou_em = models.DateTimeField(db_default=models.functions.Now())
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.referencia}"
+
+    class Meta:
+        db_table = "tarefafalha"
+        verbose_name_plural = "TarefasFalhas"
+
+
+# Canal do NOTIFY que acorda o worker quando uma tarefa é enfileirada.
+CANAL_TAREFAS = "tarefa"
+
+
+def enfileirar_tarefa(tipo, referencia):
+    """Põe a transição na fila, se ela ainda não foi aplicada.
+
+    O NOTIFY só é entregue no commit, junto com a tarefa.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH nova AS (
+                INSERT INTO Tarefa (tipo, referencia)
+                SELECT %s, %s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM TransicaoEstoque
+                    WHERE tipo = %s AND referencia = %s
+                )
+                RETURNING 1
+            )
+            SELECT pg_notify(%s, '') FROM nova
+            """,
+            [tipo, referencia, tipo, referencia, CANAL_TAREFAS],
+        )
+
+
+def aplicar_transicoes_estoque(tipo, referencias):
+    """Movimenta o estoque de cada uma das ``referencias``, no máximo uma vez.
+
+    A linha em TransicaoEstoque é a chave da transição: o INSERT ... ON
+    CONFLICT só insere na primeira vez, inclusive com workers concorrentes
+    (o segundo espera o primeiro terminar e não insere nada). Só entram as
+    referências que já têm itens, para que um pedido ou ordem salvo antes
+    das linhas do inline ainda seja movimentado depois. O movimento de
+    todas sai numa única instrução. Retorna as referências movimentadas.
+    """
+    itens, fk, movimento = TRANSICOES_ESTOQUE[tipo]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO TransicaoEstoque (tipo, referencia, aplicada_em)
+            SELECT DISTINCT %s, referencia, CURRENT_TIMESTAMP
+            FROM unnest(%s::integer[]) AS referencia
+            WHERE EXISTS (SELECT 1 FROM {itens} WHERE {fk} = referencia)
+            ON CONFLICT (tipo, referencia) DO NOTHING
+            RETURNING referencia
+            """,
+            [tipo, list(referencias)],
+        )
+        novas = [referencia for (referencia,) in cursor.fetchall()]
+        if novas:
+            movimento(novas)
+    return novas
+
+
 @receiver(post_save, sender=Pedido)
 def update_estoque_pedido(sender, instance, **kwargs):
     if instance.status == Pedido.PROCESSADO:
-        transaction.on_commit(lambda: reduce_produto_estoque_pedido(instance))
+        enfileirar_tarefa(TransicaoEstoque.BAIXA_PEDIDO, instance.pk)
 
 
-def reduce_produto_estoque_pedido(instance):
+def reduce_produto_estoque_pedido(pedidos):
+    # A reserva vira consumo: sai junto com a entrada no livro, na mesma
+    # transação, então o disponível não muda. A trava nos pedidos espera um
+    # sincronizar_reservas em andamento, para que a reserva que ele grava
+    # também seja apagada aqui.
     with connection.cursor() as cursor:
-        contem_items_query = """
-            SELECT Contem.id, Contem.quantidade, Contem.produto_id, Produto.estoque_disponivel
+        cursor.execute(
+            """
+            SELECT 1 FROM Pedido
+            WHERE id_pedido = ANY(%s)
+            ORDER BY id_pedido
+            FOR NO KEY UPDATE
+            """,
+            [pedidos],
+        )
+        cursor.execute("DELETE FROM Reserva WHERE pedido_id = ANY(%s)", [pedidos])
+        cursor.execute(
+            """
+            INSERT INTO MovimentacaoProduto
+                (produto_id, quantidade, origem, referencia, criada_em, compactada)
+            SELECT produto_id, -SUM(quantidade), 'pedido', pedido_id,
+                   CURRENT_TIMESTAMP, FALSE
             FROM Contem
-            JOIN Produto ON Contem.produto_id = Produto.id_produto
-            WHERE Contem.pedido_id = %s
-        """
-        cursor.execute(contem_items_query, [instance.id_pedido])
-        contem_items = cursor.fetchall()
-
-        for item in contem_items:
-            item_id, quantidade, produto_id, estoque_disponivel = item
-            new_estoque_disponivel = estoque_disponivel - quantidade
-
-            update_produto_query = """
-                UPDATE Produto
-                SET estoque_disponivel = %s
-                WHERE id_produto = %s
+            WHERE pedido_id = ANY(%s)
+            GROUP BY produto_id, pedido_id
+            """,
+            [pedidos],
+        )
+
+
+def baixar_estoque_pedidos(filtro, params):
+    """Baixa de estoque imediata dos pedidos processados que satisfazem ``filtro``.
+
+    ``filtro`` usa as colunas qualificadas por ``Pedido``. Para quem grava
+    pedidos em lote sem os receivers, na própria transação.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id_pedido FROM Pedido WHERE ({filtro}) AND Pedido.status = %s",
+            [*params, Pedido.PROCESSADO],
+        )
+        pedidos = [pedido for (pedido,) in cursor.fetchall()]
+    aplicar_transicoes_estoque(TransicaoEstoque.BAIXA_PEDIDO, pedidos)
+
+
+class Reserva(models.Model):
+    """Quantidade de um produto prometida a um pedido ainda sem baixa.
+
+    Pedidos pendentes reservam com validade; os processados mantêm a reserva
+    sem validade até a baixa, que a apaga ao registrar a saída no livro.
+    Uma reserva vencida deixa de contar sozinha (ver disponibilidade).
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    pedido = models.ForeignKey(
+        Pedido, on_delete=models.CASCADE, related_name="reservas"
+    )
+    produto = models.ForeignKey(
+        Produto, on_delete=models.CASCADE, related_name="reservas"
+    )
+    quantidade = models.IntegerField()
+    expira_em = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return (
+            f"{self.quantidade} de {self.produto.nome} para o Pedido {self.pedido_id}"
+        )
+
+    class Meta:
+        db_table = "reserva"
+        verbose_name_plural = "Reservas"
+        indexes = [
+            # A soma das reservas de um produto sai só do índice.
+            models.Index(
+                fields=["produto", "expira_em"],
+                include=["quantidade"],
+                name="reserva_produto_idx",
+            )
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["pedido", "produto"], name="unique_reserva_pedido_produto"
+            ),
+            CheckConstraint(
+                check=Q(quantidade__gt=0), name="check_reserva_quantidade_positive"
+            ),
+        ]
+
+
+class EstoqueInsuficiente(Exception):
+    """``faltando`` mapeia cada produto sem estoque para a quantidade que falta."""
+
+    def __init__(self, faltando):
+        self.faltando = faltando
+        super().__init__(
+            "Estoque insuficiente: "
+            + ", ".join(
+                f"produto {produto} (faltam {quantidade})"
+                for produto, quantidade in sorted(faltando.items())
+            )
+        )
+
+
+def disponibilidade(produtos, pedido=None):
+    """Disponível para prometer de cada um dos ``produtos``.
+
+    Retorna ``{produto: (disponível, reservado por pedido)}``. O disponível
+    é o estoque atual (snapshot mais o livro pendente) menos as reservas
+    válidas dos outros pedidos. Não trava nada: quem vai reservar chama
+    ``travar_produtos`` antes.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT
+                Produto.id_produto,
+                Produto.estoque_disponivel
+                + COALESCE((
+                    SELECT SUM(quantidade)
+                    FROM MovimentacaoProduto
+                    WHERE produto_id = Produto.id_produto AND NOT compactada
+                ), 0)
+                - COALESCE((
+                    SELECT SUM(quantidade)
+                    FROM Reserva
+                    WHERE produto_id = Produto.id_produto
+                      AND (expira_em IS NULL OR expira_em > CURRENT_TIMESTAMP)
+                      AND pedido_id IS DISTINCT FROM %s
+                ), 0),
+                COALESCE((
+                    SELECT quantidade
+                    FROM Reserva
+                    WHERE produto_id = Produto.id_produto
+                      AND (expira_em IS NULL OR expira_em > CURRENT_TIMESTAMP)
+                      AND pedido_id = %s
+                ), 0)
+            FROM Produto
+            WHERE Produto.id_produto = ANY(%s)
+            """,
+            [pedido, pedido, list(produtos)],
+        )
+        return {
+            produto: (disponivel, reservado)
+            for produto, disponivel, reservado in cursor.fetchall()
+        }
+
+
+def faltando_para(quantidades, pedido=None):
+    """Quanto falta de cada produto para reservar ``quantidades`` para ``pedido``.
+
+    Só conta o que passa da reserva que o pedido já tem.
+    """
+    faltando = {}
+    for produto, (disponivel, reservado) in disponibilidade(
+        quantidades, pedido
+    ).items():
+        quantidade = quantidades[produto]
+        if quantidade > reservado and quantidade > disponivel:
+            faltando[produto] = quantidade - max(disponivel, 0)
+    return faltando
+
+
+def travar_produtos(produtos):
+    """Serializa, até o fim da transação, quem reserva estes produtos.
+
+    É um advisory lock por produto, em ordem de id para não haver deadlock:
+    não trava a linha de Produto (preço, compactação, chaves estrangeiras)
+    nem quem só consulta a disponibilidade. A consulta seguinte, numa
+    instrução nova, já enxerga as reservas de quem segurava a trava.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
             """
-            cursor.execute(update_produto_query, [new_estoque_disponivel, produto_id])
+            SELECT pg_advisory_xact_lock(hashtext('reserva'), produto)
+            FROM unnest(%s::integer[]) AS produto
+            """,
+            [sorted(set(produtos))],
+        )
+
+
+def validade_reserva():
+    return timedelta(hours=getattr(settings, "RESERVA_VALIDADE_HORAS", 24))
+
+
+def sincronizar_reservas(pedido_id):
+    """Ajusta as reservas do pedido ao status e aos itens atuais dele.
+
+    Pendente reserva com validade e Processado sem validade, até a baixa;
+    Cancelado, pedido já baixado ou sem itens libera tudo. Entregue libera a
+    reserva de Pendente; a de Processado fica para a baixa enfileirada, que
+    a apaga junto com a entrada no livro. Levanta ``EstoqueInsuficiente`` se
+    algum item passa do disponível.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        # A mesma trava da baixa (reduce_produto_estoque_pedido): uma baixa
+        # concorrente termina antes ou espera esta transação, e a consulta
+        # seguinte, com snapshot novo, já a enxerga.
+        cursor.execute(
+            "SELECT status FROM Pedido WHERE id_pedido = %s FOR NO KEY UPDATE",
+            [pedido_id],
+        )
+        status = (cursor.fetchone() or (None,))[0]
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM TransicaoEstoque "
+            "WHERE tipo = %s AND referencia = %s)",
+            [TransicaoEstoque.BAIXA_PEDIDO, pedido_id],
+        )
+        baixado = cursor.fetchone()[0]
+        if status == Pedido.ENTREGUE:
+            cursor.execute(
+                "DELETE FROM Reserva WHERE pedido_id = %s AND expira_em IS NOT NULL",
+                [pedido_id],
+            )
+            return
+        quantidades = {}
+        if status in (Pedido.PENDENTE, Pedido.PROCESSADO) and not baixado:
+            cursor.execute(
+                """
+                SELECT produto_id, SUM(quantidade)
+                FROM Contem
+                WHERE pedido_id = %s
+                GROUP BY produto_id
+                """,
+                [pedido_id],
+            )
+            quantidades = dict(cursor.fetchall())
+        if quantidades:
+            travar_produtos(quantidades)
+            faltando = faltando_para(quantidades, pedido_id)
+            if faltando:
+                raise EstoqueInsuficiente(faltando)
+        cursor.execute("DELETE FROM Reserva WHERE pedido_id = %s", [pedido_id])
+        if quantidades:
+            cursor.execute(
+                """
+                INSERT INTO Reserva (pedido_id, produto_id, quantidade, expira_em)
+                SELECT %s, produto, quantidade, CURRENT_TIMESTAMP + %s
+                FROM unnest(%s::integer[], %s::integer[]) AS i (produto, quantidade)
+                """,
+                [
+                    pedido_id,
+                    None if status == Pedido.PROCESSADO else validade_reserva(),
+                    list(quantidades),
+                    list(quantidades.values()),
+                ],
+            )
+
+
+def liberar_reservas_expiradas():
+    """Apaga as reservas vencidas, que já não contam; retorna quantas."""
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM Reserva WHERE expira_em <= CURRENT_TIMESTAMP")
+        return cursor.rowcount
+
+
+@receiver(post_save, sender=Pedido)
+def update_reservas_pedido(sender, instance, **kwargs):
+    sincronizar_reservas(instance.pk)
+
+
+@receiver(post_save, sender=Contem)
+@receiver(post_delete, sender=Contem)
+def update_reservas_contem(sender, instance, **kwargs):
+    sincronizar_reservas(instance.pedido_id)
 
 
 class OrdemProducao(models.Model):
@@ -208,6 +794,13 @@ class OrdemProducao(models.Model):
     class Meta:
         db_table = "ordemproducao"
         verbose_name_plural = "OrdemProducao"
+        # Mesma ordem (e direções) da lista de ordens de produção.
+        indexes = [
+            models.Index(
+                fields=["-status", "data_criacao", "id_ordem"],
+                name="ordem_status_data_idx",
+            )
+        ]
         constraints = [
             CheckConstraint(
                 check=Q(status__in=["Pendente", "Concluído"]),
@@ -228,36 +821,27 @@ class OrdemProducao(models.Model):
             ),
         ]
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.status == self.CONCLUIDO:
-            increase_produto_estoque(self)
-
 
 @receiver(post_save, sender=OrdemProducao)
 def update_estoque_ordem_producao(sender, instance, **kwargs):
     if instance.status == instance.CONCLUIDO:
-        transaction.on_commit(lambda: increase_produto_estoque(instance))
+        enfileirar_tarefa(TransicaoEstoque.ENTRADA_ORDEM, instance.pk)
 
 
-def increase_produto_estoque(instance):
+def increase_produto_estoque(ordens):
     with connection.cursor() as cursor:
-        contem_ordem_producao_query = """
-            SELECT produto_id, quantidade
-            FROM ContemOrdemProducao
-            WHERE ordem_id = %s
-        """
-        cursor.execute(contem_ordem_producao_query, [instance.id_ordem])
-        contem_items = cursor.fetchall()
-
-        for item in contem_items:
-            produto_id, quantidade = item
-            update_produto_query = """
-                UPDATE Produto
-                SET estoque_disponivel = estoque_disponivel + %s
-                WHERE id_produto = %s
+        cursor.execute(
             """
-            cursor.execute(update_produto_query, [quantidade, produto_id])
+            INSERT INTO MovimentacaoProduto
+                (produto_id, quantidade, origem, referencia, criada_em, compactada)
+            SELECT produto_id, SUM(quantidade), 'ordem', ordem_id,
+                   CURRENT_TIMESTAMP, FALSE
+            FROM ContemOrdemProducao
+            WHERE ordem_id = ANY(%s)
+            GROUP BY produto_id, ordem_id
+            """,
+            [ordens],
+        )
 
 
 class ContemOrdemProducao(models.Model):
@@ -291,16 +875,32 @@ class ContemOrdemProducao(models.Model):
         verbose_name_plural = "ContemOrdemProducao"
 
 
-class MateriaPrima(models.Model):
+class MateriaPrima(ColunasDoBanco):
+    # Ver Produto.colunas_do_banco.
+    colunas_do_banco = ("estoque_disponivel",)
+
     id_materiaprima = models.AutoField(primary_key=True)
     nome = models.CharField(max_length=100)
     custo_unidade = models.DecimalField(max_digits=10, decimal_places=2)
     estoque_disponivel = models.IntegerField(default=0)
     limite_estoque_baixo = models.IntegerField(default=0)
+    # Ver Produto.deficit.
+    deficit = models.GeneratedField(
+        expression=models.F("limite_estoque_baixo") - models.F("estoque_disponivel"),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
 
     def __str__(self):
         return self.nome
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guardado para saber, no post_save, se o nome mudou.
+        instance._nome_original = instance.__dict__.get("nome")
+        return instance
+
     class Meta:
         db_table = "materiaprima"
         verbose_name_plural = "MateriaPrima"
@@ -310,6 +910,14 @@ class MateriaPrima(models.Model):
                 name="check_materiaprima_custo_unidade_non_negative",
             )
         ]
+        indexes = [
+            indice_trigrama("nome", "materiaprima_nome_trgm_idx"),
+            models.Index(
+                fields=["-deficit", "id_materiaprima"],
+                condition=Q(deficit__gt=0),
+                name="materiaprima_deficit_idx",
+            ),
+        ]
 
 
 class Constituido(models.Model):
@@ -342,45 +950,58 @@ class Constituido(models.Model):
 @receiver(post_save, sender=OrdemProducao)
 def update_materiaprima_estoque(sender, instance, **kwargs):
     if instance.status == OrdemProducao.PENDENTE:
-        transaction.on_commit(lambda: reduce_materiaprima_estoque(instance))
+        enfileirar_tarefa(TransicaoEstoque.CONSUMO_ORDEM, instance.pk)
 
 
-def reduce_materiaprima_estoque(instance):
+def reduce_materiaprima_estoque(ordens):
+    # Explode a lista de materiais das ordens inteiras de uma vez: soma o
+    # consumo de cada matéria-prima por ordem e registra tudo num único
+    # INSERT.
     with connection.cursor() as cursor:
-        contem_ordem_query = """
-            SELECT produto_id, quantidade
-            FROM ContemOrdemProducao
-            WHERE ordem_id = %s
-        """
-        cursor.execute(contem_ordem_query, [instance.id_ordem])
-        contem_ordens = cursor.fetchall()
-
-        for contem_ordem in contem_ordens:
-            produto_id, quantidade = contem_ordem
-
-            constituidos_query = """
-                SELECT materiaprima_id, quantidade
-                FROM Constituido
-                WHERE produto_id = %s
+        cursor.execute(
             """
-            cursor.execute(constituidos_query, [produto_id])
-            constituidos = cursor.fetchall()
-
-            for constituido in constituidos:
-                materiaprima_id, constituido_quantidade = constituido
-                total_quantity = constituido_quantidade * quantidade
-
-                update_materiaprima_query = """
-                    UPDATE MateriaPrima
-                    SET estoque_disponivel = estoque_disponivel - %s
-                    WHERE id_materiaprima = %s
-                """
-                cursor.execute(
-                    update_materiaprima_query, [total_quantity, materiaprima_id]
-                )
+            INSERT INTO MovimentacaoMateriaPrima
+                (materiaprima_id, quantidade, origem, referencia, criada_em,
+                 compactada)
+            SELECT
+                Constituido.materiaprima_id,
+                -SUM(Constituido.quantidade * ContemOrdemProducao.quantidade),
+                'ordem',
+                ContemOrdemProducao.ordem_id,
+                CURRENT_TIMESTAMP,
+                FALSE
+            FROM ContemOrdemProducao
+                JOIN Constituido
+                    ON Constituido.produto_id = ContemOrdemProducao.produto_id
+            WHERE ContemOrdemProducao.ordem_id = ANY(%s)
+            GROUP BY Constituido.materiaprima_id, ContemOrdemProducao.ordem_id
+            """,
+            [ordens],
+        )
 
 
-class Fornecedor(models.Model):
+# Tabela dos itens (e coluna que aponta para a referência) e movimento de
+# cada tipo de transição, para aplicar_transicoes_estoque.
+TRANSICOES_ESTOQUE = {
+    TransicaoEstoque.BAIXA_PEDIDO: (
+        "Contem",
+        "pedido_id",
+        reduce_produto_estoque_pedido,
+    ),
+    TransicaoEstoque.ENTRADA_ORDEM: (
+        "ContemOrdemProducao",
+        "ordem_id",
+        increase_produto_estoque,
+    ),
+    TransicaoEstoque.CONSUMO_ORDEM: (
+        "ContemOrdemProducao",
+        "ordem_id",
+        reduce_materiaprima_estoque,
+    ),
+}
+
+
+class Fornecedor(ColunasDoBanco):
     id_fornecedor = models.AutoField(primary_key=True)
     nome = models.CharField(max_length=100)
     avaliacao = models.DecimalField(
@@ -388,6 +1009,10 @@ class Fornecedor(models.Model):
     )
     telefone = models.CharField(max_length=15)
     email = models.EmailField(max_length=50)
+    # Ver Pedido.versao; muda também com as ofertas (Fornece) do fornecedor.
+    versao = models.IntegerField(default=1, db_default=1, editable=False)
+
+    colunas_do_banco = ("versao",)
 
     def __str__(self):
         return self.nome
@@ -405,6 +1030,15 @@ class Fornecedor(models.Model):
                 name="check_fornecedor_email_format",
             ),
         ]
+        indexes = [
+            indice_trigrama("nome", "fornecedor_nome_trgm_idx"),
+            # Chave da paginação da lista de fornecedores.
+            models.Index(
+                models.functions.Coalesce("avaliacao", models.Value(Decimal(10))),
+                models.F("id_fornecedor"),
+                name="fornecedor_avaliacao_idx",
+            ),
+        ]
 
 
 class Fornece(models.Model):
@@ -424,8 +1058,22 @@ class Fornece(models.Model):
     def __str__(self):
         return f"Fornecimento de {self.materiaprima.nome} por {self.fornecedor.nome} a R${self.preco} por unidade"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guardados para atualizar, no post_save, também a matéria-prima e o
+        # fornecedor antigos.
+        instance._materiaprima_original = instance.__dict__.get("materiaprima_id")
+        instance._fornecedor_original = instance.__dict__.get("fornecedor_id")
+        return instance
+
     class Meta:
         db_table = "fornece"
+        indexes = [
+            models.Index(
+                fields=["materiaprima", "preco"], name="fornece_materiaprima_preco_idx"
+            )
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=["fornecedor", "materiaprima"],
@@ -438,6 +1086,66 @@ class Fornece(models.Model):
         verbose_name_plural = "Fornece"
 
 
+def invalidar_catalogo(namespace, *chaves):
+    """Invalida entradas do cache de catálogo quando a transação confirmar.
+
+    Invalidar antes do commit deixaria outra requisição guardar de novo o
+    valor antigo, que ainda é o que ela enxerga.
+    """
+    transaction.on_commit(lambda: CATALOGO.invalidar(namespace, *chaves))
+
+
+def invalidar_fornecedor(fornecedor_id):
+    """Invalida as listas de fornecedores das matérias-primas que ele fornece."""
+    materias = Fornece.objects.filter(fornecedor_id=fornecedor_id).values_list(
+        "materiaprima_id", flat=True
+    )
+    if materias := list(materias):
+        invalidar_catalogo("fornecedores", *materias)
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+def invalidar_produto(sender, instance, **kwargs):
+    invalidar_catalogo("produto", instance.id_produto)
+
+
+@receiver(post_save, sender=Fornecedor)
+def invalidar_fornecedor_salvo(sender, instance, created, **kwargs):
+    if not created:
+        atualizar_versao(instance)
+    invalidar_fornecedor(instance.id_fornecedor)
+
+
+@receiver(post_save, sender=Fornece)
+@receiver(post_delete, sender=Fornece)
+def invalidar_fornece(sender, instance, **kwargs):
+    # Uma oferta editada pode ter mudado de matéria-prima ou de fornecedor.
+    original = getattr(instance, "_materiaprima_original", None)
+    materias = {instance.materiaprima_id, original or instance.materiaprima_id}
+    invalidar_catalogo("fornecedores", *materias)
+    original = getattr(instance, "_fornecedor_original", None)
+    incrementar_versao(
+        Fornecedor,
+        "id_fornecedor = ANY(%s)",
+        [list({instance.fornecedor_id, original or instance.fornecedor_id})],
+    )
+    instance._materiaprima_original = instance.materiaprima_id
+    instance._fornecedor_original = instance.fornecedor_id
+
+
+@receiver(post_save, sender=MateriaPrima)
+def update_versao_materiaprima(sender, instance, created, **kwargs):
+    # O nome aparece nas linhas da lista de fornecedores.
+    if not created and getattr(instance, "_nome_original", None) != instance.nome:
+        incrementar_versao(
+            Fornecedor,
+            "id_fornecedor IN (SELECT fornecedor_id FROM Fornece WHERE materiaprima_id = %s)",
+            [instance.id_materiaprima],
+        )
+    instance._nome_original = instance.nome
+
+
 class Funcionario(models.Model):
     id_funcionario = models.AutoField(primary_key=True)
     nome = models.CharField(max_length=100)
@@ -455,6 +1163,10 @@ class Funcionario(models.Model):
                 check=models.Q(salario__gt=0), name="check_funcionario_salario_positive"
             )
         ]
+        indexes = [
+            indice_trigrama("nome", "funcionario_nome_trgm_idx"),
+            indice_trigrama("cargo", "funcionario_cargo_trgm_idx"),
+        ]
 
 
 class Recebe(models.Model):
@@ -501,3 +1213,246 @@ class Realiza(models.Model):
             )
         ]
         verbose_name_plural = "Realiza"
+
+
+class MovimentacaoProduto(models.Model):
+    """Livro de movimentações de estoque de produtos (somente inserção).
+
+    Quem altera o estoque só insere aqui; ``compactar_movimentacoes`` soma
+    as linhas pendentes em ``Produto.estoque_disponivel``. Correções manuais
+    entram como uma linha nova de origem ``AJUSTE``.
+    """
+
+    PEDIDO = "pedido"
+    ORDEM = "ordem"
+    AJUSTE = "ajuste"
+    ORIGEM_CHOICES = [
+        (PEDIDO, "Pedido"),
+        (ORDEM, "Ordem de produção"),
+        (AJUSTE, "Ajuste de estoque"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    produto = models.ForeignKey(
+        Produto, on_delete=models.CASCADE, related_name="movimentacoes"
+    )
+    quantidade = models.IntegerField()
+    origem = models.CharField(max_length=20, choices=ORIGEM_CHOICES)
+    referencia = models.IntegerField(blank=True, null=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    compactada = models.BooleanField(default=False)
+
+    def __str__(self):
+        return (
+            f"{self.quantidade:+} de {self.produto.nome} ({self.get_origem_display()})"
+        )
+
+    class Meta:
+        db_table = "movimentacaoproduto"
+        verbose_name_plural = "MovimentacaoProduto"
+        indexes = [
+            models.Index(
+                fields=["produto"],
+                condition=Q(compactada=False),
+                name="movproduto_pendente_idx",
+            ),
+            models.Index(fields=["produto", "criada_em"], name="movproduto_criada_idx"),
+        ]
+        constraints = [
+            CheckConstraint(
+                check=~Q(quantidade=0), name="check_movimentacaoproduto_quantidade"
+            ),
+            CheckConstraint(
+                check=Q(origem__in=["pedido", "ordem", "ajuste"]),
+                name="check_movimentacaoproduto_origem_valid",
+            ),
+        ]
+
+
+class MovimentacaoMateriaPrima(models.Model):
+    """Livro de movimentações de estoque de matérias-primas (somente inserção)."""
+
+    ORDEM = "ordem"
+    COMPRA = "compra"
+    AJUSTE = "ajuste"
+    ORIGEM_CHOICES = [
+        (ORDEM, "Ordem de produção"),
+        (COMPRA, "Compra"),
+        (AJUSTE, "Ajuste de estoque"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    materiaprima = models.ForeignKey(
+        MateriaPrima, on_delete=models.CASCADE, related_name="movimentacoes"
+    )
+    quantidade = models.IntegerField()
+    origem = models.CharField(max_length=20, choices=ORIGEM_CHOICES)
+    referencia = models.IntegerField(blank=True, null=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    compactada = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.quantidade:+} de {self.materiaprima.nome} ({self.get_origem_display()})"
+
+    class Meta:
+        db_table = "movimentacaomateriaprima"
+        verbose_name_plural = "MovimentacaoMateriaPrima"
+        indexes = [
+            models.Index(
+                fields=["materiaprima"],
+                condition=Q(compactada=False),
+                name="movmateriaprima_pendente_idx",
+            ),
+            models.Index(
+                fields=["materiaprima", "criada_em"], name="movmateriaprima_criada_idx"
+            ),
+        ]
+        constraints = [
+            CheckConstraint(
+                check=~Q(quantidade=0),
+                name="check_movimentacaomateriaprima_quantidade",
+            ),
+            CheckConstraint(
+                check=Q(origem__in=["ordem", "compra", "ajuste"]),
+                name="check_movimentacaomateriaprima_origem_valid",
+            ),
+        ]
+
+
+# Tabela do livro e coluna que aponta para o item de estoque.
+LIVROS_ESTOQUE = {
+    Produto: ("MovimentacaoProduto", "produto_id"),
+    MateriaPrima: ("MovimentacaoMateriaPrima", "materiaprima_id"),
+}
+
+
+def estoque_atual_sql(model, somente_baixo=False):
+    """Tabela derivada de ``model`` com o estoque atual.
+
+    ``estoque_disponivel`` vira o snapshot somado às movimentações ainda não
+    compactadas, e ``deficit`` é recalculado a partir dele. O alias é o nome
+    da própria tabela, então basta trocar o ``FROM Produto`` de uma consulta
+    por ``FROM {estoque_atual_sql(Produto)}``.
+
+    Com ``somente_baixo`` ficam só os itens abaixo do limite. Os candidatos
+    saem dos índices parciais (deficit armazenado positivo ou movimentações
+    pendentes), então o custo acompanha o número de itens em falta e não o
+    tamanho do catálogo.
+    """
+    livro, fk = LIVROS_ESTOQUE[model]
+    tabela = model._meta.db_table
+    pk = model._meta.pk.column
+    columns = ", ".join(
+        f"{tabela}.{field.column}"
+        for field in model._meta.concrete_fields
+        if field.column not in ("estoque_disponivel", "deficit")
+    )
+    estoque = f"{tabela}.estoque_disponivel + COALESCE(pendente.quantidade, 0)"
+    deficit = f"{tabela}.limite_estoque_baixo - ({estoque})"
+
+    candidatos = ""
+    filtro = ""
+    if somente_baixo:
+        candidatos = f"""
+            JOIN (
+                SELECT {pk} AS id FROM {tabela} WHERE deficit > 0
+                UNION
+                SELECT {fk} FROM {livro} WHERE NOT compactada
+            ) AS candidatos ON candidatos.id = {tabela}.{pk}"""
+        filtro = f"WHERE {deficit} > 0"
+
+    return f"""(
+        SELECT
+            {columns},
+            {estoque} AS estoque_disponivel,
+            {deficit} AS deficit
+        FROM {tabela}{candidatos}
+            LEFT JOIN (
+                SELECT {fk}, SUM(quantidade) AS quantidade
+                FROM {livro}
+                WHERE NOT compactada
+                GROUP BY {fk}
+            ) AS pendente ON pendente.{fk} = {tabela}.{pk}
+        {filtro}
+    ) AS {tabela}"""
+
+
+def estoque_em(instance, instante):
+    """Estoque de um Produto ou MateriaPrima em ``instante``.
+
+    Parte do estoque atual e desfaz as movimentações posteriores ao instante.
+    """
+    model = type(instance)
+    livro, fk = LIVROS_ESTOQUE[model]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT
+                t.estoque_disponivel
+                + COALESCE(SUM(m.quantidade) FILTER (WHERE NOT m.compactada), 0)
+                - COALESCE(SUM(m.quantidade) FILTER (WHERE m.criada_em > %s), 0)
+            FROM {model._meta.db_table} t
+                LEFT JOIN {livro} m
+                    ON m.{fk} = t.{model._meta.pk.column}
+                    AND (NOT m.compactada OR m.criada_em > %s)
+            WHERE t.{model._meta.pk.column} = %s
+            GROUP BY t.estoque_disponivel
+            """,
+            [instante, instante, instance.pk],
+        )
+        return cursor.fetchone()[0]
+
+
+def compactar_movimentacoes(lote=10_000):
+    """Soma as movimentações pendentes no ``estoque_disponivel``.
+
+    Cada lote marca as linhas como compactadas e aplica um único UPDATE por
+    item de estoque, na mesma transação. Um advisory lock garante um
+    compactador por vez. Retorna o número de movimentações compactadas.
+    """
+    total = 0
+    for model, (livro, fk) in LIVROS_ESTOQUE.items():
+        tabela = model._meta.db_table
+        pk = model._meta.pk.column
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_try_advisory_xact_lock(hashtext(%s))", [livro]
+                )
+                if not cursor.fetchone()[0]:
+                    break
+                cursor.execute(
+                    f"""
+                    WITH lote AS (
+                        SELECT id, {fk}, quantidade
+                        FROM {livro}
+                        WHERE NOT compactada
+                        ORDER BY id
+                        LIMIT %s
+                    ),
+                    marcadas AS (
+                        UPDATE {livro}
+                        SET compactada = TRUE
+                        FROM lote
+                        WHERE {livro}.id = lote.id
+                        RETURNING {livro}.id
+                    ),
+                    aplicadas AS (
+                        UPDATE {tabela}
+                        SET estoque_disponivel = {tabela}.estoque_disponivel + delta.quantidade
+                        FROM (
+                            SELECT {fk}, SUM(quantidade) AS quantidade
+                            FROM lote
+                            GROUP BY {fk}
+                        ) AS delta
+                        WHERE {tabela}.{pk} = delta.{fk}
+                    )
+                    SELECT COUNT(*) FROM marcadas
+                    """,
+                    [lote],
+                )
+                compactadas = cursor.fetchone()[0]
+            total += compactadas
+            if compactadas < lote:
+                break
+    return total
@@ -0,0 +1,258 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+PAGE_SIZE = 50
+# Limites do NUMERIC do PostgreSQL: dígitos antes e depois da vírgula.
+_NUMERIC_INTEIROS = 131_072
+_NUMERIC_DECIMAIS = 16_383
+
+
+@dataclass(frozen=True)
+class Chave:
+    """Coluna da ordenação de uma lista.
+
+    ``expressao`` é o SQL usado no ORDER BY e na condição de busca,
+    ``atributo`` é o nome com que o valor aparece nas linhas retornadas e
+    ``tipo`` é o tipo Python desse valor, conferido ao decodificar o cursor.
+    """
+
+    expressao: str
+    atributo: str
+    descendente: bool = False
+    tipo: type = int
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    has_next: bool
+    has_previous: bool
+    next_query: str = ""
+    previous_query: str = ""
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"t": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"n": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "t" in value:
+            return datetime.fromisoformat(value["t"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "n" in value:
+            return Decimal(value["n"])
+    return value
+
+
+def _valido(value, tipo):
+    """Se ``value`` pode ir como parâmetro para uma coluna de ``tipo``.
+
+    O tipo é comparado exatamente: bool não passa por int nem datetime por
+    date. Os limites recusam o que o PostgreSQL rejeitaria com DataError.
+    """
+    if type(value) is not tipo:
+        return False
+    if tipo is int:
+        return -(2**63) <= value < 2**63
+    if tipo is Decimal:
+        return (
+            value.is_finite()
+            and value.adjusted() < _NUMERIC_INTEIROS
+            and value.as_tuple().exponent >= -_NUMERIC_DECIMAIS
+        )
+    if tipo is str:
+        return "\x00" not in value
+    return True
+
+
+class KeysetPaginator:
+    """Paginação por keyset (seek method) para as consultas raw das listas.
+
+    Em vez de OFFSET, cada página começa logo depois (ou antes) da última
+    linha vista, então o custo de uma página não depende da sua posição.
+    A última chave da ordenação deve ser a chave primária, que garante uma
+    ordem total. Os cursores vão na query string como ``cursor``.
+    """
+
+    cursor_param = "cursor"
+
+    def __init__(self, ordering, page_size=PAGE_SIZE):
+        self.ordering = list(ordering)
+        self.page_size = page_size
+
+    def encode(self, row, backwards=False):
+        values = [
+            _encode_value(getattr(row, chave.atributo)) for chave in self.ordering
+        ]
+        payload = json.dumps({"v": values, "p": backwards}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode(self, token):
+        """Retorna ``(valores, backwards)`` ou ``None`` para cursores inválidos.
+
+        O cursor vem do cliente: além da estrutura, cada valor precisa ter o
+        tipo da sua chave, senão chegaria ao banco como parâmetro inválido.
+        """
+        if not token:
+            return None
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values = [_decode_value(value) for value in payload["v"]]
+            backwards = bool(payload.get("p"))
+        except (
+            binascii.Error,
+            ValueError,
+            TypeError,
+            KeyError,
+            InvalidOperation,
+        ):
+            return None
+        if len(values) != len(self.ordering):
+            return None
+        if not all(
+            _valido(value, chave.tipo) for value, chave in zip(values, self.ordering)
+        ):
+            return None
+        return values, backwards
+
+    def seek(self, values, backwards=False):
+        """Condição SQL que seleciona as linhas depois de ``values``."""
+        directions = {chave.descendente for chave in self.ordering}
+        if len(directions) == 1:
+            # Com todas as colunas na mesma direção a comparação de tuplas
+            # usa diretamente um índice composto.
+            descendente = directions.pop() != backwards
+            columns = ", ".join(chave.expressao for chave in self.ordering)
+            placeholders = ", ".join(["%s"] * len(values))
+            operator = "<" if descendente else ">"
+            return f"({columns}) {operator} ({placeholders})", list(values)
+
+        disjuncts = []
+        params = []
+        for i, chave in enumerate(self.ordering):
+            terms = [f"{anterior.expressao} = %s" for anterior in self.ordering[:i]]
+            operator = "<" if chave.descendente != backwards else ">"
+            terms.append(f"{chave.expressao} {operator} %s")
+            disjuncts.append("(" + " AND ".join(terms) + ")")
+            params.extend(values[: i + 1])
+        return "(" + " OR ".join(disjuncts) + ")", params
+
+    def order_by(self, backwards=False):
+        columns = []
+        for chave in self.ordering:
+            descendente = chave.descendente != backwards
+            columns.append(f"{chave.expressao} {'DESC' if descendente else 'ASC'}")
+        return " ORDER BY " + ", ".join(columns)
+
+    def paginate(
+        self,
+        request,
+        model,
+        base_query,
+        where_clauses,
+        params,
+        group_by="",
+        having_clauses=(),
+        having_params=(),
+    ):
+        """Executa ``base_query`` com os filtros da view e retorna uma página.
+
+        ``where_clauses``/``params`` são os mesmos montados pelas views; a
+        condição do cursor é acrescentada a eles antes do GROUP BY.
+        """
+        query, query_params, cursor = self.consulta(
+            request,
+            base_query,
+            where_clauses,
+            params,
+            group_by,
+            having_clauses,
+            having_params,
+        )
+        return self.pagina(
+            request, list(model.objects.raw(query, query_params)), cursor
+        )
+
+    def consulta(
+        self,
+        request,
+        base_query,
+        where_clauses,
+        params,
+        group_by="",
+        having_clauses=(),
+        having_params=(),
+    ):
+        """SQL de ``paginate``, para quem executa a consulta por conta própria.
+
+        Retorna ``(query, params, cursor)``; as linhas e o ``cursor`` vão
+        depois para ``pagina``.
+        """
+        cursor = self.decode(request.GET.get(self.cursor_param))
+        clauses = list(where_clauses)
+        query_params = list(params)
+
+        backwards = False
+        if cursor is not None:
+            values, backwards = cursor
+            seek_clause, seek_params = self.seek(values, backwards)
+            clauses.append(seek_clause)
+            query_params.extend(seek_params)
+
+        query = base_query
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        if group_by:
+            query += f" GROUP BY {group_by}"
+        if having_clauses:
+            query += " HAVING " + " AND ".join(having_clauses)
+            query_params.extend(having_params)
+        query += self.order_by(backwards)
+        query += " LIMIT %s"
+        query_params.append(self.page_size + 1)
+        return query, query_params, cursor
+
+    def pagina(self, request, rows, cursor):
+        """Monta a página com as linhas retornadas pela ``consulta``."""
+        backwards = cursor is not None and cursor[1]
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        page = KeysetPage(rows, has_next and bool(rows), has_previous and bool(rows))
+        if page.has_next:
+            page.next_query = self._query_string(request, self.encode(rows[-1]))
+        if page.has_previous:
+            page.previous_query = self._query_string(
+                request, self.encode(rows[0], backwards=True)
+            )
+        return page
+
+    def _query_string(self, request, token):
+        query = request.GET.copy()
+        query[self.cursor_param] = token
+        return query.urlencode()
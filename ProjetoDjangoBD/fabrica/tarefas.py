@@ -0,0 +1,114 @@
+"""Worker da fila de movimentos de estoque (models.Tarefa).
+
+Cada lote é pego com ``FOR UPDATE SKIP LOCKED``, então vários workers
+dividem a fila sem esperar uns pelos outros. As tarefas do lote são
+agrupadas por tipo e cada grupo é aplicado por ``aplicar_transicoes_estoque``
+numa única instrução. Se o grupo falha, cada tarefa dele é tentada sozinha
+para isolar a culpada, que volta para a fila com espera exponencial ou, sem
+tentativas restantes, vai para TarefaFalha.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+
+from .models import CANAL_TAREFAS, Tarefa, TarefaFalha, aplicar_transicoes_estoque
+
+MAX_TENTATIVAS = 5
+# Espera antes da segunda tentativa; dobra a cada falha, até ESPERA_MAXIMA.
+ESPERA_BASE = timedelta(seconds=5)
+ESPERA_MAXIMA = timedelta(hours=1)
+
+
+def espera(tentativas, base=ESPERA_BASE):
+    """Quanto esperar depois da falha número ``tentativas``."""
+    return min(base * 2 ** (tentativas - 1), ESPERA_MAXIMA)
+
+
+def processar_lote(lote=500, max_tentativas=MAX_TENTATIVAS, base=ESPERA_BASE):
+    """Processa até ``lote`` tarefas vencidas; retorna quantas pegou.
+
+    As tarefas são apagadas ao serem pegas, na mesma transação em que são
+    aplicadas: se o worker morre no meio, o rollback as devolve à fila.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            """
+            DELETE FROM Tarefa
+            WHERE id IN (
+                SELECT id
+                FROM Tarefa
+                WHERE executar_em <= CURRENT_TIMESTAMP
+                ORDER BY executar_em, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, tipo, referencia, tentativas, criada_em
+            """,
+            [lote],
+        )
+        colunas = [coluna.name for coluna in cursor.description]
+        tarefas = [Tarefa(**dict(zip(colunas, linha))) for linha in cursor.fetchall()]
+
+        por_tipo = defaultdict(list)
+        for tarefa in tarefas:
+            por_tipo[tarefa.tipo].append(tarefa)
+        falhas = []
+        for tipo, grupo in por_tipo.items():
+            try:
+                with transaction.atomic():
+                    aplicar_transicoes_estoque(
+                        tipo, [tarefa.referencia for tarefa in grupo]
+                    )
+            except Exception as e:
+                if len(grupo) == 1:
+                    falhas.append((grupo[0], f"{type(e).__name__}: {e}"))
+                    continue
+                # Uma a uma, para que só a culpada volte para a fila.
+                for tarefa in grupo:
+                    try:
+                        with transaction.atomic():
+                            aplicar_transicoes_estoque(tipo, [tarefa.referencia])
+                    except Exception as e:
+                        falhas.append((tarefa, f"{type(e).__name__}: {e}"))
+
+        for tarefa, erro in falhas:
+            tentativas = tarefa.tentativas + 1
+            if tentativas >= max_tentativas:
+                TarefaFalha.objects.create(
+                    tipo=tarefa.tipo,
+                    referencia=tarefa.referencia,
+                    tentativas=tentativas,
+                    erro=erro,
+                    criada_em=tarefa.criada_em,
+                )
+                continue
+            cursor.execute(
+                """
+                INSERT INTO Tarefa
+                    (tipo, referencia, tentativas, executar_em, criada_em, ultimo_erro)
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP + %s, %s, %s)
+                """,
+                [
+                    tarefa.tipo,
+                    tarefa.referencia,
+                    tentativas,
+                    espera(tentativas, base),
+                    tarefa.criada_em,
+                    erro,
+                ],
+            )
+    return len(tarefas)
+
+
+def esperar_tarefas(segundos):
+    """Dorme até ``segundos`` ou até um NOTIFY de tarefa nova.
+
+    A conexão fica em LISTEN desde a primeira chamada; ela precisa estar em
+    autocommit, fora de transação, para receber as notificações.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {CANAL_TAREFAS}")
+    for _ in connection.connection.notifies(timeout=segundos, stop_after=1):
+        pass
@@ -0,0 +1,176 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from fabrica.models import Contem, MovimentacaoProduto, Pedido, Produto, Reserva
+from fabrica.tests.test_estoque import criar_cliente, criar_pedido, criar_produto
+
+
+class EstoqueInsuficienteAdminTests(TestCase):
+    """O ``EstoqueInsuficiente`` dos receivers de reserva volta como erro."""
+
+    def setUp(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "senha")
+        )
+        self.cliente = criar_cliente()
+        self.produto = criar_produto(estoque=10)
+
+    def test_contem_salvo_fora_do_inline(self):
+        pedido = criar_pedido(self.cliente)
+
+        resposta = self.client.post(
+            "/admin/fabrica/contem/add/",
+            {"pedido": pedido.pk, "produto": self.produto.pk, "quantidade": 50},
+        )
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, "Estoque insuficiente de Produto: faltam 40.")
+        self.assertContains(resposta, 'value="50"')
+        self.assertFalse(Contem.objects.exists())
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_pedido_com_reserva_concorrente(self):
+        # O inline valida sem a trava: aqui a conta dele passa, como se a
+        # reserva concorrente viesse logo depois, e a do receiver falha.
+        hoje = date.today().isoformat()
+        dados = {
+            "data_pedido": hoje,
+            "data_pagamento": hoje,
+            "status": Pedido.PENDENTE,
+            "forma_pagamento": "Pix",
+            "cliente": self.cliente.pk,
+            "itens-TOTAL_FORMS": 1,
+            "itens-INITIAL_FORMS": 0,
+            "itens-0-produto": self.produto.pk,
+            "itens-0-quantidade": 50,
+        }
+
+        with mock.patch("fabrica.admin.faltando_para", return_value={}):
+            resposta = self.client.post("/admin/fabrica/pedido/add/", dados)
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, "Estoque insuficiente de Produto: faltam 40.")
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_exclusao_de_item(self):
+        outro = criar_produto(estoque=10)
+        pedido = criar_pedido(self.cliente)
+        Contem.objects.create(pedido=pedido, produto=self.produto, quantidade=5)
+        item = Contem.objects.create(pedido=pedido, produto=outro, quantidade=5)
+        # A reserva venceu e o estoque caiu; ao refazê-la sem o item, falta.
+        Reserva.objects.filter(pedido=pedido).update(
+            expira_em=timezone.now() - timedelta(hours=1)
+        )
+        Produto.objects.filter(pk=self.produto.pk).update(estoque_disponivel=2)
+
+        url = f"/admin/fabrica/contem/{item.pk}/delete/"
+        resposta = self.client.post(url, {"post": "yes"}, follow=True)
+
+        self.assertRedirects(resposta, url)
+        self.assertContains(resposta, "Estoque insuficiente de Produto: faltam 3.")
+        self.assertTrue(Contem.objects.filter(pk=item.pk).exists())
+        self.assertEqual(Reserva.objects.filter(pedido=pedido).count(), 2)
+
+
+class EstoqueAtualAdminTests(TestCase):
+    """O admin mostra o estoque atual e não grava o snapshot."""
+
+    def setUp(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "senha")
+        )
+        self.produto = criar_produto(estoque=10)
+        MovimentacaoProduto.objects.create(
+            produto=self.produto, quantidade=-3, origem=MovimentacaoProduto.PEDIDO
+        )
+        self.url = f"/admin/fabrica/produto/{self.produto.pk}/change/"
+
+    def test_mostra_estoque_atual(self):
+        resposta = self.client.get(self.url)
+
+        self.assertContains(resposta, "Estoque atual")
+        self.assertContains(resposta, '<div class="readonly">7</div>', html=True)
+        self.assertNotContains(resposta, 'name="estoque_disponivel"')
+        self.assertContains(
+            self.client.get("/admin/fabrica/produto/"),
+            '<td class="field-estoque_atual">7</td>',
+        )
+
+    def test_paginas_sem_anotacao(self):
+        for url in (
+            "/admin/fabrica/produto/add/",
+            "/admin/fabrica/materiaprima/",
+            "/admin/fabrica/materiaprima/add/",
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_save_nao_altera_snapshot(self):
+        resposta = self.client.post(
+            self.url,
+            {
+                "nome": "Outro nome",
+                "estoque_disponivel": 999,
+                "limite_estoque_baixo": 0,
+                "custo_unitario": "10.00",
+                "materias_primas-TOTAL_FORMS": 0,
+                "materias_primas-INITIAL_FORMS": 0,
+            },
+        )
+
+        self.assertEqual(resposta.status_code, 302)
+        gravado = Produto.objects.get(pk=self.produto.pk)
+        self.assertEqual(gravado.nome, "Outro nome")
+        self.assertEqual(gravado.estoque_disponivel, 10)
+
+
+class LivroEstoqueAdminTests(TestCase):
+    """O livro de estoque no admin só recebe ajustes; o gravado não muda."""
+
+    def setUp(self):
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "senha")
+        )
+        self.produto = criar_produto(estoque=10)
+        self.movimentacao = MovimentacaoProduto.objects.create(
+            produto=self.produto, quantidade=-3, origem=MovimentacaoProduto.PEDIDO
+        )
+        self.url = f"/admin/fabrica/movimentacaoproduto/{self.movimentacao.pk}"
+
+    def test_nao_altera(self):
+        resposta = self.client.get(f"{self.url}/change/")
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotContains(resposta, 'name="quantidade"')
+        self.client.post(
+            f"{self.url}/change/",
+            {"produto": self.produto.pk, "quantidade": 5, "origem": "pedido"},
+        )
+        self.movimentacao.refresh_from_db()
+        self.assertEqual(self.movimentacao.quantidade, -3)
+
+    def test_nao_apaga(self):
+        resposta = self.client.post(f"{self.url}/delete/", {"post": "yes"})
+
+        self.assertEqual(resposta.status_code, 403)
+        self.assertTrue(
+            MovimentacaoProduto.objects.filter(pk=self.movimentacao.pk).exists()
+        )
+
+    def test_inclui_ajuste(self):
+        resposta = self.client.post(
+            "/admin/fabrica/movimentacaoproduto/add/",
+            {"produto": self.produto.pk, "quantidade": 4, "origem": "pedido"},
+        )
+
+        self.assertEqual(resposta.status_code, 302)
+        ajuste = MovimentacaoProduto.objects.latest("id")
+        self.assertEqual(
+            (ajuste.quantidade, ajuste.origem, ajuste.compactada),
+            (4, MovimentacaoProduto.AJUSTE, False),
+        )
@@ -0,0 +1,91 @@
+import json
+from datetime import date
+
+from django.contrib.auth.models import Permission, User
+from django.test import Client, TestCase, override_settings
+
+from fabrica.models import Pedido
+from fabrica.tests.test_estoque import criar_cliente, criar_produto
+
+CHAVE = "chave-de-teste"
+# Segredo CSRF sem máscara, aceito tanto no cookie quanto no cabeçalho.
+TOKEN_CSRF = "a" * 32
+
+
+@override_settings(API_CHAVES={CHAVE: "integracao"})
+class CriacaoEmLoteAutenticacaoTests(TestCase):
+    """POST /api/pedidos/: sessão com token CSRF ou chave de API sem CSRF."""
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.usuario = User.objects.create_user("integracao")
+        self.usuario.user_permissions.add(Permission.objects.get(codename="add_pedido"))
+        cliente = criar_cliente()
+        produto = criar_produto(estoque=10)
+        self.corpo = json.dumps(
+            [
+                {
+                    "cliente_id": cliente.pk,
+                    "data_pedido": date.today().isoformat(),
+                    "status": Pedido.PENDENTE,
+                    "forma_pagamento": "Pix",
+                    "data_pagamento": date.today().isoformat(),
+                    "itens": [{"produto_id": produto.pk, "quantidade": 2}],
+                }
+            ]
+        )
+
+    def post(self, **cabecalhos):
+        return self.client.post(
+            "/api/pedidos/", self.corpo, content_type="application/json", **cabecalhos
+        )
+
+    def test_chave_dispensa_csrf(self):
+        resposta = self.post(HTTP_AUTHORIZATION=f"Bearer {CHAVE}")
+
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_chave_invalida(self):
+        resposta = self.post(HTTP_AUTHORIZATION="Bearer outra")
+
+        self.assertEqual(resposta.status_code, 401)
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_chave_de_usuario_inativo(self):
+        self.usuario.is_active = False
+        self.usuario.save()
+
+        self.assertEqual(
+            self.post(HTTP_AUTHORIZATION=f"Bearer {CHAVE}").status_code, 401
+        )
+
+    def test_chave_sem_permissao(self):
+        self.usuario.user_permissions.clear()
+
+        resposta = self.post(HTTP_AUTHORIZATION=f"Bearer {CHAVE}")
+
+        self.assertEqual(resposta.status_code, 403)
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_sessao_sem_token_csrf(self):
+        self.client.force_login(self.usuario)
+
+        self.assertEqual(self.post().status_code, 403)
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_sessao_com_token_csrf(self):
+        self.client.force_login(self.usuario)
+        self.client.cookies["csrftoken"] = TOKEN_CSRF
+
+        resposta = self.post(HTTP_X_CSRFTOKEN=TOKEN_CSRF)
+
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(Pedido.objects.count(), 1)
+
+    def test_sem_autenticacao(self):
+        self.client.cookies["csrftoken"] = TOKEN_CSRF
+
+        resposta = self.post(HTTP_X_CSRFTOKEN=TOKEN_CSRF)
+
+        self.assertEqual(resposta.status_code, 403)
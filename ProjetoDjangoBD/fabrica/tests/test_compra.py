@@ -0,0 +1,59 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from fabrica.cache import CATALOGO
+from fabrica.models import Fornece, Fornecedor, MateriaPrima, MovimentacaoMateriaPrima
+
+
+class ComprarMateriaPrimaViewTests(TestCase):
+    def setUp(self):
+        CATALOGO.limpar()
+        self.materiaprima = MateriaPrima.objects.create(
+            nome="Aço", custo_unidade=Decimal("2.00"), estoque_disponivel=10
+        )
+        self.fornecedor = Fornecedor.objects.create(
+            nome="Fornecedor", telefone="11999999999", email="f@example.com"
+        )
+        Fornece.objects.create(
+            fornecedor=self.fornecedor, materiaprima=self.materiaprima, preco=3
+        )
+        self.outro = Fornecedor.objects.create(
+            nome="Outro", telefone="11999999999", email="o@example.com"
+        )
+        self.caminho = f"/comprar_materiaprima/{self.materiaprima.pk}/"
+
+    def test_compra_registra_a_entrada(self):
+        resposta = self.client.post(
+            self.caminho, {"quantidade": "25", "fornecedor": self.fornecedor.pk}
+        )
+        self.assertRedirects(resposta, self.caminho)
+        self.assertEqual(
+            list(
+                MovimentacaoMateriaPrima.objects.values_list(
+                    "quantidade", "origem", "referencia"
+                )
+            ),
+            [(25, "compra", self.fornecedor.pk)],
+        )
+
+    def test_dados_invalidos_mostram_o_erro_sem_gravar(self):
+        for dados in [
+            {"quantidade": "0", "fornecedor": self.fornecedor.pk},
+            {"quantidade": "-3", "fornecedor": self.fornecedor.pk},
+            {"quantidade": "abc", "fornecedor": self.fornecedor.pk},
+            {"quantidade": "99999999999", "fornecedor": self.fornecedor.pk},
+            {"fornecedor": self.fornecedor.pk},
+            {"quantidade": "5"},
+            {"quantidade": "5", "fornecedor": "x"},
+            {"quantidade": "5", "fornecedor": self.outro.pk},
+        ]:
+            with self.subTest(dados=dados):
+                resposta = self.client.post(self.caminho, dados)
+                self.assertEqual(resposta.status_code, 200)
+                self.assertTrue(resposta.context["form"].errors)
+                self.assertContains(resposta, "alert-danger")
+        self.assertFalse(MovimentacaoMateriaPrima.objects.exists())
+
+    def test_materia_prima_inexistente(self):
+        self.assertEqual(self.client.get("/comprar_materiaprima/0/").status_code, 404)
@@ -0,0 +1,35 @@
+from django.test import TestCase
+
+from fabrica.management.dados import popular
+from fabrica.models import ContemOrdemProducao, Fornece, Realiza
+
+# O menor volume que gera todas as tabelas de relacionamento.
+MINIMO = {
+    "clientes": 1,
+    "pedidos": 1,
+    "itens_por_pedido": 1,
+    "produtos": 2,
+    "materias_primas": 3,
+    "materias_por_produto": 1,
+    "fornecedores": 1,
+    "funcionarios": 2,
+    "ordens": 2,
+}
+
+
+class PopularTests(TestCase):
+    """popular aceita o mínimo e recusa antes de inserir o que não cabe."""
+
+    def test_minimo(self):
+        popular(**MINIMO)
+
+        self.assertEqual(Fornece.objects.count(), 3)
+        self.assertEqual(ContemOrdemProducao.objects.count(), 4)
+        self.assertEqual(Realiza.objects.count(), 4)
+
+    def test_abaixo_do_minimo(self):
+        for nome in ("produtos", "materias_primas", "funcionarios"):
+            with self.subTest(nome=nome):
+                with self.assertRaises(ValueError):
+                    popular(**{**MINIMO, nome: MINIMO[nome] - 1})
+                self.assertFalse(Realiza.objects.exists())
@@ -0,0 +1,28 @@
+import tempfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+
+class ArquivosEstaticosTests(SimpleTestCase):
+    """O collectstatic de produção aceita os arquivos vendorizados como são."""
+
+    def test_collectstatic(self):
+        with tempfile.TemporaryDirectory() as destino:
+            storages = {
+                "staticfiles": {"BACKEND": "fabrica.estaticos.ArquivosEstaticos"}
+            }
+            with override_settings(STATIC_ROOT=destino, STORAGES=storages):
+                call_command("collectstatic", interactive=False, verbosity=0)
+
+            bundle = next(Path(destino).glob("bootstrap.bundle.*.js"))
+            self.assertTrue(
+                bundle.read_text()
+                .rstrip()
+                .endswith("//# sourceMappingURL=bootstrap.bundle.js.map")
+            )
+            css = next(Path(destino).glob("bootstrap.*.css"))
+            self.assertRegex(
+                css.read_text(), r"sourceMappingURL=bootstrap\.css\.\w+\.map"
+            )
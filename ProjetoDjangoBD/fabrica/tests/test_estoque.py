@@ -0,0 +1,283 @@
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection, connections, transaction
+from django.test import TransactionTestCase
+
+from fabrica.models import (
+    Cliente,
+    Constituido,
+    Contem,
+    ContemOrdemProducao,
+    MateriaPrima,
+    MovimentacaoMateriaPrima,
+    MovimentacaoProduto,
+    OrdemProducao,
+    Pedido,
+    Produto,
+    Reserva,
+    TransicaoEstoque,
+    aplicar_transicoes_estoque,
+    compactar_movimentacoes,
+    disponibilidade,
+    estoque_atual_sql,
+)
+from fabrica.tarefas import processar_lote
+
+
+def criar_cliente():
+    return Cliente.objects.create(
+        nome="Cliente",
+        telefone="11999999999",
+        email="c@example.com",
+        numero=1,
+        cep="01001-000",
+    )
+
+
+def criar_produto(estoque):
+    return Produto.objects.create(
+        nome="Produto", estoque_disponivel=estoque, custo_unitario=Decimal("10.00")
+    )
+
+
+def criar_pedido(cliente, status=Pedido.PENDENTE):
+    return Pedido.objects.create(
+        cliente=cliente,
+        data_pedido=date.today(),
+        data_pagamento=date.today(),
+        status=status,
+        forma_pagamento="Pix",
+    )
+
+
+def estoque_atual(produto):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT estoque_disponivel FROM {estoque_atual_sql(Produto)} "
+            "WHERE id_produto = %s",
+            [produto.pk],
+        )
+        return cursor.fetchone()[0]
+
+
+def em_paralelo(funcao, argumentos):
+    """Roda ``funcao`` para cada argumento numa thread, com conexão própria.
+
+    As threads partem juntas de uma barreira; a primeira exceção é relançada.
+    """
+    barreira = threading.Barrier(len(argumentos))
+    erros = []
+
+    def rodar(argumento):
+        try:
+            barreira.wait()
+            funcao(argumento)
+        except Exception as e:
+            erros.append(e)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=rodar, args=(a,)) for a in argumentos]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if erros:
+        raise erros[0]
+
+
+def processar_fila():
+    while processar_lote():
+        pass
+
+
+class ReservaTests(TransactionTestCase):
+    """A reserva acompanha as transições de status do pedido."""
+
+    def setUp(self):
+        self.produto = criar_produto(estoque=10)
+        self.pedido = criar_pedido(criar_cliente())
+        Contem.objects.create(pedido=self.pedido, produto=self.produto, quantidade=4)
+
+    def disponivel(self):
+        return disponibilidade([self.produto.pk])[self.produto.pk][0]
+
+    def test_pendente_para_entregue_libera(self):
+        self.assertEqual(self.disponivel(), 6)
+
+        self.pedido.status = Pedido.ENTREGUE
+        self.pedido.save()
+
+        self.assertFalse(Reserva.objects.exists())
+        self.assertEqual(self.disponivel(), 10)
+
+    def test_processado_para_entregue_espera_a_baixa(self):
+        self.pedido.status = Pedido.PROCESSADO
+        self.pedido.save()
+        self.pedido.status = Pedido.ENTREGUE
+        self.pedido.save()
+
+        # A baixa ainda está na fila: a reserva segura o estoque até ela.
+        self.assertEqual(self.disponivel(), 6)
+        processar_fila()
+        self.assertFalse(Reserva.objects.exists())
+        self.assertEqual(self.disponivel(), 6)
+        self.assertEqual(estoque_atual(self.produto), 6)
+
+
+class BaixaConcorrenteTests(TransactionTestCase):
+    """Pedidos processados ao mesmo tempo baixam o estoque exato."""
+
+    ESTOQUE = 1_000
+    PEDIDOS = 40
+    THREADS = 8
+
+    def test_pedidos_simultaneos_no_mesmo_produto(self):
+        cliente = criar_cliente()
+        produto = criar_produto(self.ESTOQUE)
+        pedidos = []
+        for i in range(self.PEDIDOS):
+            pedido = criar_pedido(cliente)
+            Contem.objects.create(pedido=pedido, produto=produto, quantidade=1 + i % 5)
+            pedidos.append(pedido)
+        total = sum(1 + i % 5 for i in range(self.PEDIDOS))
+
+        def processar(lote):
+            # Cada thread processa seus pedidos e também faz de worker.
+            for pedido in lote:
+                pedido.status = Pedido.PROCESSADO
+                pedido.save()
+                processar_lote()
+
+        em_paralelo(
+            processar, [pedidos[i :: self.THREADS] for i in range(self.THREADS)]
+        )
+        processar_fila()
+
+        self.assertEqual(estoque_atual(produto), self.ESTOQUE - total)
+        livro = MovimentacaoProduto.objects.filter(produto=produto)
+        self.assertEqual(
+            sorted(livro.values_list("referencia", flat=True)),
+            sorted(pedido.pk for pedido in pedidos),
+        )
+        self.assertEqual(sum(livro.values_list("quantidade", flat=True)), -total)
+        self.assertEqual(
+            TransicaoEstoque.objects.filter(tipo=TransicaoEstoque.BAIXA_PEDIDO).count(),
+            self.PEDIDOS,
+        )
+        self.assertFalse(Reserva.objects.exists())
+
+        compactar_movimentacoes()
+        produto.refresh_from_db()
+        self.assertEqual(produto.estoque_disponivel, self.ESTOQUE - total)
+        self.assertFalse(livro.filter(compactada=False).exists())
+
+
+def criar_ordem(produtos, materiaprima):
+    """Ordem pendente com 2 de cada um dos ``produtos``, feitos de 3 unidades."""
+    ordem = OrdemProducao.objects.create(
+        status=OrdemProducao.PENDENTE, data_criacao=date.today()
+    )
+    for produto in produtos:
+        Constituido.objects.get_or_create(
+            produto=produto, materiaprima=materiaprima, defaults={"quantidade": 3}
+        )
+        ContemOrdemProducao.objects.create(ordem=ordem, produto=produto, quantidade=2)
+    return ordem
+
+
+class TransicaoEstoqueTests(TransactionTestCase):
+    """Cada transição de status movimenta o estoque uma vez só."""
+
+    def setUp(self):
+        self.produtos = [criar_produto(0), criar_produto(0)]
+        self.materiaprima = MateriaPrima.objects.create(
+            nome="Matéria-prima", custo_unidade=Decimal("1.00"), estoque_disponivel=100
+        )
+
+    def assertMovimentouUmaVez(self, ordem):
+        for produto in self.produtos:
+            self.assertEqual(
+                list(
+                    MovimentacaoProduto.objects.filter(
+                        produto=produto, referencia=ordem.pk
+                    ).values_list("quantidade", flat=True)
+                ),
+                [2],
+            )
+        self.assertEqual(
+            list(
+                MovimentacaoMateriaPrima.objects.filter(
+                    materiaprima=self.materiaprima, referencia=ordem.pk
+                ).values_list("quantidade", flat=True)
+            ),
+            [-12],
+        )
+
+    def test_ordem_concluida_salva_varias_vezes(self):
+        ordem = criar_ordem(self.produtos, self.materiaprima)
+        ordem.save()
+        processar_fila()
+        ordem.status = OrdemProducao.CONCLUIDO
+        ordem.data_conclusao = date.today()
+        for _ in range(3):
+            ordem.save()
+            processar_fila()
+        self.assertMovimentouUmaVez(ordem)
+        for produto in self.produtos:
+            self.assertEqual(estoque_atual(produto), 2)
+
+    def test_pedido_processado_salvo_varias_vezes(self):
+        produto = self.produtos[0]
+        Produto.objects.filter(pk=produto.pk).update(estoque_disponivel=10)
+        pedido = criar_pedido(criar_cliente())
+        Contem.objects.create(pedido=pedido, produto=produto, quantidade=4)
+        pedido.status = Pedido.PROCESSADO
+        for _ in range(3):
+            pedido.save()
+            processar_fila()
+        self.assertEqual(
+            MovimentacaoProduto.objects.filter(referencia=pedido.pk).count(), 1
+        )
+        self.assertEqual(estoque_atual(produto), 6)
+
+    def test_saves_concorrentes_da_mesma_transicao(self):
+        ordem = criar_ordem(self.produtos, self.materiaprima)
+
+        def concluir(_):
+            copia = OrdemProducao.objects.get(pk=ordem.pk)
+            copia.status = OrdemProducao.CONCLUIDO
+            copia.data_conclusao = date.today()
+            copia.save()
+            processar_lote()
+
+        em_paralelo(concluir, range(2))
+        processar_fila()
+        self.assertMovimentouUmaVez(ordem)
+
+    def test_on_conflict_com_a_primeira_ainda_aberta(self):
+        """A segunda espera a primeira no índice único e não movimenta nada."""
+        ordem = criar_ordem(self.produtos, self.materiaprima)
+        aplicada = threading.Event()
+        resultados = {}
+
+        def aplicar(quem):
+            if quem == "segunda":
+                aplicada.wait()
+            with transaction.atomic():
+                resultados[quem] = aplicar_transicoes_estoque(
+                    TransicaoEstoque.ENTRADA_ORDEM, [ordem.pk]
+                )
+                if quem == "primeira":
+                    aplicada.set()
+                    # Mantém a transação aberta com a segunda já esperando.
+                    time.sleep(0.3)
+
+        em_paralelo(aplicar, ["primeira", "segunda"])
+        self.assertEqual(resultados, {"primeira": [ordem.pk], "segunda": []})
+        self.assertEqual(
+            MovimentacaoProduto.objects.filter(referencia=ordem.pk).count(), 2
+        )
@@ -0,0 +1,58 @@
+from django.test import Client, TransactionTestCase, override_settings
+
+from fabrica.management.dados import popular
+from fabrica.management.orcamentos import (
+    ESCALA,
+    FATOR,
+    ORCAMENTOS,
+    ids_de_amostra,
+    medir_orcamento,
+    rotas_sem_orcamento,
+)
+from fabrica.management.utils import limpar_caches
+
+# Um quinto da escala pequena do comando verificar_orcamentos.
+ESCALA_TESTES = {nome: n // 5 for nome, n in ESCALA.items()}
+
+
+@override_settings(DEBUG=True)
+class OrcamentosTests(TransactionTestCase):
+    """Cada rota fica no seu orçamento de consultas, em duas escalas.
+
+    É TransactionTestCase porque as views async consultam por outra conexão
+    (fabrica/assincrono.py), que só enxerga dados já commitados. O DEBUG é o
+    do perfil de desenvolvimento, em que as páginas de instrumentação abrem
+    sem login, como no comando verificar_orcamentos.
+
+    Os limites em ms dependem da máquina e ficam só no comando; aqui valem o
+    status e o número de consultas.
+    """
+
+    def test_toda_rota_tem_orcamento(self):
+        self.assertEqual(rotas_sem_orcamento(), set())
+
+    def test_orcamentos_nas_duas_escalas(self):
+        popular(**ESCALA_TESTES)
+        pequena = self.medir_todas("pequena")
+        popular(**{nome: n * FATOR for nome, n in ESCALA_TESTES.items()})
+        grande = self.medir_todas("grande")
+
+        for orcamento, antes, depois in zip(ORCAMENTOS, pequena, grande):
+            with self.subTest(orcamento=orcamento[1:4]):
+                self.assertEqual(
+                    depois.consultas,
+                    antes.consultas,
+                    "O número de consultas cresceu com os dados.",
+                )
+
+    def medir_todas(self, escala):
+        ids = ids_de_amostra()
+        limpar_caches()
+        client = Client()
+        medidas = []
+        for orcamento in ORCAMENTOS:
+            medida = medir_orcamento(client, orcamento, ids, repeticoes=0)
+            with self.subTest(escala=escala, orcamento=orcamento[1:4]):
+                self.assertEqual(medida.erros(orcamento, tempo=False), [])
+            medidas.append(medida)
+        return medidas
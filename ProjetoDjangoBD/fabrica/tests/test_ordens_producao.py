@@ -0,0 +1,48 @@
+from django.test import TestCase
+
+from fabrica.management.dados import popular
+from fabrica.models import OrdemProducao
+
+ORDENS = 60
+
+
+def popular_ordens(ordens):
+    popular(
+        clientes=100,
+        pedidos=100,
+        produtos=60,
+        materias_primas=10,
+        fornecedores=10,
+        funcionarios=20,
+        ordens=ordens,
+    )
+
+
+class OrdemProducaoViewTests(TestCase):
+    """O número de consultas da lista de ordens não cresce com os dados."""
+
+    # A página, os produtos e os funcionários das ordens dela.
+    CONSULTAS = 3
+
+    def requisitar(self, query=""):
+        with self.assertNumQueries(self.CONSULTAS):
+            resposta = self.client.get(f"/ordens_producao/?{query}")
+        self.assertEqual(resposta.status_code, 200)
+        return resposta
+
+    def test_consultas_constantes(self):
+        popular_ordens(ORDENS)
+        pequena = self.requisitar()
+        self.assertEqual(len(pequena.context["dados_ordens"]), 50)
+
+        popular_ordens(9 * ORDENS)
+        self.assertEqual(OrdemProducao.objects.count(), 10 * ORDENS)
+        grande = self.requisitar()
+        self.assertEqual(len(grande.context["dados_ordens"]), 50)
+        self.assertTrue(
+            all(dados["produtos"] for dados in grande.context["dados_ordens"])
+        )
+
+        # A segunda página e os filtros também não consultam por ordem.
+        self.requisitar(grande.context["pagina"].next_query)
+        self.requisitar("status=pendente")
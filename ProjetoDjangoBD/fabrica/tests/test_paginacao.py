@@ -0,0 +1,79 @@
+import base64
+import json
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, TestCase
+
+from fabrica.paginacao import Chave, KeysetPaginator
+
+
+def cursor(valores, backwards=False):
+    payload = json.dumps({"v": valores, "p": backwards}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+class DecodeTests(SimpleTestCase):
+    paginator = KeysetPaginator(
+        [
+            Chave("status", "status", descendente=True, tipo=str),
+            Chave("data_criacao", "data_criacao", tipo=date),
+            Chave("COALESCE(avaliacao, 10)", "avaliacao", tipo=Decimal),
+            Chave("id_ordem", "id_ordem"),
+        ]
+    )
+
+    def test_ida_e_volta(self):
+        linha = SimpleNamespace(
+            status="Pendente",
+            data_criacao=date(2024, 10, 1),
+            avaliacao=Decimal("4.50"),
+            id_ordem=7,
+        )
+        self.assertEqual(
+            self.paginator.decode(self.paginator.encode(linha, backwards=True)),
+            (["Pendente", date(2024, 10, 1), Decimal("4.50"), 7], True),
+        )
+
+    def test_valores_com_tipo_errado_sao_cursor_invalido(self):
+        validos = ["Pendente", {"d": "2024-10-01"}, {"n": "4.5"}, 7]
+        trocas = [
+            (0, 1),
+            (0, "a\x00b"),
+            (1, "2024-10-01"),
+            (1, {"t": "2024-10-01T10:00:00"}),
+            (1, {"d": "ontem"}),
+            (1, {"d": 20241001}),
+            (2, 4.5),
+            (2, {"n": "abc"}),
+            (2, {"n": "NaN"}),
+            (2, {"n": "1e200000"}),
+            (3, "7"),
+            (3, True),
+            (3, None),
+            (3, 2**70),
+        ]
+        for posicao, valor in trocas:
+            valores = list(validos)
+            valores[posicao] = valor
+            with self.subTest(valor=valor):
+                self.assertIsNone(self.paginator.decode(cursor(valores)))
+
+    def test_estrutura_invalida(self):
+        for token in ["%%%", cursor([1, 2]), "WzFd", "Ig"]:
+            with self.subTest(token=token):
+                self.assertIsNone(self.paginator.decode(token))
+
+
+class CursorAdulteradoTests(TestCase):
+    def test_listas_voltam_para_a_primeira_pagina(self):
+        for caminho, valores in [
+            ("/pedidos/", ["2024-10-01", 1]),
+            ("/fornecedores/", [{"d": "2024-10-01"}, 1]),
+            ("/ordens_producao/", [1, "x", 1]),
+            ("/api/pedidos/", ["1"]),
+        ]:
+            with self.subTest(caminho=caminho):
+                resposta = self.client.get(caminho, {"cursor": cursor(valores)})
+                self.assertEqual(resposta.status_code, 200)
@@ -0,0 +1,89 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from fabrica.models import (
+    Contem,
+    Fornece,
+    Fornecedor,
+    MateriaPrima,
+    MovimentacaoProduto,
+    Pedido,
+    Produto,
+    compactar_movimentacoes,
+)
+from fabrica.tests.test_estoque import criar_cliente, criar_pedido, criar_produto
+
+
+class SaveComInstanciaAntigaTests(TestCase):
+    """save() não grava de volta a versão, os totais e o estoque que a instância leu."""
+
+    def test_pedido(self):
+        pedido = criar_pedido(criar_cliente())
+        antigo = Pedido.objects.get(pk=pedido.pk)
+        Contem.objects.create(pedido=pedido, produto=criar_produto(10), quantidade=3)
+        atual = Pedido.objects.get(pk=pedido.pk)
+        self.assertEqual(atual.valor_total, Decimal("30.00"))
+
+        antigo.forma_pagamento = "Dinheiro"
+        antigo.save()
+
+        gravado = Pedido.objects.get(pk=pedido.pk)
+        self.assertEqual(gravado.forma_pagamento, "Dinheiro")
+        self.assertEqual(gravado.valor_total, Decimal("30.00"))
+        self.assertEqual(gravado.versao, atual.versao + 1)
+        self.assertEqual(
+            (antigo.versao, antigo.valor_total), (gravado.versao, gravado.valor_total)
+        )
+
+    def test_preco_alterado_depois_da_leitura(self):
+        pedido = criar_pedido(criar_cliente())
+        produto = criar_produto(10)
+        Contem.objects.create(pedido=pedido, produto=produto, quantidade=2)
+        antigo = Pedido.objects.get(pk=pedido.pk)
+        produto.custo_unitario = Decimal("15.00")
+        produto.save()
+
+        antigo.save()
+        self.assertEqual(Pedido.objects.get(pk=pedido.pk).valor_total, Decimal("30.00"))
+
+    def test_fornecedor(self):
+        fornecedor = Fornecedor.objects.create(
+            nome="Fornecedor", telefone="11999999999", email="f@example.com"
+        )
+        antigo = Fornecedor.objects.get(pk=fornecedor.pk)
+        materiaprima = MateriaPrima.objects.create(
+            nome="Aço", custo_unidade=Decimal("1.00")
+        )
+        Fornece.objects.create(
+            fornecedor=fornecedor, materiaprima=materiaprima, preco=5
+        )
+        atual = Fornecedor.objects.get(pk=fornecedor.pk)
+        self.assertGreater(atual.versao, antigo.versao)
+
+        antigo.nome = "Outro nome"
+        antigo.save()
+
+        gravado = Fornecedor.objects.get(pk=fornecedor.pk)
+        self.assertEqual(gravado.nome, "Outro nome")
+        self.assertEqual(gravado.versao, atual.versao + 1)
+        self.assertEqual(antigo.versao, gravado.versao)
+
+    def test_produto_apos_compactar(self):
+        produto = criar_produto(10)
+        antigo = Produto.objects.get(pk=produto.pk)
+        MovimentacaoProduto.objects.create(
+            produto=produto, quantidade=-4, origem=MovimentacaoProduto.PEDIDO
+        )
+        compactar_movimentacoes()
+
+        antigo.nome = "Outro nome"
+        antigo.save()
+
+        gravado = Produto.objects.get(pk=produto.pk)
+        self.assertEqual(gravado.nome, "Outro nome")
+        self.assertEqual(gravado.estoque_disponivel, 6)
+
+    def test_insercao_comeca_na_versao_1(self):
+        pedido = criar_pedido(criar_cliente())
+        self.assertEqual(Pedido.objects.get(pk=pedido.pk).versao, 1)
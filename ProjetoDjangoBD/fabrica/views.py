@@ -1,15 +1,42 @@
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
 from django.db import connection
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
+from django.utils.decorators import method_decorator
 from django.views import View
-
+from django.views.decorators.csrf import csrf_exempt
+
+from . import api
+from .assincrono import consultar
+from .cache import CATALOGO
+from .exportacao import exportar
+from .filtros import (
+    FUNCIONARIOS_DA_ORDEM,
+    PRODUTOS_DA_ORDEM,
+    filtros_clientes,
+    filtros_estoque,
+    filtros_fornecedores,
+    filtros_itens_ordem,
+    filtros_ordens,
+    filtros_pedidos,
+)
 from .forms import (
     ClienteSearchForm,
+    CompraMateriaPrimaForm,
     FornecedorSearchForm,
     MateriaPrimaSearchForm,
     OrdemSearchForm,
     PedidoSearchForm,
     ProdutoSearchForm,
 )
+from .fragmentos import linhas_em_cache, renderizar_linhas
+from .instrumentacao import ESTATISTICAS, estatisticas_conexoes
 from .models import (
     Cliente,
     Contem,
@@ -21,55 +48,71 @@ from .models import (
     OrdemProducao,
     Pedido,
     Produto,
+    estoque_atual_sql,
+    invalidar_fornecedor,
 )
+from .paginacao import Chave, KeysetPaginator
+
+
+def produtos_do_catalogo(ids):
+    """Nome, descrição e preço dos produtos, pelo cache de catálogo.
+
+    O estoque fica de fora: muda a cada pedido e é lido sempre do banco.
+    """
+
+    def carregar(faltando):
+        return {
+            produto["id_produto"]: produto
+            for produto in Produto.objects.filter(id_produto__in=faltando).values(
+                "id_produto", "nome", "descricao", "custo_unitario"
+            )
+        }
+
+    return CATALOGO.obter_muitos("produto", ids, carregar)
+
+
+def fornecedores_da_materiaprima(pk):
+    """Fornecedores de uma matéria-prima com o preço, do mais barato."""
+    # Fornecedor com o preço da oferta: o template percorre a lista duas
+    # vezes e não precisa buscar cada fornecedor pela chave estrangeira.
+    fornecedores_query = """
+        SELECT Fornecedor.*, Fornece.preco
+        FROM Fornece
+            JOIN Fornecedor ON Fornece.fornecedor_id = Fornecedor.id_fornecedor
+        WHERE Fornece.materiaprima_id = %s
+        ORDER BY Fornece.preco, Fornecedor.avaliacao DESC
+    """
+    return CATALOGO.obter(
+        "fornecedores",
+        pk,
+        lambda: list(Fornecedor.objects.raw(fornecedores_query, [pk])),
+    )
 
 
 class ClientesListView(View):
     """Mostra todos os clientes que se enquadram nos filtros selecionados na
     pagina de clientes"""
 
+    paginator = KeysetPaginator([Chave("id_cliente", "id_cliente")])
+
     def get(self, request):
         form = ClienteSearchForm(request.GET)
         base_query = """
             SELECT *
             FROM Cliente
         """
-        where_clauses = []
-        params = []
-
+        where_clauses, params = [], []
         if form.is_valid():
-            if form.cleaned_data.get("id_cliente"):
-                where_clauses.append("id_cliente = %s")
-                params.append(form.cleaned_data.get("id_cliente"))
-            if form.cleaned_data.get("nome"):
-                where_clauses.append("nome LIKE %s")
-                params.append(f"%{form.cleaned_data.get('nome')}%")
-            if form.cleaned_data.get("telefone"):
-                where_clauses.append("telefone LIKE %s")
-                params.append(f"%{form.cleaned_data.get('telefone')}%")
-            if form.cleaned_data.get("email"):
-                where_clauses.append("email LIKE %s")
-                params.append(f"%{form.cleaned_data.get('email')}%")
-            if form.cleaned_data.get("numero"):
-                where_clauses.append("numero = %s")
-                params.append(form.cleaned_data.get("numero"))
-            if form.cleaned_data.get("cep"):
-                where_clauses.append("cep LIKE %s")
-                params.append(f"%{form.cleaned_data.get('cep')}%")
-            if form.cleaned_data.get("complemento"):
-                where_clauses.append("complemento LIKE %s")
-                params.append(f"%{form.cleaned_data.get('complemento')}%")
-            if form.cleaned_data.get("logradouro"):
-                where_clauses.append("logradouro LIKE %s")
-                params.append(f"%{form.cleaned_data.get('logradouro')}%")
+            where_clauses, params = filtros_clientes(form.cleaned_data)
 
-        if where_clauses:
-            base_query += " WHERE " + " AND ".join(where_clauses)
-
-        clientes = Cliente.objects.raw(base_query, params)
+        pagina = self.paginator.paginate(
+            request, Cliente, base_query, where_clauses, params
+        )
 
         return render(
-            request, "lista_clientes.html", {"clientes": clientes, "form": form}
+            request,
+            "lista_clientes.html",
+            {"clientes": pagina.object_list, "pagina": pagina, "form": form},
         )
 
 
@@ -94,18 +137,10 @@ class ClienteDetailView(View):
         pedidos_last_30_days_query = """
             SELECT
                 p.*,
-                pr.id_produto,
-                pr.nome AS produto_nome,
-                pr.descricao,
-                pr.estoque_disponivel,
-                pr.limite_estoque_baixo,
-                pr.custo_unitario,
-                c.quantidade,
-                (pr.custo_unitario * c.quantidade) AS subtotal,
-                SUM(pr.custo_unitario * c.quantidade) OVER (PARTITION BY p.id_pedido) AS valor_total
+                c.produto_id,
+                c.quantidade
             FROM
                 Contem c
-                JOIN Produto pr ON c.produto_id = pr.id_produto
                 JOIN Pedido p ON c.pedido_id = p.id_pedido
             WHERE
                 p.cliente_id = %s
@@ -118,8 +153,16 @@ class ClienteDetailView(View):
             Pedido.objects.raw(pedidos_last_30_days_query, [pk])
         )
 
+        # Os dados do produto vêm do cache de catálogo.
+        produtos = produtos_do_catalogo(
+            pedido.produto_id for pedido in pedidos_last_30_days
+        )
         pedidos_dict = {}
         for pedido in pedidos_last_30_days:
+            produto = produtos[pedido.produto_id]
+            pedido.produto_nome = produto["nome"]
+            pedido.custo_unitario = produto["custo_unitario"]
+            pedido.subtotal = produto["custo_unitario"] * pedido.quantidade
             if pedido.id_pedido not in pedidos_dict:
                 pedidos_dict[pedido.id_pedido] = {"pedido": pedido, "produtos": []}
             pedidos_dict[pedido.id_pedido]["produtos"].append(pedido)
@@ -134,8 +177,37 @@ class ClienteDetailView(View):
         )
 
 
+def estoque_baixo_sql(model):
+    """Itens de ``model`` abaixo do limite, dos mais em falta primeiro."""
+    return f"""
+        SELECT *
+        FROM {estoque_atual_sql(model, somente_baixo=True)}
+        ORDER BY deficit DESC, {model._meta.pk.column}
+    """
+
+
+def estoque_baixo(model):
+    return model.objects.raw(estoque_baixo_sql(model))
+
+
 class EstoqueListView(View):
     def get(self, request):
+        formularios, consultas = self.consultas(request)
+        return self.renderizar(
+            request,
+            formularios,
+            {
+                nome: model.objects.raw(sql, params)
+                for nome, (model, sql, params) in consultas.items()
+            },
+        )
+
+    def consultas(self, request):
+        """Formulários e ``{nome: (model, sql, params)}`` das quatro listas.
+
+        As consultas não dependem umas das outras; a versão async da view
+        as executa ao mesmo tempo.
+        """
         produto_form = ProdutoSearchForm(
             request.GET if "id_produto" in request.GET else None
         )
@@ -143,507 +215,588 @@ class EstoqueListView(View):
             request.GET if "id_materiaprima" in request.GET else None
         )
 
-        produtos_query = """
-            SELECT *, (limite_estoque_baixo - estoque_disponivel) AS diff
-            FROM Produto
+        produtos_query = f"""
+            SELECT *
+            FROM {estoque_atual_sql(Produto)}
         """
-        materias_primas_query = """
-            SELECT *, (limite_estoque_baixo - estoque_disponivel) AS diff
-            FROM MateriaPrima
+        materias_primas_query = f"""
+            SELECT *
+            FROM {estoque_atual_sql(MateriaPrima)}
         """
 
-        produto_params = []
-        produto_conditions = []
-
+        produto_conditions, produto_params = [], []
         if produto_form.is_valid():
-            if produto_form.cleaned_data.get("id_produto"):
-                produto_conditions.append("id_produto = %s")
-                produto_params.append(produto_form.cleaned_data["id_produto"])
-            if produto_form.cleaned_data.get("nome"):
-                produto_conditions.append("nome LIKE %s")
-                produto_params.append(f"%{produto_form.cleaned_data['nome']}%")
-            if produto_form.cleaned_data.get("estoque_disponivel_min") is not None:
-                produto_conditions.append("estoque_disponivel >= %s")
-                produto_params.append(
-                    produto_form.cleaned_data["estoque_disponivel_min"]
-                )
-            if produto_form.cleaned_data.get("estoque_disponivel_max") is not None:
-                produto_conditions.append("estoque_disponivel <= %s")
-                produto_params.append(
-                    produto_form.cleaned_data["estoque_disponivel_max"]
-                )
-            if produto_form.cleaned_data.get("custo_unitario_min") is not None:
-                produto_conditions.append("custo_unitario >= %s")
-                produto_params.append(produto_form.cleaned_data["custo_unitario_min"])
-            if produto_form.cleaned_data.get("custo_unitario_max") is not None:
-                produto_conditions.append("custo_unitario <= %s")
-                produto_params.append(produto_form.cleaned_data["custo_unitario_max"])
-
+            produto_conditions, produto_params = filtros_estoque(
+                produto_form.cleaned_data, "id_produto", "custo_unitario"
+            )
         if produto_conditions:
             produtos_query += " WHERE " + " AND ".join(produto_conditions)
 
-        materiaprima_params = []
-        materiaprima_conditions = []
-
+        materiaprima_conditions, materiaprima_params = [], []
         if materia_prima_form.is_valid():
-            if materia_prima_form.cleaned_data.get("id_materiaprima"):
-                materiaprima_conditions.append("id_materiaprima = %s")
-                materiaprima_params.append(
-                    materia_prima_form.cleaned_data["id_materiaprima"]
-                )
-            if materia_prima_form.cleaned_data.get("nome"):
-                materiaprima_conditions.append("nome LIKE %s")
-                materiaprima_params.append(
-                    f"%{materia_prima_form.cleaned_data['nome']}%"
-                )
-            if (
-                materia_prima_form.cleaned_data.get("estoque_disponivel_min")
-                is not None
-            ):
-                materiaprima_conditions.append("estoque_disponivel >= %s")
-                materiaprima_params.append(
-                    materia_prima_form.cleaned_data["estoque_disponivel_min"]
-                )
-            if (
-                materia_prima_form.cleaned_data.get("estoque_disponivel_max")
-                is not None
-            ):
-                materiaprima_conditions.append("estoque_disponivel <= %s")
-                materiaprima_params.append(
-                    materia_prima_form.cleaned_data["estoque_disponivel_max"]
-                )
-            if materia_prima_form.cleaned_data.get("custo_unitario_min") is not None:
-                materiaprima_conditions.append("custo_unidade >= %s")
-                materiaprima_params.append(
-                    materia_prima_form.cleaned_data["custo_unitario_min"]
-                )
-            if materia_prima_form.cleaned_data.get("custo_unitario_max") is not None:
-                materiaprima_conditions.append("custo_unidade <= %s")
-                materiaprima_params.append(
-                    materia_prima_form.cleaned_data["custo_unitario_max"]
-                )
-
+            materiaprima_conditions, materiaprima_params = filtros_estoque(
+                materia_prima_form.cleaned_data, "id_materiaprima", "custo_unidade"
+            )
         if materiaprima_conditions:
             materias_primas_query += " WHERE " + " AND ".join(materiaprima_conditions)
 
-        produtos_query += " ORDER BY diff DESC"
-        materias_primas_query += " ORDER BY diff DESC"
+        produtos_query += " ORDER BY deficit DESC"
+        materias_primas_query += " ORDER BY deficit DESC"
+
+        formularios = {
+            "produto_form": produto_form,
+            "materia_prima_form": materia_prima_form,
+        }
+        consultas = {
+            "produtos": (Produto, produtos_query, produto_params),
+            "materias_primas": (
+                MateriaPrima,
+                materias_primas_query,
+                materiaprima_params,
+            ),
+            "produtos_baixo_estoque": (Produto, estoque_baixo_sql(Produto), []),
+            "materias_primas_baixo_estoque": (
+                MateriaPrima,
+                estoque_baixo_sql(MateriaPrima),
+                [],
+            ),
+        }
+        return formularios, consultas
+
+    def renderizar(self, request, formularios, listas):
+        return render(request, "estoque.html", {**listas, **formularios})
+
+
+class EstoqueListAsyncView(EstoqueListView):
+    """``EstoqueListView`` com as quatro consultas ao mesmo tempo (ASGI)."""
+
+    async def get(self, request):
+        formularios, consultas = self.consultas(request)
+        resultados = await asyncio.gather(
+            *(
+                consultar(model, sql, params)
+                for model, sql, params in consultas.values()
+            )
+        )
+        return self.renderizar(request, formularios, dict(zip(consultas, resultados)))
+
+
+class EstoqueBaixoView(View):
+    """Itens abaixo do limite de estoque, em JSON, para alertas externos."""
 
-        produtos = Produto.objects.raw(produtos_query, produto_params)
-        materias_primas = MateriaPrima.objects.raw(
-            materias_primas_query, materiaprima_params
+    def get(self, request):
+        return JsonResponse(
+            {
+                "produtos": [self.item(p) for p in estoque_baixo(Produto)],
+                "materias_primas": [self.item(m) for m in estoque_baixo(MateriaPrima)],
+            }
         )
 
-        produtos_baixo_estoque_query = """
-            SELECT *
-            FROM Produto
-            WHERE estoque_disponivel < limite_estoque_baixo
-        """
-        materias_primas_baixo_estoque_query = """
-            SELECT *
-            FROM MateriaPrima
-            WHERE estoque_disponivel < limite_estoque_baixo
+    def item(self, item):
+        return {
+            "id": item.pk,
+            "nome": item.nome,
+            "estoque_disponivel": item.estoque_disponivel,
+            "limite_estoque_baixo": item.limite_estoque_baixo,
+            "deficit": item.deficit,
+        }
+
+
+class ExportarClientesView(View):
+    """Clientes com os filtros da lista, em CSV ou NDJSON (``?formato=``)."""
+
+    def get(self, request):
+        form = ClienteSearchForm(request.GET)
+        where_clauses, params = [], []
+        if form.is_valid():
+            where_clauses, params = filtros_clientes(form.cleaned_data)
+
+        query = "SELECT * FROM Cliente"
+        if where_clauses:
+            query += " WHERE " + " AND ".join(where_clauses)
+        query += " ORDER BY id_cliente"
+        return exportar(query, params, request.GET.get("formato"), "clientes")
+
+
+class ExportarPedidosView(View):
+    """Itens dos pedidos filtrados, uma linha por produto de cada pedido.
+
+    Pedidos sem itens saem numa linha com as colunas do produto vazias.
+    """
+
+    def get(self, request):
+        form = PedidoSearchForm(request.GET)
+        query_filters, query_params = [], []
+        if form.is_valid():
+            query_filters, query_params = filtros_pedidos(form.cleaned_data)
+
+        query = """
+            SELECT
+                Pedido.id_pedido,
+                Pedido.data_pedido,
+                Pedido.data_entrega,
+                Pedido.status,
+                Pedido.forma_pagamento,
+                Pedido.data_pagamento,
+                Pedido.cliente_id,
+                Pedido.valor_total,
+                Contem.produto_id,
+                Produto.nome AS produto_nome,
+                Contem.quantidade,
+                Produto.custo_unitario,
+                Produto.custo_unitario * Contem.quantidade AS subtotal
+            FROM Pedido
+                LEFT JOIN Contem ON Contem.pedido_id = Pedido.id_pedido
+                LEFT JOIN Produto ON Contem.produto_id = Produto.id_produto
         """
+        if query_filters:
+            query += " WHERE " + " AND ".join(query_filters)
+        query += " ORDER BY Pedido.id_pedido, Contem.id"
+        return exportar(query, query_params, request.GET.get("formato"), "pedidos")
 
-        produtos_baixo_estoque = Produto.objects.raw(produtos_baixo_estoque_query)
-        materias_primas_baixo_estoque = MateriaPrima.objects.raw(
-            materias_primas_baixo_estoque_query
-        )
 
-        return render(
-            request,
-            "estoque.html",
-            {
-                "produtos": produtos,
-                "materias_primas": materias_primas,
-                "produtos_baixo_estoque": produtos_baixo_estoque,
-                "materias_primas_baixo_estoque": materias_primas_baixo_estoque,
-                "produto_form": produto_form,
-                "materia_prima_form": materia_prima_form,
-            },
+class ExportarEstoqueView(View):
+    """Estoque atual de produtos ou matérias-primas com os filtros da página."""
+
+    model = None
+    form_class = None
+    coluna_custo = None
+    nome = None
+
+    def get(self, request):
+        form = self.form_class(request.GET)
+        pk = self.model._meta.pk.column
+        where_clauses, params = [], []
+        if form.is_valid():
+            where_clauses, params = filtros_estoque(
+                form.cleaned_data, pk, self.coluna_custo
+            )
+
+        query = f"SELECT * FROM {estoque_atual_sql(self.model)}"
+        if where_clauses:
+            query += " WHERE " + " AND ".join(where_clauses)
+        query += f" ORDER BY {pk}"
+        return exportar(query, params, request.GET.get("formato"), self.nome)
+
+
+class ExportarProdutosView(ExportarEstoqueView):
+    model = Produto
+    form_class = ProdutoSearchForm
+    coluna_custo = "custo_unitario"
+    nome = "produtos"
+
+
+class ExportarMateriasPrimasView(ExportarEstoqueView):
+    model = MateriaPrima
+    form_class = MateriaPrimaSearchForm
+    coluna_custo = "custo_unidade"
+    nome = "materias_primas"
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ApiListaView(View):
+    """Lista JSON de um recurso de fabrica/api.py; POST cria em lote.
+
+    csrf_exempt para aceitar chave de API no POST; com sessão, api.criar
+    verifica o token CSRF do mesmo jeito.
+    """
+
+    def get(self, request, recurso):
+        if recurso not in api.RECURSOS:
+            raise Http404
+        return api.listar(request, api.RECURSOS[recurso])
+
+    def post(self, request, recurso):
+        if recurso not in api.RECURSOS:
+            raise Http404
+        if api.RECURSOS[recurso].criar is None:
+            return HttpResponseNotAllowed(["GET"])
+        return api.criar(request, api.RECURSOS[recurso])
+
+
+class ApiDetalheView(View):
+    """Um item JSON de um recurso de fabrica/api.py."""
+
+    def get(self, request, recurso, pk):
+        if recurso not in api.RECURSOS:
+            raise Http404
+        return api.detalhar(request, api.RECURSOS[recurso], pk)
+
+
+class EstatisticasSqlView(View):
+    """Consultas das últimas requisições deste processo e uso do pool.
+
+    Mostra SQL, então fora do modo DEBUG só para usuários da equipe.
+    """
+
+    def get(self, request):
+        if not (settings.DEBUG or request.user.is_staff):
+            raise PermissionDenied
+        return JsonResponse(
+            {**ESTATISTICAS.resumo(), "conexoes": estatisticas_conexoes()}
         )
 
 
+class EstatisticasCacheView(View):
+    """Acertos, faltas e despejos do cache de catálogo deste processo."""
+
+    def get(self, request):
+        if not (settings.DEBUG or request.user.is_staff):
+            raise PermissionDenied
+        return JsonResponse(CATALOGO.estatisticas())
+
+
 class HomeView(View):
     def get(self, request):
         return render(request, "home.html")
 
 
 class PedidosListView(View):
+    paginator = KeysetPaginator(
+        [
+            Chave("Pedido.data_pedido", "data_pedido", descendente=True, tipo=date),
+            Chave("Pedido.id_pedido", "id_pedido", descendente=True),
+        ]
+    )
+
     def get(self, request):
         form = PedidoSearchForm(request.GET)
 
-        query_filters = []
-        query_params = []
-        having_filters = []
-
         base_query = """
-            SELECT
-                Pedido.*,
-                SUM(Produto.custo_unitario * Contem.quantidade) AS valor_total
+            SELECT Pedido.*
             FROM Pedido
-                JOIN Contem ON Pedido.id_pedido = Contem.pedido_id
-                JOIN Produto ON Contem.produto_id = Produto.id_produto
         """
-
+        query_filters, query_params = [], []
         if form.is_valid():
-            if form.cleaned_data.get("id_pedido"):
-                query_filters.append("Pedido.id_pedido = %s")
-                query_params.append(form.cleaned_data["id_pedido"])
-            if form.cleaned_data.get("status"):
-                query_filters.append("Pedido.status LIKE %s")
-                query_params.append(f"%{form.cleaned_data['status']}%")
-            if form.cleaned_data.get("cliente_id"):
-                query_filters.append("Pedido.cliente_id = %s")
-                query_params.append(form.cleaned_data["cliente_id"])
-            if form.cleaned_data.get("forma_pagamento"):
-                query_filters.append("Pedido.forma_pagamento LIKE %s")
-                query_params.append(f"%{form.cleaned_data['forma_pagamento']}%")
-
-            pedido_start_date = form.cleaned_data.get("pedido_start_date")
-            pedido_end_date = form.cleaned_data.get("pedido_end_date")
-            entrega_start_date = form.cleaned_data.get("entrega_start_date")
-            entrega_end_date = form.cleaned_data.get("entrega_end_date")
-            pagamento_start_date = form.cleaned_data.get("pagamento_start_date")
-            pagamento_end_date = form.cleaned_data.get("pagamento_end_date")
-
-            if pedido_start_date and pedido_end_date:
-                query_filters.append("Pedido.data_pedido BETWEEN %s AND %s")
-                query_params.extend([pedido_start_date, pedido_end_date])
-            elif pedido_start_date:
-                query_filters.append("Pedido.data_pedido >= %s")
-                query_params.append(pedido_start_date)
-            elif pedido_end_date:
-                query_filters.append("Pedido.data_pedido <= %s")
-                query_params.append(pedido_end_date)
-
-            if entrega_start_date and entrega_end_date:
-                query_filters.append(
-                    "(Pedido.data_entrega BETWEEN %s AND %s OR Pedido.data_entrega IS NULL)"
-                )
-                query_params.extend([entrega_start_date, entrega_end_date])
-            elif entrega_start_date:
-                query_filters.append(
-                    "(Pedido.data_entrega >= %s OR Pedido.data_entrega IS NULL)"
-                )
-                query_params.append(entrega_start_date)
-            elif entrega_end_date:
-                query_filters.append(
-                    "(Pedido.data_entrega <= %s OR Pedido.data_entrega IS NULL)"
-                )
-                query_params.append(entrega_end_date)
-
-            if pagamento_start_date and pagamento_end_date:
-                query_filters.append("Pedido.data_pagamento BETWEEN %s AND %s")
-                query_params.extend([pagamento_start_date, pagamento_end_date])
-            elif pagamento_start_date:
-                query_filters.append("Pedido.data_pagamento >= %s")
-                query_params.append(pagamento_start_date)
-            elif pagamento_end_date:
-                query_filters.append("Pedido.data_pagamento <= %s")
-                query_params.append(pagamento_end_date)
-
-            valor_total_min = form.cleaned_data.get("valor_total_min")
-            valor_total_max = form.cleaned_data.get("valor_total_max")
-            if valor_total_min is not None:
-                having_filters.append(
-                    "SUM(Produto.custo_unitario * Contem.quantidade) >= %s"
-                )
-                query_params.append(valor_total_min)
-            if valor_total_max is not None:
-                having_filters.append(
-                    "SUM(Produto.custo_unitario * Contem.quantidade) <= %s"
-                )
-                query_params.append(valor_total_max)
+            query_filters, query_params = filtros_pedidos(form.cleaned_data)
 
-        filtered_query = f"{base_query}"
-        if query_filters:
-            filtered_query += f" WHERE {' AND '.join(query_filters)}"
-        filtered_query += " GROUP BY Pedido.id_pedido"
-        if having_filters:
-            filtered_query += f" HAVING {' AND '.join(having_filters)}"
-        filtered_query += " ORDER BY Pedido.data_pedido DESC"
+        pagina = self.paginator.paginate(
+            request, Pedido, base_query, query_filters, query_params
+        )
+        pedidos = pagina.object_list
+        renderizar_linhas(
+            request, "pedido_linha.html", "pedido", pedidos, self.carregar_itens
+        )
 
-        pedidos = Pedido.objects.raw(filtered_query, query_params)
+        return render(
+            request,
+            "pedidos.html",
+            {"pedidos": pedidos, "pagina": pagina, "form": form},
+        )
 
+    @staticmethod
+    def carregar_itens(pedidos):
+        # Itens apenas dos pedidos sem linha em cache, numa única consulta,
+        # agrupados por pedido para o template não varrer todos os itens a
+        # cada linha.
+        itens_por_pedido = {pedido.id_pedido: [] for pedido in pedidos}
         produtos_query = """
             SELECT
-                Contem.*,
-                Produto.*,
+                Contem.id,
+                Contem.pedido_id,
+                Contem.quantidade,
+                Produto.nome,
+                Produto.custo_unitario,
                 Produto.custo_unitario * Contem.quantidade AS subtotal
             FROM Contem
                 JOIN Produto ON Contem.produto_id = Produto.id_produto
-                JOIN Pedido ON Contem.pedido_id = Pedido.id_pedido
+            WHERE Contem.pedido_id = ANY(%s)
+            ORDER BY Contem.pedido_id, Contem.id
         """
-        produtos = Contem.objects.raw(produtos_query)
+        for item in Contem.objects.raw(produtos_query, [list(itens_por_pedido)]):
+            itens_por_pedido[item.pedido_id].append(item)
 
-        return render(
-            request,
-            "pedidos.html",
-            {"pedidos": pedidos, "produtos": produtos, "form": form},
-        )
+        for pedido in pedidos:
+            pedido.produtos = itens_por_pedido[pedido.id_pedido]
 
 
 class FornecedoresListView(View):
+    # avaliacao pode ser nula; o PostgreSQL coloca NULL primeiro em ORDER BY
+    # DESC e o COALESCE (acima do máximo de DECIMAL(3, 2)) mantém essa ordem
+    # com uma chave sem nulos, que o cursor consegue comparar.
+    paginator = KeysetPaginator(
+        [
+            Chave(
+                "COALESCE(avaliacao, 10)",
+                "avaliacao_ordem",
+                descendente=True,
+                tipo=Decimal,
+            ),
+            Chave("id_fornecedor", "id_fornecedor", descendente=True),
+        ]
+    )
+
+    # Ofertas de uma lista de fornecedores, agrupadas por agrupar_fornecimentos.
+    fornecimentos_query = """
+        SELECT
+            Fornece.id,
+            Fornece.fornecedor_id,
+            Fornece.preco,
+            MateriaPrima.nome AS materiaprima_nome
+        FROM Fornece
+            JOIN MateriaPrima ON Fornece.materiaprima_id = MateriaPrima.id_materiaprima
+        WHERE Fornece.fornecedor_id = ANY(%s)
+        ORDER BY Fornece.id
+    """
+
     def get(self, request):
-        form = FornecedorSearchForm(request.GET)
+        form, query, query_params, cursor = self.consulta(request)
+        pagina = self.paginator.pagina(
+            request, list(Fornecedor.objects.raw(query, query_params)), cursor
+        )
+        return self.renderizar(request, form, pagina, self.carregar_fornecimentos)
 
-        query_filters = []
-        query_params = []
+    def consulta(self, request):
+        """Formulário e ``(query, params, cursor)`` da página pedida."""
+        form = FornecedorSearchForm(request.GET)
 
         base_query = """
-            SELECT *
+            SELECT *, COALESCE(avaliacao, 10) AS avaliacao_ordem
             FROM Fornecedor
         """
+        query_filters, query_params = [], []
 
         if form.is_valid():
-            if form.cleaned_data.get("id_fornecedor"):
-                query_filters.append("id_fornecedor = %s")
-                query_params.append(form.cleaned_data["id_fornecedor"])
-            if form.cleaned_data.get("nome"):
-                query_filters.append("nome LIKE %s")
-                query_params.append(f"%{form.cleaned_data['nome']}%")
-            avaliacao_min = form.cleaned_data.get("avaliacao_min")
-            avaliacao_max = form.cleaned_data.get("avaliacao_max")
-            if avaliacao_min is not None:
-                query_filters.append("avaliacao >= %s")
-                query_params.append(avaliacao_min)
-            if avaliacao_max is not None:
-                query_filters.append("avaliacao <= %s")
-                query_params.append(avaliacao_max)
-            if form.cleaned_data.get("materia_prima"):
-                query_filters.append("""
-                    id_fornecedor IN (
-                        SELECT fornecedor_id
-                        FROM Fornece
-                            JOIN MateriaPrima ON Fornece.materiaprima_id = MateriaPrima.id_materiaprima
-                        WHERE MateriaPrima.nome LIKE %s
-                    )
-                """)
-                query_params.append(f"%{form.cleaned_data['materia_prima']}%")
+            query_filters, query_params = filtros_fornecedores(form.cleaned_data)
 
-        if query_filters:
-            filtered_query = f"{base_query} WHERE {' AND '.join(query_filters)} ORDER BY avaliacao DESC"
-        else:
-            filtered_query = f"{base_query} ORDER BY avaliacao DESC"
-
-        fornecedores = Fornecedor.objects.raw(filtered_query, query_params)
+        return (
+            form,
+            *self.paginator.consulta(request, base_query, query_filters, query_params),
+        )
 
-        fornecimentos_query = """
-            SELECT Fornece.*, Fornecedor.*, MateriaPrima.*
-            FROM Fornece
-                JOIN Fornecedor ON Fornece.fornecedor_id = Fornecedor.id_fornecedor
-                JOIN MateriaPrima ON Fornece.materiaprima_id = MateriaPrima.id_materiaprima
-        """
-        fornecimentos = Fornece.objects.raw(fornecimentos_query)
+    def renderizar(self, request, form, pagina, carregar, prontas=None):
+        fornecedores = pagina.object_list
+        renderizar_linhas(
+            request,
+            "fornecedor_linha.html",
+            "fornecedor",
+            fornecedores,
+            carregar,
+            prontas,
+        )
 
         return render(
             request,
             "fornecedores.html",
-            {
-                "fornecedores": fornecedores,
-                "fornecimentos": fornecimentos,
-                "form": form,
-            },
+            {"fornecedores": fornecedores, "pagina": pagina, "form": form},
+        )
+
+    @classmethod
+    def carregar_fornecimentos(cls, fornecedores):
+        # Matérias-primas apenas dos fornecedores sem linha em cache.
+        cls.agrupar_fornecimentos(
+            fornecedores,
+            Fornece.objects.raw(
+                cls.fornecimentos_query,
+                [[fornecedor.id_fornecedor for fornecedor in fornecedores]],
+            ),
         )
 
+    @staticmethod
+    def agrupar_fornecimentos(fornecedores, fornecimentos):
+        # Agrupadas por fornecedor, como os itens na lista de pedidos.
+        fornecimentos_por_fornecedor = {
+            fornecedor.id_fornecedor: [] for fornecedor in fornecedores
+        }
+        for fornecimento in fornecimentos:
+            fornecimentos_por_fornecedor[fornecimento.fornecedor_id].append(
+                fornecimento
+            )
+        for fornecedor in fornecedores:
+            fornecedor.fornecimentos = fornecimentos_por_fornecedor[
+                fornecedor.id_fornecedor
+            ]
+
     def post(self, request):
         fornecedor_id = request.POST.get("fornecedor_id")
         avaliacao = request.POST.get("avaliacao")
         if fornecedor_id and avaliacao:
-            Fornecedor.objects.raw(
-                "UPDATE Fornecedor SET avaliacao = %s WHERE id_fornecedor = %s",
-                [float(avaliacao), fornecedor_id],
+            # raw() é preguiçoso e nunca executaria o UPDATE.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """UPDATE Fornecedor
+                       SET avaliacao = %s, versao = versao + 1
+                       WHERE id_fornecedor = %s""",
+                    [float(avaliacao), fornecedor_id],
+                )
+            # O UPDATE direto não dispara os receivers do modelo.
+            invalidar_fornecedor(fornecedor_id)
+        return redirect("fornecedores")
+
+
+class FornecedoresListAsyncView(FornecedoresListView):
+    """``FornecedoresListView`` servida pelo ASGI.
+
+    As ofertas dependem dos ids da página, então as duas consultas não
+    podem rodar juntas; como na view síncrona, as ofertas só são buscadas
+    para as linhas que faltam no cache de fragmentos.
+    """
+
+    async def get(self, request):
+        form, query, query_params, cursor = self.consulta(request)
+        pagina = self.paginator.pagina(
+            request, await consultar(Fornecedor, query, query_params), cursor
+        )
+        prontas, faltando = linhas_em_cache("fornecedor_linha.html", pagina.object_list)
+        fornecimentos = []
+        if faltando:
+            fornecimentos = await consultar(
+                Fornece,
+                self.fornecimentos_query,
+                [[fornecedor.id_fornecedor for fornecedor in faltando]],
             )
-            return redirect("fornecedores")
+        return self.renderizar(
+            request,
+            form,
+            pagina,
+            lambda faltando: self.agrupar_fornecimentos(faltando, fornecimentos),
+            prontas,
+        )
+
+    async def post(self, request):
+        return await sync_to_async(super().post)(request)
 
 
 class ComprarMateriaPrimaView(View):
     def get(self, request, pk):
-        materiaprima = list(
-            MateriaPrima.objects.raw(
-                """
+        return self.renderizar(request, pk)
+
+    def post(self, request, pk):
+        form = CompraMateriaPrimaForm(
+            request.POST, fornecedores=fornecedores_da_materiaprima(pk)
+        )
+        if not form.is_valid():
+            return self.renderizar(request, pk, form)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """INSERT INTO MovimentacaoMateriaPrima
+                       (materiaprima_id, quantidade, origem, referencia,
+                        criada_em, compactada)
+                   VALUES (%s, %s, 'compra', %s, CURRENT_TIMESTAMP, FALSE)""",
+                [pk, form.cleaned_data["quantidade"], form.cleaned_data["fornecedor"]],
+            )
+
+        return redirect("comprar_materiaprima", pk=pk)
+
+    def renderizar(self, request, pk, form=None):
+        """A página da compra; com ``form`` inválido, mostra os erros dele."""
+        materiaprima = next(
+            iter(
+                MateriaPrima.objects.raw(
+                    f"""
                    SELECT *
-                   FROM MateriaPrima
+                   FROM {estoque_atual_sql(MateriaPrima)}
                    WHERE id_materiaprima = %s
                 """,
-                [pk],
-            )
-        )[0]
-
-        fornecimentos_query = """
-            SELECT Fornece.*, Fornecedor.*
-            FROM Fornece
-                JOIN Fornecedor ON Fornece.fornecedor_id = Fornecedor.id_fornecedor
-            WHERE Fornece.materiaprima_id = %s
-            ORDER BY Fornece.preco, Fornecedor.avaliacao DESC
-        """
-        fornecimentos = Fornece.objects.raw(fornecimentos_query, [pk])
+                    [pk],
+                )
+            ),
+            None,
+        )
+        if materiaprima is None:
+            raise Http404
+
+        fornecedores = fornecedores_da_materiaprima(pk)
 
         default_quantity = (
             max(materiaprima.limite_estoque_baixo - materiaprima.estoque_disponivel, 0)
             if materiaprima.estoque_disponivel < materiaprima.limite_estoque_baixo
             else ""
         )
+        if form is not None:
+            default_quantity = form.data.get("quantidade", "")
 
         return render(
             request,
             "comprar_materiaprima.html",
             {
                 "materia": materiaprima,
-                "fornecimentos": fornecimentos,
+                "fornecedores": fornecedores,
                 "default_quantity": default_quantity,
+                "form": form,
             },
         )
 
-    def post(self, request, pk):
-        quantidade = int(request.POST.get("quantidade"))
-
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """UPDATE MateriaPrima
-                   SET estoque_disponivel = estoque_disponivel + %s
-                   WHERE id_materiaprima = %s""",
-                [quantidade, pk],
-            )
-
-        return redirect("comprar_materiaprima", pk=pk)
-
 
 class OrdemProducaoView(View):
+    paginator = KeysetPaginator(
+        [
+            Chave("status", "status", descendente=True, tipo=str),
+            Chave("data_criacao", "data_criacao", tipo=date),
+            Chave("id_ordem", "id_ordem"),
+        ]
+    )
+
     def get(self, request):
         form = OrdemSearchForm(request.GET)
 
-        query_filters = []
-        query_params = []
-
         base_query = """
             SELECT *
             FROM OrdemProducao
         """
+        dados = form.cleaned_data if form.is_valid() else {}
+        query_filters, query_params = filtros_ordens(dados)
+        (produto_filters, produto_params), (funcionario_filters, funcionario_params) = (
+            filtros_itens_ordem(dados)
+        )
 
-        if form.is_valid():
-            if form.cleaned_data.get("id_ordem"):
-                query_filters.append("id_ordem = %s")
-                query_params.append(form.cleaned_data["id_ordem"])
-            if form.cleaned_data.get("status"):
-                query_filters.append("status LIKE %s")
-                query_params.append(f"%{form.cleaned_data['status']}%")
-
-            data_criacao_start_date = form.cleaned_data.get("data_criacao_start_date")
-            data_criacao_end_date = form.cleaned_data.get("data_criacao_end_date")
-            if data_criacao_start_date and data_criacao_end_date:
-                query_filters.append("data_criacao BETWEEN %s AND %s")
-                query_params.extend([data_criacao_start_date, data_criacao_end_date])
-            elif data_criacao_start_date:
-                query_filters.append("data_criacao >= %s")
-                query_params.append(data_criacao_start_date)
-            elif data_criacao_end_date:
-                query_filters.append("data_criacao <= %s")
-                query_params.append(data_criacao_end_date)
-
-            data_conclusao_start_date = form.cleaned_data.get(
-                "data_conclusao_start_date"
-            )
-            data_conclusao_end_date = form.cleaned_data.get("data_conclusao_end_date")
-            if data_conclusao_start_date and data_conclusao_end_date:
-                query_filters.append("data_conclusao BETWEEN %s AND %s")
-                query_params.extend(
-                    [data_conclusao_start_date, data_conclusao_end_date]
-                )
-            elif data_conclusao_start_date:
-                query_filters.append("data_conclusao >= %s")
-                query_params.append(data_conclusao_start_date)
-            elif data_conclusao_end_date:
-                query_filters.append("data_conclusao <= %s")
-                query_params.append(data_conclusao_end_date)
-
-            custo_total_min = form.cleaned_data.get("custo_total_min")
-            custo_total_max = form.cleaned_data.get("custo_total_max")
-            if custo_total_min is not None:
-                query_filters.append("custo_total >= %s")
-                query_params.append(custo_total_min)
-            if custo_total_max is not None:
-                query_filters.append("custo_total <= %s")
-                query_params.append(custo_total_max)
-
-        if query_filters:
-            filtered_query = f"{base_query} WHERE {' AND '.join(query_filters)} ORDER BY status DESC, data_criacao"
-        else:
-            filtered_query = f"{base_query} ORDER BY status DESC, data_criacao"
+        pagina = self.paginator.paginate(
+            request, OrdemProducao, base_query, query_filters, query_params
+        )
+        ordens = pagina.object_list
 
-        ordens = OrdemProducao.objects.raw(filtered_query, query_params)
+        # Produtos e funcionários de todas as ordens da página em duas
+        # consultas, agrupados por ordem em memória.
+        produtos_por_ordem = {ordem.id_ordem: [] for ordem in ordens}
+        funcionarios_por_ordem = {ordem.id_ordem: [] for ordem in ordens}
 
-        funcionario_nome = form.cleaned_data.get("funcionario_nome")
-        funcionario_cargo = form.cleaned_data.get("funcionario_cargo")
-        dados_ordens = []
+        if ordens:
+            ordem_ids = list(produtos_por_ordem)
 
-        for ordem in ordens:
-            produtos_query = """
-                SELECT ContemOrdemProducao.*, Produto.*
-                FROM ContemOrdemProducao
-                    JOIN Produto ON ContemOrdemProducao.produto_id = Produto.id_produto
-                WHERE ContemOrdemProducao.ordem_id = %s
-            """
-            produto_filters = []
-            produto_params = [ordem.id_ordem]
-
-            if form.cleaned_data.get("produto_nome"):
-                produto_filters.append("Produto.nome LIKE %s")
-                produto_params.append(f"%{form.cleaned_data['produto_nome']}%")
-
-            produto_quantidade_min = form.cleaned_data.get("produto_quantidade_min")
-            produto_quantidade_max = form.cleaned_data.get("produto_quantidade_max")
-            if produto_quantidade_min and produto_quantidade_max:
-                produto_filters.append(
-                    "ContemOrdemProducao.quantidade BETWEEN %s AND %s"
-                )
-                produto_params.extend([produto_quantidade_min, produto_quantidade_max])
-            elif produto_quantidade_min:
-                produto_filters.append("ContemOrdemProducao.quantidade >= %s")
-                produto_params.append(produto_quantidade_min)
-            elif produto_quantidade_max:
-                produto_filters.append("ContemOrdemProducao.quantidade <= %s")
-                produto_params.append(produto_quantidade_max)
-
-            if produto_filters:
-                produtos_query += " AND " + " AND ".join(produto_filters)
-
-            produtos = ContemOrdemProducao.objects.raw(produtos_query, produto_params)
-
-            funcionarios_query = """
-                SELECT Funcionario.*
-                FROM Funcionario
-                    JOIN Realiza ON Funcionario.id_funcionario = Realiza.funcionario_id
-                WHERE Realiza.ordem_id = %s
+            produto_where = " AND ".join(
+                ["ContemOrdemProducao.ordem_id = ANY(%s)", *produto_filters]
+            )
+            produtos_query = f"""
+                SELECT ContemOrdemProducao.*, Produto.nome AS produto_nome
+                {PRODUTOS_DA_ORDEM}
+                WHERE {produto_where}
+                ORDER BY ContemOrdemProducao.id
             """
-            funcionario_params = [ordem.id_ordem]
-
-            if funcionario_nome:
-                funcionarios_query += " AND Funcionario.nome LIKE %s"
-                funcionario_params.append(f"%{funcionario_nome}%")
-            if funcionario_cargo:
-                funcionarios_query += " AND Funcionario.cargo LIKE %s"
-                funcionario_params.append(f"%{funcionario_cargo}%")
+            for produto in ContemOrdemProducao.objects.raw(
+                produtos_query, [ordem_ids, *produto_params]
+            ):
+                produtos_por_ordem[produto.ordem_id].append(produto)
 
-            funcionarios = Funcionario.objects.raw(
-                funcionarios_query, funcionario_params
+            funcionario_where = " AND ".join(
+                ["Realiza.ordem_id = ANY(%s)", *funcionario_filters]
             )
+            funcionarios_query = f"""
+                SELECT Funcionario.*, Realiza.ordem_id
+                {FUNCIONARIOS_DA_ORDEM}
+                WHERE {funcionario_where}
+                ORDER BY Realiza.id
+            """
+            for funcionario in Funcionario.objects.raw(
+                funcionarios_query, [ordem_ids, *funcionario_params]
+            ):
+                funcionarios_por_ordem[funcionario.ordem_id].append(funcionario)
 
-            if funcionarios and produtos:
-                dados_ordens.append(
-                    {
-                        "ordem": ordem,
-                        "funcionarios": funcionarios,
-                        "produtos": produtos,
-                    }
-                )
+        dados_ordens = [
+            {
+                "ordem": ordem,
+                "funcionarios": funcionarios_por_ordem[ordem.id_ordem],
+                "produtos": produtos_por_ordem[ordem.id_ordem],
+            }
+            for ordem in ordens
+        ]
 
         return render(
             request,
             "ordens_producao.html",
             {
                 "dados_ordens": dados_ordens,
+                "pagina": pagina,
                 "form": form,
             },
         )
@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'setup.settings')
 
 application = get_asgi_application()
+
+from fabrica.assincrono import com_pool  # noqa: E402
+from fabrica.checks import validar_inicio  # noqa: E402
+
+# Pool do psycopg assíncrono para as views async (fabrica/assincrono.py).
+application = com_pool(application)
+
+validar_inicio()
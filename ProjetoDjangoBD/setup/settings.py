@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -20,13 +22,41 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
+# Perfil escolhido por DJANGO_PERFIL: "desenvolvimento" (padrão) ou
+# "producao". Produção desliga o DEBUG, exige DJANGO_SECRET_KEY e
+# DJANGO_ALLOWED_HOSTS, serve os estáticos com hash e comprimidos pelo
+# WhiteNoise e comprime as respostas; a validação de fabrica/checks.py roda
+# na inicialização do wsgi/asgi.
+PERFIL = os.environ.get("DJANGO_PERFIL", "desenvolvimento")
+if PERFIL not in ("desenvolvimento", "producao"):
+    raise ImproperlyConfigured(
+        f"DJANGO_PERFIL deve ser desenvolvimento ou producao, não {PERFIL!r}."
+    )
+PRODUCAO = PERFIL == "producao"
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-j@!73h-jpo4wv67i4=6j)o2+%l035726fwdz0(x7!k6^63(nef"
+SECRET_KEY = os.environ.get(
+    "DJANGO_SECRET_KEY",
+    "django-insecure-j@!73h-jpo4wv67i4=6j)o2+%l035726fwdz0(x7!k6^63(nef",
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = not PRODUCAO
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host for host in os.environ.get("DJANGO_ALLOWED_HOSTS", "").split(",") if host
+]
+
+if PRODUCAO:
+    if SECRET_KEY.startswith("django-insecure-"):
+        raise ImproperlyConfigured("Em produção defina DJANGO_SECRET_KEY.")
+    if not ALLOWED_HOSTS:
+        raise ImproperlyConfigured(
+            "Em produção defina DJANGO_ALLOWED_HOSTS (separados por vírgula)."
+        )
+    SESSION_COOKIE_SECURE = CSRF_COOKIE_SECURE = (
+        os.environ.get("DJANGO_HTTPS", "1") == "1"
+    )
 
 
 # Application definition
@@ -38,11 +68,13 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "fabrica.apps.FabricaConfig",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "fabrica.instrumentacao.InstrumentacaoSqlMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -51,6 +83,16 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+if PRODUCAO:
+    # WhiteNoise logo depois do SecurityMiddleware responde os estáticos sem
+    # passar pelo resto. GZip antes de quem lê o corpo e ConditionalGet
+    # depois do GZip, para o ETag ser o do conteúdo comprimido.
+    MIDDLEWARE[1:1] = [
+        "whitenoise.middleware.WhiteNoiseMiddleware",
+        "django.middleware.gzip.GZipMiddleware",
+        "django.middleware.http.ConditionalGetMiddleware",
+    ]
+
 ROOT_URLCONF = "setup.urls"
 
 TEMPLATES = [
@@ -69,6 +111,21 @@ TEMPLATES = [
     },
 ]
 
+if PRODUCAO:
+    # Desde o Django 4.1 o loader com cache já é o padrão, mas no
+    # desenvolvimento ele é esvaziado a cada mudança de template; aqui fica
+    # explícito.
+    TEMPLATES[0]["APP_DIRS"] = False
+    TEMPLATES[0]["OPTIONS"]["loaders"] = [
+        (
+            "django.template.loaders.cached.Loader",
+            [
+                "django.template.loaders.filesystem.Loader",
+                "django.template.loaders.app_directories.Loader",
+            ],
+        )
+    ]
+
 WSGI_APPLICATION = "setup.wsgi.application"
 
 
@@ -78,14 +135,63 @@ WSGI_APPLICATION = "setup.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
-        "NAME": "fabrica",
-        "USER": "postgres",
-        "PASSWORD": "psql",
-        "HOST": "localhost",
-        "PORT": "5432",
+        "NAME": os.environ.get("DB_NOME", "fabrica"),
+        "USER": os.environ.get("DB_USUARIO", "postgres"),
+        "PASSWORD": os.environ.get("DB_SENHA", "psql"),
+        "HOST": os.environ.get("DB_HOST", "localhost"),
+        "PORT": os.environ.get("DB_PORTA", "5432"),
     }
 }
 
+# Reaproveitamento das conexões com o PostgreSQL, escolhido por DB_CONEXOES:
+# "pool" (padrão): pool do psycopg_pool por processo; cada requisição pega
+#     uma conexão e a devolve no fim. Conexões ficam no máximo
+#     DB_POOL_VIDA_MAXIMA segundos e as ociosas além de DB_POOL_MIN são
+#     fechadas após DB_POOL_OCIOSIDADE_MAXIMA. Quem espera mais de
+#     DB_POOL_TIMEOUT segundos por uma conexão recebe erro.
+# "persistente": uma conexão por thread, mantida DB_CONN_MAX_AGE segundos.
+# "nenhum": uma conexão nova por requisição.
+# Com DB_VERIFICAR_CONEXOES (padrão 1), a conexão é testada antes de ser
+# usada, e uma que caiu é trocada em vez de falhar a requisição.
+DB_CONEXOES = os.environ.get("DB_CONEXOES", "pool")
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = (
+    os.environ.get("DB_VERIFICAR_CONEXOES", "1") == "1"
+)
+if DB_CONEXOES == "pool":
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.environ.get("DB_POOL_MIN", 2)),
+            "max_size": int(os.environ.get("DB_POOL_MAX", 10)),
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            "max_lifetime": float(os.environ.get("DB_POOL_VIDA_MAXIMA", 1800)),
+            "max_idle": float(os.environ.get("DB_POOL_OCIOSIDADE_MAXIMA", 300)),
+        }
+    }
+elif DB_CONEXOES == "persistente":
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("DB_CONN_MAX_AGE", 60))
+elif DB_CONEXOES != "nenhum":
+    raise ImproperlyConfigured(
+        f"DB_CONEXOES deve ser pool, persistente ou nenhum, não {DB_CONEXOES!r}."
+    )
+
+# Sob o ASGI (setup/asgi.py), as views async usam um pool assíncrono com as
+# mesmas opções e atendem até ASGI_CONCORRENCIA requisições ao mesmo tempo;
+# as demais esperam, como nas threads de um servidor WSGI.
+ASGI_CONCORRENCIA = int(os.environ.get("ASGI_CONCORRENCIA", 10))
+
+# Validade, em horas, da reserva de estoque de um pedido pendente; vencida,
+# ela deixa de contar no disponível (ver fabrica.models.Reserva).
+RESERVA_VALIDADE_HORAS = float(os.environ.get("RESERVA_VALIDADE_HORAS", 24))
+
+# Chaves de API para clientes sem sessão, como a criação em lote de pedidos
+# (POST /api/pedidos/ com "Authorization: Bearer <chave>"): em API_CHAVES,
+# "chave:usuario" separados por vírgula. Valem as permissões do usuário.
+API_CHAVES = dict(
+    item.split(":", 1)
+    for item in os.environ.get("API_CHAVES", "").split(",")
+    if ":" in item
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -122,7 +228,20 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = "static/"
-STATIC_ROOT = os.path.join(BASE_DIR, "static")
+STATIC_ROOT = os.environ.get("DJANGO_STATIC_ROOT", os.path.join(BASE_DIR, "static"))
+
+# Em produção, collectstatic grava cada arquivo com o hash do conteúdo no
+# nome e versões gzip; o WhiteNoise os serve com cache de um ano.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "fabrica.estaticos.ArquivosEstaticos"
+            if PRODUCAO
+            else "django.contrib.staticfiles.storage.StaticFilesStorage"
+        )
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -131,3 +250,35 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# Instrumentação das consultas por requisição (fabrica/instrumentacao.py):
+# "completo" também aponta consultas repetidas (N+1) e as mais lentas, "leve"
+# só conta consultas e tempo, "desligado" remove o middleware.
+INSTRUMENTACAO_SQL = os.environ.get(
+    "INSTRUMENTACAO_SQL", "completo" if DEBUG else "leve"
+)
+INSTRUMENTACAO_SQL_REPETICOES = 5
+
+# Cache de catálogo (fabrica/cache.py): LRU por processo com TTL em segundos
+# e, se BACKEND nomear um alias de CACHES, um segundo nível compartilhado
+# entre os processos, que também guarda as versões das chaves.
+CACHE_CATALOGO = {
+    "TAMANHO": 10_000,
+    "TTL": 300,
+    "BACKEND": os.environ.get("CACHE_CATALOGO_BACKEND") or None,
+}
+
+# O LocMemCache é por processo; com vários processos, "fragmentos" (e o
+# segundo nível do cache de catálogo) deveria ser um cache compartilhado.
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "fragmentos": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "fragmentos",
+        "OPTIONS": {"MAX_ENTRIES": 50_000},
+    },
+}
+
+# Linhas das listas de pedidos e fornecedores guardadas já renderizadas
+# (fabrica/fragmentos.py), por TTL segundos. BACKEND None desliga.
+FRAGMENTOS = {"BACKEND": "fragmentos", "TTL": 3600}
@@ -29,8 +29,51 @@ urlpatterns = [
         "cliente/<int:pk>/", views.ClienteDetailView.as_view(), name="detalhe_cliente"
     ),
     path("estoque/", views.EstoqueListView.as_view(), name="estoque"),
+    path("async/estoque/", views.EstoqueListAsyncView.as_view(), name="estoque_async"),
+    path("estoque/baixo/", views.EstoqueBaixoView.as_view(), name="estoque_baixo"),
+    path(
+        "exportar/clientes/",
+        views.ExportarClientesView.as_view(),
+        name="exportar_clientes",
+    ),
+    path(
+        "exportar/pedidos/",
+        views.ExportarPedidosView.as_view(),
+        name="exportar_pedidos",
+    ),
+    path(
+        "exportar/produtos/",
+        views.ExportarProdutosView.as_view(),
+        name="exportar_produtos",
+    ),
+    path(
+        "exportar/materias_primas/",
+        views.ExportarMateriasPrimasView.as_view(),
+        name="exportar_materias_primas",
+    ),
+    path(
+        "instrumentacao/sql/",
+        views.EstatisticasSqlView.as_view(),
+        name="estatisticas_sql",
+    ),
+    path(
+        "instrumentacao/cache/",
+        views.EstatisticasCacheView.as_view(),
+        name="estatisticas_cache",
+    ),
+    path("api/<str:recurso>/", views.ApiListaView.as_view(), name="api_lista"),
+    path(
+        "api/<str:recurso>/<int:pk>/",
+        views.ApiDetalheView.as_view(),
+        name="api_detalhe",
+    ),
     path("pedidos/", views.PedidosListView.as_view(), name="pedidos"),
     path("fornecedores/", views.FornecedoresListView.as_view(), name="fornecedores"),
+    path(
+        "async/fornecedores/",
+        views.FornecedoresListAsyncView.as_view(),
+        name="fornecedores_async",
+    ),
     path(
         "comprar_materiaprima/<int:pk>/",
         views.ComprarMateriaPrimaView.as_view(),
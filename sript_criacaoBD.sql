@@ -1,3 +1,10 @@
+-- Busca sem distinguir maiúsculas nem acentos (ver fabrica/busca.py)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
 -- Tabela Cliente
 CREATE TABLE Cliente (
     ID_Cliente SERIAL PRIMARY KEY,
@@ -15,13 +22,17 @@ CREATE TABLE Pedido (
     ID_Pedido SERIAL PRIMARY KEY,
     Data_Pedido DATE NOT NULL CHECK (Data_Pedido <= CURRENT_DATE),
     Data_Entrega DATE CHECK (Data_Entrega >= Data_Pedido AND Data_Entrega >= Data_Pagamento AND Data_Entrega <= CURRENT_DATE),
-    Status VARCHAR(20) NOT NULL CHECK (STATUS IN ('Pendente', 'Processado', 'Entregue')),
+    Status VARCHAR(20) NOT NULL CHECK (STATUS IN ('Pendente', 'Processado', 'Entregue', 'Cancelado')),
     Forma_Pagamento VARCHAR(20) NOT NULL CHECK (Forma_Pagamento IN ('Cartão de Crédito', 'Cartão de Débito', 'Dinheiro', 'Pix')),
     Data_Pagamento DATE NOT NULL CHECK (Data_Pagamento >= Data_Pedido AND Data_Pagamento <= CURRENT_DATE),
     Cliente_ID INT,
+    Valor_Total DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    Versao INT NOT NULL DEFAULT 1, -- Chave das linhas em cache da lista de pedidos
     FOREIGN KEY (Cliente_ID) REFERENCES Cliente(ID_Cliente) ON DELETE CASCADE
 );
 
+CREATE INDEX pedido_valor_total_idx ON Pedido (Valor_Total);
+
 -- Tabela Produto
 CREATE TABLE Produto (
     ID_Produto SERIAL PRIMARY KEY,
@@ -29,7 +40,8 @@ CREATE TABLE Produto (
     Descricao TEXT,
     Estoque_Disponivel INT DEFAULT 0,
     Limite_Estoque_Baixo INT DEFAULT 0,
-    Custo_Unitario DECIMAL(10, 2) NOT NULL CHECK (Custo_Unitario >= 0)
+    Custo_Unitario DECIMAL(10, 2) NOT NULL CHECK (Custo_Unitario >= 0),
+    Deficit INT GENERATED ALWAYS AS (Limite_Estoque_Baixo - Estoque_Disponivel) STORED
 );
 
 -- Tabela Contém (relacionamento entre Pedido e Produto)
@@ -42,6 +54,20 @@ CREATE TABLE Contem (
     FOREIGN KEY (Produto_ID) REFERENCES Produto(ID_Produto) ON DELETE CASCADE
 );
 
+-- Tabela Reserva (estoque prometido a pedidos ainda não baixados)
+CREATE TABLE Reserva (
+    ID BIGSERIAL PRIMARY KEY,
+    Pedido_ID INT NOT NULL,
+    Produto_ID INT NOT NULL,
+    Quantidade INT NOT NULL CHECK (Quantidade > 0),
+    Expira_Em TIMESTAMPTZ NULL, -- NULL: pedido processado, vale até a baixa
+    UNIQUE (Pedido_ID, Produto_ID),
+    FOREIGN KEY (Pedido_ID) REFERENCES Pedido(ID_Pedido) ON DELETE CASCADE,
+    FOREIGN KEY (Produto_ID) REFERENCES Produto(ID_Produto) ON DELETE CASCADE
+);
+
+CREATE INDEX reserva_produto_idx ON Reserva (Produto_ID, Expira_Em) INCLUDE (Quantidade);
+
 -- Tabela Ordem de Produção
 CREATE TABLE OrdemProducao (
     ID_Ordem SERIAL PRIMARY KEY,
@@ -67,7 +93,8 @@ CREATE TABLE MateriaPrima (
     Nome VARCHAR(100) NOT NULL,
     Custo_Unidade DECIMAL(10, 2) NOT NULL CHECK (Custo_Unidade >= 0),
     Estoque_Disponivel INT DEFAULT 0,
-    Limite_Estoque_Baixo INT DEFAULT 0
+    Limite_Estoque_Baixo INT DEFAULT 0,
+    Deficit INT GENERATED ALWAYS AS (Limite_Estoque_Baixo - Estoque_Disponivel) STORED
 );
 
 -- Tabela Constituido (relacionamento entre Produto e Materia-Prima)
@@ -86,7 +113,8 @@ CREATE TABLE Fornecedor (
     Nome VARCHAR(100) NOT NULL,
     Avaliacao DECIMAL(3, 2) CHECK (AVALIACAO BETWEEN 0 AND 5),
     Telefone VARCHAR(15) NOT NULL,
-    Email VARCHAR(50) NOT NULL CHECK (EMAIL LIKE '%@%.%')
+    Email VARCHAR(50) NOT NULL CHECK (EMAIL LIKE '%@%.%'),
+    Versao INT NOT NULL DEFAULT 1 -- Chave das linhas em cache da lista de fornecedores
 );
 
 -- Tabela Fornece (relacionamento entre Fornecedor e Materia-Prima)
@@ -125,6 +153,101 @@ CREATE TABLE Realiza (
     FOREIGN KEY (Ordem_ID) REFERENCES OrdemProducao(ID_Ordem) ON DELETE CASCADE
 );
 
+-- Tabela TransicaoEstoque (movimentos de estoque ja aplicados, um por transicao de status)
+CREATE TABLE TransicaoEstoque (
+    ID SERIAL PRIMARY KEY,
+    Tipo VARCHAR(20) NOT NULL CHECK (Tipo IN ('baixa_pedido', 'entrada_ordem', 'consumo_ordem')),
+    Referencia INT NOT NULL,
+    Aplicada_Em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (Tipo, Referencia)
+);
+
+-- Tabela Tarefa (fila de movimentos de estoque, consumida por manage.py processar_tarefas)
+CREATE TABLE Tarefa (
+    ID BIGSERIAL PRIMARY KEY,
+    Tipo VARCHAR(20) NOT NULL CHECK (Tipo IN ('baixa_pedido', 'entrada_ordem', 'consumo_ordem')),
+    Referencia INT NOT NULL,
+    Tentativas INT NOT NULL DEFAULT 0,
+    Executar_Em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    Criada_Em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    Ultimo_Erro TEXT
+);
+CREATE INDEX tarefa_executar_idx ON Tarefa (Executar_Em, ID);
+
+-- Tabela TarefaFalha (tarefas que esgotaram as tentativas)
+CREATE TABLE TarefaFalha (
+    ID BIGSERIAL PRIMARY KEY,
+    Tipo VARCHAR(20) NOT NULL,
+    Referencia INT NOT NULL,
+    Tentativas INT NOT NULL,
+    Erro TEXT NOT NULL,
+    Criada_Em TIMESTAMP WITH TIME ZONE NOT NULL,
+    Falhou_Em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabela MovimentacaoProduto (livro de movimentacoes de estoque de produtos, somente insercao)
+CREATE TABLE MovimentacaoProduto (
+    ID BIGSERIAL PRIMARY KEY,
+    Produto_ID INT NOT NULL,
+    Quantidade INT NOT NULL CHECK (Quantidade <> 0),
+    Origem VARCHAR(20) NOT NULL CHECK (Origem IN ('pedido', 'ordem', 'ajuste')),
+    Referencia INT,
+    Criada_Em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    Compactada BOOLEAN NOT NULL DEFAULT FALSE,
+    FOREIGN KEY (Produto_ID) REFERENCES Produto(ID_Produto) ON DELETE CASCADE
+);
+CREATE INDEX movproduto_pendente_idx ON MovimentacaoProduto (Produto_ID) WHERE NOT Compactada;
+CREATE INDEX movproduto_criada_idx ON MovimentacaoProduto (Produto_ID, Criada_Em);
+
+-- Tabela MovimentacaoMateriaPrima (livro de movimentacoes de estoque de materias-primas, somente insercao)
+CREATE TABLE MovimentacaoMateriaPrima (
+    ID BIGSERIAL PRIMARY KEY,
+    MateriaPrima_ID INT NOT NULL,
+    Quantidade INT NOT NULL CHECK (Quantidade <> 0),
+    Origem VARCHAR(20) NOT NULL CHECK (Origem IN ('ordem', 'compra', 'ajuste')),
+    Referencia INT,
+    Criada_Em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    Compactada BOOLEAN NOT NULL DEFAULT FALSE,
+    FOREIGN KEY (MateriaPrima_ID) REFERENCES MateriaPrima(ID_MateriaPrima) ON DELETE CASCADE
+);
+CREATE INDEX movmateriaprima_pendente_idx ON MovimentacaoMateriaPrima (MateriaPrima_ID) WHERE NOT Compactada;
+CREATE INDEX movmateriaprima_criada_idx ON MovimentacaoMateriaPrima (MateriaPrima_ID, Criada_Em);
+
+-- Índices de trigramas das buscas por substring
+CREATE INDEX cliente_nome_trgm_idx ON Cliente USING gin (f_unaccent(lower(Nome)) gin_trgm_ops);
+CREATE INDEX cliente_telefone_trgm_idx ON Cliente USING gin (f_unaccent(lower(Telefone)) gin_trgm_ops);
+CREATE INDEX cliente_email_trgm_idx ON Cliente USING gin (f_unaccent(lower(Email)) gin_trgm_ops);
+CREATE INDEX cliente_cep_trgm_idx ON Cliente USING gin (f_unaccent(lower(CEP)) gin_trgm_ops);
+CREATE INDEX cliente_complemento_trgm_idx ON Cliente USING gin (f_unaccent(lower(Complemento)) gin_trgm_ops);
+CREATE INDEX cliente_logradouro_trgm_idx ON Cliente USING gin (f_unaccent(lower(Logradouro)) gin_trgm_ops);
+CREATE INDEX produto_nome_trgm_idx ON Produto USING gin (f_unaccent(lower(Nome)) gin_trgm_ops);
+CREATE INDEX materiaprima_nome_trgm_idx ON MateriaPrima USING gin (f_unaccent(lower(Nome)) gin_trgm_ops);
+CREATE INDEX fornecedor_nome_trgm_idx ON Fornecedor USING gin (f_unaccent(lower(Nome)) gin_trgm_ops);
+CREATE INDEX funcionario_nome_trgm_idx ON Funcionario USING gin (f_unaccent(lower(Nome)) gin_trgm_ops);
+CREATE INDEX funcionario_cargo_trgm_idx ON Funcionario USING gin (f_unaccent(lower(Cargo)) gin_trgm_ops);
+
+-- Índices das consultas das views: chaves estrangeiras sem índice próprio,
+-- ordens das listas paginadas e linhas com estoque baixo
+CREATE INDEX pedido_data_idx ON Pedido (Data_Pedido, ID_Pedido);
+CREATE INDEX pedido_cliente_data_idx ON Pedido (Cliente_ID, Data_Pedido);
+CREATE INDEX pedido_status_idx ON Pedido (Status);
+CREATE INDEX contem_pedido_idx ON Contem (Pedido_ID);
+CREATE INDEX contem_produto_idx ON Contem (Produto_ID);
+CREATE INDEX ordem_status_data_idx ON OrdemProducao (Status DESC, Data_Criacao, ID_Ordem);
+CREATE INDEX contemordem_ordem_idx ON ContemOrdemProducao (Ordem_ID);
+CREATE INDEX contemordem_produto_idx ON ContemOrdemProducao (Produto_ID);
+CREATE INDEX constituido_produto_idx ON Constituido (Produto_ID);
+CREATE INDEX constituido_materiaprima_idx ON Constituido (MateriaPrima_ID);
+CREATE INDEX fornecedor_avaliacao_idx ON Fornecedor ((COALESCE(Avaliacao, 10)), ID_Fornecedor);
+CREATE INDEX fornece_fornecedor_idx ON Fornece (Fornecedor_ID);
+CREATE INDEX fornece_materiaprima_preco_idx ON Fornece (MateriaPrima_ID, Preco);
+CREATE INDEX realiza_funcionario_idx ON Realiza (Funcionario_ID);
+CREATE INDEX realiza_ordem_idx ON Realiza (Ordem_ID);
+CREATE INDEX recebe_funcionario_idx ON Recebe (Funcionario_ID);
+CREATE INDEX recebe_pedido_idx ON Recebe (Pedido_ID);
+CREATE INDEX produto_deficit_idx ON Produto (Deficit DESC, ID_Produto) WHERE Deficit > 0;
+CREATE INDEX materiaprima_deficit_idx ON MateriaPrima (Deficit DESC, ID_MateriaPrima) WHERE Deficit > 0;
+
 INSERT INTO Cliente (Nome, Telefone, Email, Numero, CEP, Complemento, Logradouro) VALUES
 ('Alice Silva', '11987654321', 'alice@example.com', 101, '01001-000', 'Apto 10', 'Rua A'),
 ('Bruno Souza', '21987654321', 'bruno@example.com', 102, '02002-000', 'Casa', 'Rua B'),
@@ -213,6 +336,15 @@ INSERT INTO Contem (Pedido_ID, Produto_ID, Quantidade) VALUES
 (19, 19, 95),
 (20, 20, 100);
 
+-- Valor total materializado dos pedidos inseridos acima
+UPDATE Pedido
+SET Valor_Total = COALESCE((
+    SELECT SUM(Produto.Custo_Unitario * Contem.Quantidade)
+    FROM Contem
+        JOIN Produto ON Contem.Produto_ID = Produto.ID_Produto
+    WHERE Contem.Pedido_ID = Pedido.ID_Pedido
+), 0);
+
 INSERT INTO OrdemProducao (Status, Custo_Total, Data_Criacao, Data_Conclusao) VALUES
 ('Concluído', 500.00, '2024-01-01', '2024-01-10'),
 ('Concluído', 600.00, '2024-02-01', '2024-02-10'),
@@ -410,3 +542,29 @@ INSERT INTO Realiza (Funcionario_ID, Ordem_ID) VALUES
 (18, 18),
 (19, 19),
 (20, 20);
+
+-- Os estoques inseridos acima já refletem os pedidos entregues e as ordens
+-- concluídas: marca as transições como aplicadas, para que salvar um desses
+-- registros de novo não movimente o estoque outra vez
+INSERT INTO TransicaoEstoque (Tipo, Referencia)
+SELECT 'baixa_pedido', ID_Pedido FROM Pedido WHERE Status = 'Entregue'
+UNION ALL
+SELECT 'entrada_ordem', ID_Ordem FROM OrdemProducao WHERE Status = 'Concluído'
+UNION ALL
+SELECT 'consumo_ordem', ID_Ordem FROM OrdemProducao WHERE Status = 'Concluído';
+
+-- Reservas dos pedidos inseridos acima que ainda não foram baixados, como
+-- sincronizar_reservas: Pendente vale RESERVA_VALIDADE_HORAS (24h por
+-- padrão), Processado vale até a baixa
+INSERT INTO Reserva (Pedido_ID, Produto_ID, Quantidade, Expira_Em)
+SELECT Contem.Pedido_ID, Contem.Produto_ID, SUM(Contem.Quantidade),
+       CASE WHEN Pedido.Status = 'Pendente'
+            THEN CURRENT_TIMESTAMP + INTERVAL '24 hours' END
+FROM Contem
+    JOIN Pedido ON Pedido.ID_Pedido = Contem.Pedido_ID
+WHERE Pedido.Status IN ('Pendente', 'Processado')
+    AND NOT EXISTS (
+        SELECT 1 FROM TransicaoEstoque
+        WHERE Tipo = 'baixa_pedido' AND Referencia = Pedido.ID_Pedido
+    )
+GROUP BY Contem.Pedido_ID, Contem.Produto_ID, Pedido.Status;